@@ -1,19 +1,40 @@
 import os
-import requests
+import json
+import time
 import config
+import click
+from datetime import datetime
 
-from flask import Flask, render_template, request, flash, redirect, session, g, Response
+from flask import Flask, render_template, request, flash, redirect, session, g, Response, url_for, stream_with_context, jsonify
 from flask_debugtoolbar import DebugToolbarExtension
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func
 
-from functions import is_worker, calculate_dog_walker_rate
-from models import db, connect_db, Dog_Owner, Dog_Walker, Address, Dog, Message, Appointment, Review
-from forms import UserAddForm, LoginForm, Dog_Owner_Profile_Form, Dog_Walker_Profile_Form, Address_Form, Dog_Form, Edit_Dog_Form, New_Message_Form, New_Appointment_Form, Review_Form
-
-CURR_USER_KEY = "curr_user"
+from functions import is_worker, add_review_to_dog_walker_rate, rebuild_dog_walker_rates, encode_keyset_cursor, decode_keyset_cursor
+from identity import CURR_USER_KEY, RequestGlobals, remember_user, remember_unread, forget_user, user_kind
+from purge import delete_user, retry_purges
+from jobs import work
+from pool import pool_status
+from instrumentation import init_query_instrumentation, query_stats
+from metrics import init_metrics, render_metrics
+from fragments import init_fragment_cache
+from passwords import check_password
+from conditional import page_etag, not_modified, with_etag
+from authorization import has_conversation, can_view_dog_owner
+from unread import mark_thread_read, rebuild_unread_counters
+from export import DATASETS, FORMATS, export_stream, export_filename
+from broker import get_broker, thread_channel
+from search import search_dog_walkers, DEFAULT_PAGE_SIZE
+from availability import free_slots, book_appointment, DEFAULT_DAYS
+from breeds import get_breed_choices, get_breed_temperament, refresh_breed_catalog
+from models import db, connect_db, User, Dog_Owner, Dog_Walker, Address, Dog, Message, Conversation, Appointment, Availability, Review, AccountPurge
+from forms import UserAddForm, LoginForm, Dog_Owner_Profile_Form, Dog_Walker_Profile_Form, Address_Form, Dog_Form, Edit_Dog_Form, New_Message_Form, New_Appointment_Form, Availability_Form, Review_Form
+
+MESSAGES_PER_PAGE = 50
+APPOINTMENTS_PER_PAGE = 20
 
 app = Flask(__name__)
+app.app_ctx_globals_class = RequestGlobals
 
 
 #to local use: app.config['SQLALCHEMY_DATABASE_URI'] = (os.environ.get('DATABASE_URL', 'postgres:///doggy_walkie'))
@@ -22,12 +43,40 @@ app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = (os.environ.get('DATABASE_URL', 'postgres:///doggy_walkie'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ECHO'] = False
+app.config['SQLALCHEMY_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['SQLALCHEMY_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['SQLALCHEMY_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['SQLALCHEMY_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 30 * 60))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+app.config['DB_PGBOUNCER'] = os.environ.get('DB_PGBOUNCER') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+app.config['QUERY_STATS_HEADERS'] = os.environ.get('QUERY_STATS_HEADERS') == '1'
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASHING_POOL'] = os.environ.get('PASSWORD_HASHING_POOL')
+app.config['PASSWORD_HASHING_WORKERS'] = int(os.environ.get('PASSWORD_HASHING_WORKERS', 0)) or None
+app.config['FRAGMENT_CACHE'] = os.environ.get('FRAGMENT_CACHE', 'lru')
+app.config['FRAGMENT_CACHE_URL'] = os.environ.get('FRAGMENT_CACHE_URL', 'redis://localhost:6379/0')
+app.config['FRAGMENT_CACHE_SIZE'] = int(os.environ.get('FRAGMENT_CACHE_SIZE', 1024))
+app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get('FRAGMENT_CACHE_TTL', 60 * 60))
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', config.secret)
+app.config['BREED_CATALOG_TTL'] = int(os.environ.get('BREED_CATALOG_TTL', 60 * 60 * 24))
+app.config['BREED_CATALOG_OFFLINE'] = os.environ.get('BREED_CATALOG_OFFLINE') == '1'
+app.config['MESSAGE_BROKER'] = os.environ.get('MESSAGE_BROKER', 'postgres')
+app.config['MESSAGE_STREAM_KEEPALIVE'] = int(os.environ.get('MESSAGE_STREAM_KEEPALIVE', 15))
+app.config['MESSAGE_STREAM_TIMEOUT'] = int(os.environ.get('MESSAGE_STREAM_TIMEOUT', 300))
+app.config['JOBS_EAGER'] = os.environ.get('JOBS_EAGER') == '1'
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
 toolbar = DebugToolbarExtension(app)
 
 
 connect_db(app)
+init_query_instrumentation(app)
+init_metrics(app)
+init_fragment_cache(app)
 
 
 
@@ -35,43 +84,37 @@ connect_db(app)
 @app.before_request
 
 def add_user_to_g():
-    """If we're logged in, add curr user to Flask global."""
-
-    if CURR_USER_KEY in session:
+    """If we're logged in, add curr user to Flask global.
 
-        if session["is_worker"]:
-            g.user = Dog_Walker.query.get(session[CURR_USER_KEY])
+    Nothing is queried here: `g.principal` comes from the session and `g.user`
+    is loaded by RequestGlobals the first time a view touches it.
+    """
 
-        else:
-            g.user = Dog_Owner.query.get(session[CURR_USER_KEY])
-    
-    else:
+    if CURR_USER_KEY not in session:
         g.user = None
+        g.principal = None
 
 
 def do_login(user):
     """Log in user."""
 
-    session[CURR_USER_KEY] = user.id
-    session["is_worker"] = is_worker(user)
+    remember_user(user)
 
 
 def do_logout():
     """Logout user."""
 
-    if CURR_USER_KEY in session:
-        del session[CURR_USER_KEY]
-        del session["is_worker"]
+    forget_user()
 
 @app.route("/")
 def home():
     """Home route."""
 
-    if g.user and is_worker(g.user):
-        return redirect(f"/dog_walkers/{g.user.id}")
+    if g.principal and g.principal["kind"] == "dog_walker":
+        return redirect(f"/dog_walkers/{g.principal['id']}")
     
-    elif g.user:
-        return redirect(f"/dog_owners/{g.user.id}")
+    elif g.principal:
+        return redirect(f"/dog_owners/{g.principal['id']}")
 
     else:
         return render_template("home.html")
@@ -81,23 +124,31 @@ def home():
 def search():
     """Handle the search for dog_walkers"""
 
-    search = (request.args.get("q")).capitalize()
-
-    if not search:
-        dog_walkers = Dog_Walker.query.all()
-
-    else:
-        dog_walkers = Dog_Walker.query.filter(Dog_Walker.name.like(f"%{search}%")).all()
-
+    dog_walkers, next_cursor = search_dog_walkers(
+        q = request.args.get("q"),
+        neighbor = request.args.get("neighbor"),
+        city = request.args.get("city"),
+        zipcode = request.args.get("zipcode", type = int),
+        min_rate = request.args.get("min_rate", type = float),
+        after = request.args.get("after"),
+        per_page = request.args.get("per_page", DEFAULT_PAGE_SIZE, type = int),
+    )
+
+    next_url = None
+
+    if next_cursor:
+        args = request.args.to_dict()
+        args["after"] = next_cursor
+        next_url = url_for("search", **args)
     
-    return render_template("search.html", dog_walkers = dog_walkers)
+    return render_template("search.html", dog_walkers = dog_walkers, next_url = next_url)
 
 
 @app.route("/login",methods=["GET","POST"])
 def login():
     """Handle both users login"""
 
-    if (g.user):
+    if (g.principal):
         flash("You are already loged in", "danger")
         return redirect("/")
 
@@ -105,12 +156,12 @@ def login():
 
     if form.validate_on_submit():
 
-        if (form.dog_walker_check.data): 
-            user = Dog_Walker.authenticate(form.email.data, form.password.data)
-        
-        else:
-            user = Dog_Owner.authenticate(form.email.data, form.password.data)
-        
+        user = User.authenticate(form.email.data, form.password.data)
+
+        if user and AccountPurge.in_progress(user_kind(user), user.id):
+            flash("This account is being deleted", "danger")
+            return redirect("/login")
+
         if user:
 
             do_login(user)
@@ -189,7 +240,10 @@ def dog_walker_view_page(dog_walker_id):
         flash("You need to login first ", "danger")
         return redirect ("/")
 
-    dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
+    if g.user.id == dog_walker_id and is_worker(g.user):
+        dog_walker = g.user
+    else:
+        dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
 
     return render_template("/dog_walker/dog_walker_home.html", user = dog_walker)
 
@@ -202,7 +256,7 @@ def address_dog_walker(dog_walker_id):
             flash("Access Unauthorized ", "danger")
             return redirect ("/")
     
-    dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
+    dog_walker = g.user
     form = Address_Form(obj=dog_walker.address)
 
     if form.validate_on_submit():
@@ -226,6 +280,7 @@ def address_dog_walker(dog_walker_id):
             address.city = form.city.data
             address.state = form.state.data
             address.neighbor = form.neighbor.data
+            g.user.version += 1
 
             db.session.add(address)
             db.session.commit()
@@ -249,7 +304,8 @@ def dog_walker_profile():
 
     if form.validate_on_submit():
 
-        if not Dog_Walker.authenticate(g.user.email, form.password.data):
+        # g.user is already loaded: check the password without looking the user up again
+        if not check_password(g.user.password, form.password.data):
             flash("Incorrect password - Impossible to edit profile.", "danger")
             return redirect("/")
         
@@ -259,6 +315,7 @@ def dog_walker_profile():
         dog_walker.cellphone = form.cellphone.data
         dog_walker.description = form.description.data
         dog_walker.photo = form.photo.data
+        dog_walker.version += 1
 
         try:
 
@@ -269,6 +326,7 @@ def dog_walker_profile():
             flash("Email already taken.", 'danger')
             return render_template("dog_walker/dog_walker_edit_profile.html", form = form)
 
+        remember_user(dog_walker)
 
         return redirect(f"/dog_walkers/{g.user.id}")
 
@@ -280,36 +338,19 @@ def dog_walker_profile():
 def delete_dog_walkers():
     """Delete your profile and your address"""
 
-    dog_walker = Dog_Walker.query.get_or_404(g.user.id)
-
     if not g.user or not is_worker(g.user):
         flash("Access unauthorized.", "danger")
         return redirect("/")
 
-    do_logout()
-
-    if g.user.address:
-
-        address = Address.query.get(dog_walker.address.id)
-        db.session.delete(address)
-    
-    if g.user.message:
-
-        messages = Message.query.filter_by(dog_walker_id = dog_walker.id).all()
-        for msg in messages:
-            db.session.delete(msg)
-    
-    if g.user.appointments:
+    dog_walker = g.user
 
-        appointments = Appointment.query.filter_by(dog_walker_id = dog_walker.id).all()
-        for aptment in appointments:
-            db.session.delete(aptment
-            )
+    do_logout()
 
-    db.session.delete(g.user)
-    db.session.commit()
+    if delete_user(dog_walker):
+        flash("Your account is being deleted, it may take a few minutes.", "success")
+    else:
+        flash(f"The user was deleted.", "success")
 
-    flash(f"The user was deleted.", "success")
     return redirect("/signup")
 
 ##################################################
@@ -325,18 +366,86 @@ def dog_walker_messages(dog_walker_id):
 
     if g.user.id == dog_walker_id and is_worker(g.user):
 
-        dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
-        messages = Message.query.filter_by(dog_walker_id = dog_walker_id).all()
-
-        user_list = [msg.dog_owner for msg in messages]
-        user_list = set(user_list)
+        dog_walker = g.user
+        conversations = Conversation.inbox_for(dog_walker.id, is_worker = True)
 
-        return render_template("dog_walker/dog_walker_messages.html", user_list = user_list, user = dog_walker)
+        return render_template("dog_walker/dog_walker_messages.html", conversations = conversations, user = dog_walker)
 
     else:
         flash("Access unathorized ", "danger")
         return redirect ("/")
 
+##################################################
+# Dog_Walker Availability routes
+
+@app.route("/dog_walkers/<int:dog_walker_id>/availability", methods = ["GET", "POST"])
+def dog_walker_availability(dog_walker_id):
+    """Show and add the weekly availability windows of the dog_walker"""
+
+    if not g.user:
+        flash("You need to login first ", "danger")
+        return redirect ("/")
+
+    if g.user.id == dog_walker_id and is_worker(g.user):
+
+        form = Availability_Form()
+        form.weekday.choices = list(enumerate(Availability.WEEKDAYS))
+
+        if form.validate_on_submit():
+            starts = datetime.strptime(form.starts.data, "%H:%M").time()
+            ends = datetime.strptime(form.ends.data, "%H:%M").time()
+
+            if ends <= starts:
+                flash("The window has to end after it starts", "danger")
+
+            else:
+                db.session.add(Availability(dog_walker_id = g.user.id, weekday = form.weekday.data, starts = starts, ends = ends))
+                db.session.commit()
+
+                return redirect(f"/dog_walkers/{g.user.id}/availability")
+
+        windows = Availability.query.filter_by(dog_walker_id = g.user.id).order_by(Availability.weekday, Availability.starts).all()
+
+        return render_template("dog_walker/dog_walker_availability.html", windows = windows, form = form, user = g.user)
+
+    else:
+        flash("Access Unauthorized ", "danger")
+        return redirect ("/")
+
+@app.route("/availability/<int:availability_id>/delete", methods = ["POST"])
+def delete_availability(availability_id):
+    """Delete a weekly availability window of the dog_walker"""
+
+    window = Availability.query.get_or_404(availability_id)
+
+    if g.user and is_worker(g.user) and g.user.id == window.dog_walker_id:
+
+        db.session.delete(window)
+        db.session.commit()
+
+        return redirect(f"/dog_walkers/{g.user.id}/availability")
+
+    else:
+        flash("Access Unauthorized ", "danger")
+        return redirect ("/")
+
+@app.route("/dog_walkers/<int:dog_walker_id>/free_slots")
+def dog_walker_free_slots(dog_walker_id):
+    """Show the free slots of the dog_walker for the next days"""
+
+    if not g.user:
+        flash("You need to login first ", "danger")
+        return redirect ("/")
+
+    if g.user.id == dog_walker_id and is_worker(g.user):
+        dog_walker = g.user
+    else:
+        dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
+
+    slots = free_slots(dog_walker.id, days = DEFAULT_DAYS)
+
+    return render_template("dog_walker/dog_walker_free_slots.html", slots = slots, days = DEFAULT_DAYS, user = dog_walker)
+
 ##################################################
 # Dog_Walker Appointment routes
 @app.route("/dog_walkers/<int:dog_walker_id>/appointments")
@@ -349,10 +458,22 @@ def dog_walker_appointments(dog_walker_id):
 
     if g.user.id == dog_walker_id and is_worker(g.user):
 
-        dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
-        appointments = Appointment.query.filter_by(dog_walker_id = dog_walker.id).order_by('date').all()
+        dog_walker = g.user
+        etag = page_etag(dog_walker.appointments_version)
+        response = not_modified(etag)
+
+        if response:
+            return response
+
+        after = decode_keyset_cursor(request.args.get("after"))
+        appointments, next_cursor = Appointment.status_page(done = False, dog_walker_id = dog_walker.id, after = after, per_page = APPOINTMENTS_PER_PAGE)
+
+        next_url = None
+
+        if next_cursor:
+            next_url = url_for("dog_walker_appointments", dog_walker_id = dog_walker.id, after = encode_keyset_cursor(next_cursor))
     
-        return render_template("dog_walker/dog_walker_appointments.html", appointments = appointments, user = dog_walker)
+        return with_etag(render_template("dog_walker/dog_walker_appointments.html", appointments = appointments, next_url = next_url, user = dog_walker), etag)
 
     else:
         flash("Access Unauthorized ", "danger")
@@ -368,10 +489,22 @@ def dog_walker_done_appointments(dog_walker_id):
 
     if g.user.id == dog_walker_id and is_worker(g.user):
 
-        dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
-        appointments = Appointment.query.filter_by(dog_walker_id = dog_walker.id).order_by('date').all()
+        dog_walker = g.user
+        etag = page_etag(dog_walker.appointments_version)
+        response = not_modified(etag)
+
+        if response:
+            return response
+
+        after = decode_keyset_cursor(request.args.get("after"))
+        appointments, next_cursor = Appointment.status_page(done = True, dog_walker_id = dog_walker.id, after = after, per_page = APPOINTMENTS_PER_PAGE)
+
+        next_url = None
+
+        if next_cursor:
+            next_url = url_for("dog_walker_done_appointments", dog_walker_id = dog_walker.id, after = encode_keyset_cursor(next_cursor))
     
-        return render_template("dog_walker/dog_walker_done_appointments.html", appointments = appointments, user = dog_walker)
+        return with_etag(render_template("dog_walker/dog_walker_done_appointments.html", appointments = appointments, next_url = next_url, user = dog_walker), etag)
 
     else:
         flash("Access Unauthorized ", "danger")
@@ -388,12 +521,13 @@ def dog_owner_view_page(dog_owner_id):
         flash("You need to login first ", "danger")
         return redirect ("/")
 
-    dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
-    dog_walker_with_messages = [msg.dog_walker for msg in dog_owner.message]
-    
+    if can_view_dog_owner(g.user, dog_owner_id):
+
+        if g.user.id == dog_owner_id and not is_worker(g.user):
+            dog_owner = g.user
+        else:
+            dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
 
-    if (g.user.id == dog_owner_id and not is_worker(g.user)) or g.user in dog_walker_with_messages:
-        
         return render_template("/dog_owner/dog_owner_home.html", user = dog_owner)
     
     else:
@@ -411,7 +545,7 @@ def address_dog_owner(dog_owner_id):
         flash("Access Unauthorized ", "danger")
         return redirect ("/")
     
-    dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
+    dog_owner = g.user
     form = Address_Form(obj=dog_owner.address)
 
     if form.validate_on_submit():
@@ -437,6 +571,7 @@ def address_dog_owner(dog_owner_id):
             address.city = form.city.data
             address.state = form.state.data
             address.neighbor = form.neighbor.data
+            g.user.version += 1
 
             db.session.add(address)
             db.session.commit()
@@ -459,7 +594,8 @@ def dog_owner_profile():
 
     if form.validate_on_submit():
 
-        if not Dog_Owner.authenticate(g.user.email, form.password.data):
+        # g.user is already loaded: check the password without looking the user up again
+        if not check_password(g.user.password, form.password.data):
             flash("Incorrect password - Impossible to edit profile.", "danger")
             return redirect("/")
         
@@ -468,6 +604,7 @@ def dog_owner_profile():
         dog_owner.email = form.email.data
         dog_owner.cellphone = form.cellphone.data
         dog_owner.photo = form.photo.data
+        dog_owner.version += 1
 
         try:
 
@@ -478,6 +615,7 @@ def dog_owner_profile():
             flash("Email already taken.", 'danger')
             return render_template("dog_owner/dog_owner_edit_profile.html", form = form)
 
+        remember_user(dog_owner)
         return redirect(f"/dog_owners/{g.user.id}")
 
     else:
@@ -487,38 +625,19 @@ def dog_owner_profile():
 def delete_dog_owners():
     """Delete dog_owners profile and his/her address"""
 
-    dog_owner = Dog_Owner.query.get_or_404(g.user.id)
-
     if not g.user or is_worker(g.user):
         flash("Access unauthorized.", "danger")
         return redirect("/")
 
-    do_logout()
-
-    if g.user.address:
-        address = Address.query.get(dog_owner.address.id)
-        db.session.delete(address)
-    
-    if g.user.dog:
-        dogs = Dog.query.filter_by(dog_owner_id = dog_owner.id).all()
-        for dog in dogs:
-            db.session.delete(dog)
-    
-    if g.user.message:
-        messages = Message.query.filter_by(dog_owner_id = dog_owner.id).all()
-        for msg in messages:
-            db.session.delete(msg)
-    
-    if g.user.appointments:
-        appointments = Appointment.query.filter_by(dog_owner_id = dog_owner.id).all()
-        for aptment in appointments:
-            db.session.delete(aptment)
+    dog_owner = g.user
 
+    do_logout()
 
-    db.session.delete(g.user)
-    db.session.commit()
+    if delete_user(dog_owner):
+        flash("Your account is being deleted, it may take a few minutes.", "success")
+    else:
+        flash(f"The user was deleted.", "success")
 
-    flash(f"The user was deleted.", "success")
     return redirect("/signup")
 
 ##################################################
@@ -532,12 +651,13 @@ def show_user_dogs(dog_owner_id):
         flash("You need to login first ", "danger")
         return redirect ("/")
     
-    dog_walker_with_messages = [msg.dog_walker for msg in Dog_Owner.query.get_or_404(dog_owner_id).message]
+    if can_view_dog_owner(g.user, dog_owner_id):
 
-    if (g.user.id == dog_owner_id and not is_worker(g.user)) or g.user in dog_walker_with_messages:
+        if g.user.id == dog_owner_id and not is_worker(g.user):
+            dog_owner = g.user
+        else:
+            dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
 
-        dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
-    
         dogs = dog_owner.dog
         
 
@@ -558,36 +678,17 @@ def add_dogs(dog_owner_id):
     if g.user.id == dog_owner_id and not is_worker(g.user):
 
         form = Dog_Form()
-
-        # requesting an external API to fullfield the breed options.
-        params = {
-            "x-api-key": config.api_key if config.api_key is not None else os.getenv("DOG_API_KEY", "optional-default")
-        }
-
-        res = requests.get("https://api.thedogapi.com/v1/breeds", params=params)
-        data = res.json()
-        
-        breed_list = [(result["name"], result["name"]) for result in data]
-        breed_list.append(("Other", "Other"))
-        form.breed.choices = breed_list
-        
+        form.breed.choices = get_breed_choices()
 
         if form.validate_on_submit():
             dog = Dog(dog_owner_id = dog_owner_id, first_name = form.first_name.data, breed = form.breed.data, weight = form.weight.data, age = form.age.data)
-            
-            db.session.add(dog)
-            db.session.commit()
-
-            # requesting an external API to automatically create a dog description, based on the chose breed.
-            dog = Dog.query.filter_by(first_name = form.first_name.data).first()
 
+            # automatically create a dog description, based on the chose breed.
             if dog.breed != "Other":
-                res = requests.get(f"https://api.thedogapi.com/v1/breeds/search?q={dog.breed}", params=params)
-                data = res.json()
-                dog.description = data[0]["temperament"]
-            
-                db.session.add(dog)
-                db.session.commit()
+                dog.description = get_breed_temperament(dog.breed)
+
+            db.session.add(dog)
+            db.session.commit()
 
             flash("Dog added", "success")
             return redirect(f"/dog_owners/{dog_owner_id}/dogs")
@@ -613,13 +714,10 @@ def dog_owner_messages(dog_owner_id):
 
     if g.user.id == dog_owner_id and not is_worker(g.user):
 
-        dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
-        messages = Message.query.filter_by(dog_owner_id = dog_owner_id).all()
-
-        user_list = [msg.dog_walker for msg in messages]
-        user_list = set(user_list)
+        dog_owner = g.user
+        conversations = Conversation.inbox_for(dog_owner.id, is_worker = False)
 
-        return render_template("dog_owner/dog_owner_messages.html", user_list = user_list, user = dog_owner)
+        return render_template("dog_owner/dog_owner_messages.html", conversations = conversations, user = dog_owner)
 
     else:
         flash("Access unathorized ", "danger")
@@ -638,9 +736,21 @@ def dog_owner_appointments(dog_owner_id):
 
     if g.user.id == dog_owner_id and not is_worker(g.user):
 
-        dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
-        appointments = Appointment.query.filter_by(dog_owner_id = dog_owner.id).order_by('date').all()
-        return render_template("dog_owner/dog_owner_appointments.html", appointments = appointments, user = dog_owner)
+        dog_owner = g.user
+        etag = page_etag(dog_owner.appointments_version)
+        response = not_modified(etag)
+
+        if response:
+            return response
+
+        after = decode_keyset_cursor(request.args.get("after"))
+        appointments, next_cursor = Appointment.status_page(done = False, dog_owner_id = dog_owner.id, after = after, per_page = APPOINTMENTS_PER_PAGE)
+
+        next_url = None
+
+        if next_cursor:
+            next_url = url_for("dog_owner_appointments", dog_owner_id = dog_owner.id, after = encode_keyset_cursor(next_cursor))
+        return with_etag(render_template("dog_owner/dog_owner_appointments.html", appointments = appointments, next_url = next_url, user = dog_owner), etag)
 
     else:
         flash("Access Unauthorized ", "danger")
@@ -656,10 +766,22 @@ def dog_owner_done_appointments(dog_owner_id):
 
     if g.user.id == dog_owner_id and not is_worker(g.user):
         
-        dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
-        appointments = Appointment.query.filter_by(dog_owner_id = dog_owner.id).order_by('date').all()
+        dog_owner = g.user
+        etag = page_etag(dog_owner.appointments_version)
+        response = not_modified(etag)
+
+        if response:
+            return response
+
+        after = decode_keyset_cursor(request.args.get("after"))
+        appointments, next_cursor = Appointment.status_page(done = True, dog_owner_id = dog_owner.id, after = after, per_page = APPOINTMENTS_PER_PAGE)
+
+        next_url = None
+
+        if next_cursor:
+            next_url = url_for("dog_owner_done_appointments", dog_owner_id = dog_owner.id, after = encode_keyset_cursor(next_cursor))
 
-        return render_template("dog_owner/dog_owner_done_appointments.html", appointments = appointments, user = dog_owner)
+        return with_etag(render_template("dog_owner/dog_owner_done_appointments.html", appointments = appointments, next_url = next_url, user = dog_owner), etag)
 
     else:
         flash("Access Unauthorized ", "danger")
@@ -672,17 +794,13 @@ def dog_owner_done_appointments(dog_owner_id):
 def show_dog_details(dog_id):
     """Show dog details: only the dog_owner and the dog_walkers who already exchange messages with the owners can see"""
 
-    dog = Dog.query.get_or_404(dog_id)
-    dog_owner = dog.dog_owner
-
-    #catching the dog_walkers who already exchange messages with the dog_owners,so they can see dog's profile.
-    dog_walker_with_messages = [msg.dog_walker for msg in dog_owner.message]
-
     if not g.user:
         flash("You need to login first ", "danger")
         return redirect ("/")
 
-    if (g.user.id == dog_owner.id and not is_worker(g.user)) or g.user in dog_walker_with_messages:
+    dog = Dog.query.get_or_404(dog_id)
+
+    if can_view_dog_owner(g.user, dog.dog_owner_id):
 
         return render_template("dogs/show_dog.html", dog = dog)
     
@@ -708,16 +826,7 @@ def edit_dog_details(dog_id):
     
         form = Edit_Dog_Form(obj = dog)
 
-        # requesting an external API to fullfield the breeds options.
-        params = {
-            "x-api-key": config.api_key if config.api_key is not None else os.getenv("DOG_API_KEY", "optional-default")
-        }
-
-        res = requests.get("https://api.thedogapi.com/v1/breeds", params=params)
-        data = res.json()
-        breed_list = [(result["name"], result["name"]) for result in data]
-        breed_list.append(("Other", "Other"))
-        form.breed.choices = breed_list
+        form.breed.choices = get_breed_choices()
 
         if form.validate_on_submit():
 
@@ -776,21 +885,15 @@ def messages_between_users(dog_owner_id, dog_walker_id):
         return redirect ("/")
     
 
-    dog_owner = Dog_Owner.query.get_or_404(dog_owner_id)
-    dog_walker = Dog_Walker.query.get_or_404(dog_walker_id)
-
-    messages = Message.query.filter_by(dog_owner_id = dog_owner_id, dog_walker_id = dog_walker_id).all()
-    dog_walkers_messages = [msg.dog_walker for msg in messages]
-
+    is_thread_owner = not is_worker(g.user) and g.user.id == dog_owner_id
+    is_thread_walker = is_worker(g.user) and g.user.id == dog_walker_id
 
     # the dog_walker user only can send messages to dog_owners, if the dog_owner has already sent a message for him before.
-    if is_worker(g.user): 
-        if g.user not in dog_walkers_messages:
-            flash("Access Unauthorized ", "danger")
-            return redirect ("/")
+    # checked on the conversation pair, before loading anything else.
+    if is_thread_owner or (is_thread_walker and has_conversation(dog_owner_id, dog_walker_id)):
 
-
-    if g.user.id == dog_owner_id or g.user.id == dog_walker_id:
+        dog_walker = g.user if is_thread_walker else Dog_Walker.query.get_or_404(dog_walker_id)
+        dog_owner = g.user if is_thread_owner else Dog_Owner.query.get_or_404(dog_owner_id)
 
         form = New_Message_Form()
 
@@ -798,18 +901,101 @@ def messages_between_users(dog_owner_id, dog_walker_id):
 
             new_message = Message(dog_owner_id = dog_owner.id, dog_walker_id = dog_walker.id, is_sender_worker = is_worker(g.user), text = form.text.data)
             db.session.add(new_message)
+            db.session.flush()
+
+            # sent with the commit, by the same connection
+            get_broker(app).publish(thread_channel(dog_owner.id, dog_walker.id), new_message.id, db.session)
             db.session.commit()
 
             return redirect(f"/messages/{dog_owner.id}/{dog_walker.id}")
     
     
         else:
-            return render_template("messages_between_users.html", messages = messages, dog_walker = dog_walker, dog_owner = dog_owner, form = form)
+            # one UPDATE for every message received in the thread, only when something is unread
+            if g.user.unread_messages:
+                remember_unread(mark_thread_read(g.user, dog_owner.id, dog_walker.id))
+                db.session.commit()
+
+            etag = page_etag(dog_owner.version, dog_walker.version, Message.thread_last_id(dog_owner.id, dog_walker.id))
+            response = not_modified(etag)
+
+            if response:
+                return response
+
+            before = decode_keyset_cursor(request.args.get("before"))
+            messages, older = Message.thread_page(dog_owner.id, dog_walker.id, before = before, per_page = MESSAGES_PER_PAGE)
+
+            older_url = None
+
+            if older:
+                older_url = f"/messages/{dog_owner.id}/{dog_walker.id}?before={encode_keyset_cursor(older)}"
+
+            return with_etag(render_template("messages_between_users.html", messages = messages, older_url = older_url, dog_walker = dog_walker, dog_owner = dog_owner, form = form), etag)
 
     else:
         flash("Access Unauthorized ", "danger")
         return redirect ("/")
 
+@app.route("/messages/<int:dog_owner_id>/<int:dog_walker_id>/stream")
+def stream_messages(dog_owner_id, dog_walker_id):
+    """Server-sent events with the new messages between two users, after the `after` thread_seq (or Last-Event-ID)"""
+
+    if not g.user:
+        return Response(status = 403)
+
+    is_thread_owner = not is_worker(g.user) and g.user.id == dog_owner_id
+    is_thread_walker = is_worker(g.user) and g.user.id == dog_walker_id
+
+    if not (is_thread_owner or is_thread_walker):
+        return Response(status = 403)
+
+    if is_thread_walker and not has_conversation(dog_owner_id, dog_walker_id):
+        return Response(status = 403)
+
+    after = request.headers.get("Last-Event-ID") or request.args.get("after") or 0
+
+    try:
+        after = int(after)
+    except ValueError:
+        after = 0
+
+    keepalive = app.config["MESSAGE_STREAM_KEEPALIVE"]
+    deadline = time.monotonic() + app.config["MESSAGE_STREAM_TIMEOUT"]
+
+    def events():
+        last_seq = after
+
+        # subscribe before the first read, so nothing sent in between is missed.
+        with get_broker(app).subscribe(thread_channel(dog_owner_id, dog_walker_id)) as subscription:
+
+            while True:
+                # thread_seq follows the commit order: a message committed late never gets behind the cursor.
+                messages = (Message.query
+                            .filter(Message.dog_owner_id == dog_owner_id, Message.dog_walker_id == dog_walker_id, Message.thread_seq > last_seq)
+                            .order_by(Message.thread_seq)
+                            .all())
+
+                for msg in messages:
+                    last_seq = msg.thread_seq
+                    data = {"id": msg.id, "text": msg.text, "is_sender_worker": msg.is_sender_worker, "date": msg.date.strftime('%d %B %Y')}
+                    yield f"id: {msg.thread_seq}\ndata: {json.dumps(data)}\n\n"
+
+                # give the connection back to the pool while the client is idle.
+                db.session.close()
+
+                while True:
+                    remaining = deadline - time.monotonic()
+
+                    if remaining <= 0:
+                        return
+
+                    if subscription.get(timeout = min(keepalive, remaining)) is not None:
+                        break
+
+                    yield ": keepalive\n\n"
+
+    return Response(stream_with_context(events()), mimetype = "text/event-stream", headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 ##################################################
 # Appointment Routes
 
@@ -840,23 +1026,19 @@ def create_appointment():
     if is_worker(g.user):
         form = New_Appointment_Form()
 
-        # catching all the dog_owners that has sent a message to dog_worker.
-        dog_owners = [msg.dog_owner for msg in g.user.message]
-        
-
+        # the dog_owners that have a conversation with the dog_walker.
         form.day_period.choices = [("AM", "AM"), ("PM", "PM")]
-        form.dog_owner_id.choices = [(user.id, user.name) for user in set(dog_owners)]
+        form.dog_owner_id.choices = Conversation.contacts_of_walker(g.user.id)
 
         if form.validate_on_submit():
             newAptment = Appointment(dog_walker_id = g.user.id,dog_owner_id = form.dog_owner_id.data, date = form.date.data, time_start = form.time_start.data, day_period = form.day_period.data, duration = form.duration.data)
             
-            db.session.add(newAptment)
-            db.session.commit()
+            if book_appointment(newAptment):
+                return redirect(f"/dog_walkers/{g.user.id}/appointments")
 
-            return redirect(f"/dog_walkers/{g.user.id}/appointments")
-        
-        else:
-            return render_template("add_appointment.html", form = form)
+            flash("This appointment overlaps another one of your appointments", "danger")
+
+        return render_template("add_appointment.html", form = form)
 
     else:
         flash("Access Unauthorized", "danger")
@@ -895,7 +1077,6 @@ def review_appointment(aptment_id):
         return redirect ("/")
     
     appointment = Appointment.query.get_or_404(aptment_id)
-    dog_walker = Dog_Walker.query.get(appointment.dog_walker_id)
 
     if appointment.review or appointment.status == False:
             flash("Access Unauthorized.", "danger")
@@ -910,10 +1091,9 @@ def review_appointment(aptment_id):
 
                 review = Review(appointment_id = aptment_id, rate = form.rate.data, comment = form.comment.data)
                 db.session.add(review)
+                add_review_to_dog_walker_rate(db, appointment.dog_walker_id, review.rate)
                 db.session.commit()
 
-                calculate_dog_walker_rate(db, dog_walker)
-
                 return redirect(f"/dog_owners/{g.user.id}/done_appointments")
 
         else:
@@ -924,11 +1104,150 @@ def review_appointment(aptment_id):
         flash ("Access Unauthorized.", "danger")
         return redirect("/")
 
+##################################################
+# Export routes
+
+@app.route("/export/<dataset>")
+def export_view(dataset):
+    """Download the logged in user's appointments, messages or reviews: ?format=csv|ndjson, &gzip=1 to compress"""
+
+    if not g.user:
+        flash("You need to login first ", "danger")
+        return redirect ("/")
+
+    format = request.args.get("format", "csv")
+    gzip = request.args.get("gzip") == "1"
+
+    if dataset not in DATASETS or format not in FORMATS:
+        return Response(status = 404)
+
+    chunks = export_stream(dataset, user_kind(g.user), g.user.id, format, gzip)
+    headers = {"Content-Disposition": f"attachment; filename={export_filename(dataset, format, gzip)}", "X-Accel-Buffering": "no"}
+
+    return Response(stream_with_context(chunks), mimetype = "application/gzip" if gzip else FORMATS[format], headers = headers)
+
+##################################################
+# Metrics routes
+
+def metrics_allowed():
+    """ Without METRICS_TOKEN the metrics are open, otherwise they need `Authorization: Bearer <token>` """
+
+    token = app.config.get("METRICS_TOKEN")
+
+    return not token or request.headers.get("Authorization") == f"Bearer {token}"
+
+@app.route("/metrics")
+def metrics_view():
+    """Prometheus metrics, of every worker process in multiprocess mode"""
+
+    if not metrics_allowed():
+        return Response(status = 403)
+
+    body, content_type = render_metrics()
+
+    return Response(body, content_type = content_type)
+
+@app.route("/metrics/pool")
+def pool_metrics_view():
+    """Database connection pool health of this worker process"""
+
+    if not metrics_allowed():
+        return Response(status = 403)
+
+    return jsonify(pool_status(db.engine.pool))
+
+@app.route("/metrics/queries")
+def query_metrics_view():
+    """Queries and database time per endpoint, for this worker process"""
+
+    if not metrics_allowed():
+        return Response(status = 403)
+
+    return jsonify(query_stats.snapshot())
+
 ##################################################
 # 404 Route
 
 @app.errorhandler(404)
 def page_not_found(e):
-    """404 NOT FOUND page."""
+    """404 NOT FOUND page. Old dog_walker urls redirect to the walker's current id."""
+
+    moved_url = legacy_dog_walker_url()
+
+    if moved_url:
+        return redirect(moved_url, code = 301)
+
+    return render_template('404_page.html'), 404
+
+def legacy_dog_walker_url():
+    """ Same page with the dog_walker id it got when the users were unified (migrations/011), or None """
+
+    view_args = request.view_args or {}
+
+    if request.method != "GET" or "dog_walker_id" not in view_args:
+        return None
+
+    dog_walker_id = Dog_Walker.id_for_legacy_id(view_args["dog_walker_id"])
+
+    if dog_walker_id is None:
+        return None
+
+    return url_for(request.endpoint, **{**view_args, "dog_walker_id": dog_walker_id})
+
+##################################################
+# CLI commands
+
+@app.cli.command("refresh-breeds")
+def refresh_breeds_command():
+    """Reload the local breed catalog from TheDogApi."""
+
+    if refresh_breed_catalog():
+        print("Breed catalog refreshed.")
+    else:
+        print("TheDogApi unreachable - kept the local breed catalog.")
+
+@app.cli.command("rebuild-rates")
+def rebuild_rates_command():
+    """Recalculate every dog_walker rate from the reviews."""
+
+    rebuild_dog_walker_rates(db)
+    print("Dog walker rates rebuilt.")
+
+@app.cli.command("rebuild-unread")
+def rebuild_unread_command():
+    """Recount the unread messages of every conversation and user."""
+
+    rebuild_unread_counters(db)
+    print("Unread message counters rebuilt.")
+
+@app.cli.command("export-user")
+@click.argument("user_id", type = int)
+@click.argument("dataset", type = click.Choice(sorted(DATASETS)))
+@click.option("--format", "format", type = click.Choice(sorted(FORMATS)), default = "csv")
+@click.option("--gzip", is_flag = True, help = "Compress the output.")
+@click.option("--output", type = click.File("wb"), default = "-", help = "File to write (default: standard output).")
+def export_user_command(user_id, dataset, format, gzip, output):
+    """Export the appointments, messages or reviews of a user."""
+
+    kind = db.session.query(User.role).filter(User.id == user_id).scalar()
+
+    if kind is None:
+        raise click.ClickException(f"User {user_id} not found.")
+
+    for chunk in export_stream(dataset, kind, user_id, format, gzip):
+        output.write(chunk)
+
+@app.cli.command("purge-accounts")
+def purge_accounts_command():
+    """Queue again the account purges that did not finish (run by `flask work`)."""
+
+    for purge, result in retry_purges():
+        print(f"{purge.kind} {purge.user_id}: {result}, {purge.deleted_messages}/{purge.total_messages} messages deleted.")
+
+@app.cli.command("work")
+@click.option("--burst", is_flag = True, help = "Stop once the queue is empty.")
+def work_command(burst):
+    """Run the background jobs."""
 
-    return render_template('404_page.html'), 404
\ No newline at end of file
+    done = work(burst = burst)
+    print(f"{done} jobs run.")
@@ -0,0 +1,30 @@
+"""Who may see a dog_owner's pages.
+
+A dog_owner's profile, dogs and dog details are visible to the dog_owner and
+to the dog_walkers the owner has exchanged messages with. Having exchanged
+messages means having a conversation row (kept by the Message listener in
+models.py), so the check is one EXISTS on its unique (dog_owner_id,
+dog_walker_id) index: the same cost however many messages the owner has.
+"""
+
+from models import db, Conversation
+
+
+def has_conversation(dog_owner_id, dog_walker_id):
+    """ Have these two users exchanged messages? """
+
+    query = Conversation.query.filter_by(dog_owner_id = dog_owner_id, dog_walker_id = dog_walker_id)
+
+    return db.session.query(query.exists()).scalar()
+
+
+def can_view_dog_owner(user, dog_owner_id):
+    """ Is the user the dog_owner, or a dog_walker the owner talks to? """
+
+    if not user:
+        return False
+
+    if user.is_worker:
+        return has_conversation(dog_owner_id, user.id)
+
+    return user.id == dog_owner_id
@@ -0,0 +1,127 @@
+"""Weekly availability of the dog_walkers and their free slots.
+
+Walkers declare weekly windows (weekday, start and end in local time). The free
+slots of a date range are those windows laid on the calendar, minus the walker's
+appointments in the range. It costs two queries whatever the walker's history:
+the windows, and the appointments overlapping the range (found through the gist
+index of the ex_appointment_walker_overlap constraint). The rest is interval
+arithmetic on sorted lists.
+
+Conflicting bookings are rejected by Postgres: the exclusion constraint does not
+let two appointments of the same walker overlap, even when two requests insert
+them at the same time.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, LOCAL_TIMEZONE, Availability, Appointment
+
+DEFAULT_DAYS = 14
+EXCLUSION_VIOLATION = "23P01"
+
+
+def availability_windows(windows, start_date, days):
+    """ Lay the weekly windows on the calendar: sorted (start, end) datetimes of the date range """
+
+    by_weekday = {}
+
+    for window in windows:
+        by_weekday.setdefault(window.weekday, []).append(window)
+
+    intervals = []
+
+    for offset in range(days):
+        day = start_date + timedelta(days = offset)
+
+        for window in by_weekday.get(day.weekday(), []):
+            intervals.append((
+                datetime.combine(day, window.starts, tzinfo = LOCAL_TIMEZONE),
+                datetime.combine(day, window.ends, tzinfo = LOCAL_TIMEZONE),
+            ))
+
+    return merge_intervals(intervals)
+
+
+def merge_intervals(intervals):
+    """ Sort the intervals and join the ones that overlap or touch """
+
+    merged = []
+
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def subtract_intervals(intervals, busy):
+    """ Parts of the sorted `intervals` not covered by the sorted `busy` intervals """
+
+    free = []
+    i = 0
+
+    for start, end in intervals:
+        # busy intervals ending before this one can't cover the next ones either
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+
+        j = i
+        cursor = start
+
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > cursor:
+                free.append((cursor, busy[j][0]))
+            cursor = max(cursor, busy[j][1])
+            j += 1
+
+        if cursor < end:
+            free.append((cursor, end))
+
+    return free
+
+
+def free_slots(dog_walker_id, start_date = None, days = DEFAULT_DAYS):
+    """ Free (start, end) slots of a dog_walker, from start_date (today) for `days` days """
+
+    if start_date is None:
+        start_date = datetime.now(LOCAL_TIMEZONE).date()
+
+    windows = Availability.query.filter_by(dog_walker_id = dog_walker_id).all()
+    intervals = availability_windows(windows, start_date, days)
+
+    if not intervals:
+        return []
+
+    appointments = Appointment.overlapping(intervals[0][0], intervals[-1][1], dog_walker_id = dog_walker_id).with_entities(Appointment.starts_at, Appointment.ends_at).all()
+    busy = merge_intervals([(appointment.starts_at, appointment.ends_at) for appointment in appointments])
+
+    return subtract_intervals(intervals, busy)
+
+
+def is_schedule_conflict(error):
+    """ Whether an IntegrityError comes from the overlapping appointments constraint """
+
+    return getattr(error.orig, "pgcode", None) == EXCLUSION_VIOLATION
+
+
+def book_appointment(appointment):
+    """ Save a new appointment. False, and nothing saved, when it overlaps another appointment of the walker """
+
+    db.session.add(appointment)
+
+    try:
+        db.session.commit()
+
+    except IntegrityError as error:
+        db.session.rollback()
+
+        if is_schedule_conflict(error):
+            return False
+
+        raise
+
+    return True
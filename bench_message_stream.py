@@ -0,0 +1,66 @@
+"""Benchmark: idle message streams held by one worker process.
+
+Every idle stream is a thread blocked on its own broker subscription (this is
+what stream_messages does between events, with no database connection
+checked out). The script opens N of them, then measures the memory they use
+and how long one published event takes to reach all of them.
+
+    python bench_message_stream.py 100 1000 5000
+"""
+
+import resource
+import sys
+import threading
+import time
+
+from broker import InProcessBroker, thread_channel
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(connections):
+    broker = InProcessBroker()
+    ready = threading.Barrier(connections + 1)
+    received = threading.Semaphore(0)
+
+    def idle_stream(i):
+        with broker.subscribe(thread_channel(1, i % 10)) as subscription:
+            ready.wait()
+
+            while subscription.get(timeout = 60) is None:
+                pass
+
+            received.release()
+
+    rss_before = max_rss_kb()
+    threads = [threading.Thread(target = idle_stream, args = (i,), daemon = True) for i in range(connections)]
+
+    for thread in threads:
+        thread.start()
+
+    ready.wait()
+    rss_after = max_rss_kb()
+
+    start = time.perf_counter()
+
+    for channel in range(10):
+        broker.publish(thread_channel(1, channel), 1)
+
+    for i in range(connections):
+        received.acquire()
+
+    fan_out = time.perf_counter() - start
+
+    for thread in threads:
+        thread.join()
+
+    print(f"{connections:>6} idle streams | {(rss_after - rss_before) / connections:8.1f} KB each | fan-out to all: {fan_out * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    threading.stack_size(256 * 1024)
+
+    for connections in [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]:
+        run(connections)
@@ -0,0 +1,51 @@
+"""Benchmark: logins per second per core at each bcrypt cost.
+
+A login costs one bcrypt check. The script times the check at each cost on
+one thread (one core), then with THREADS threads through the hashing thread
+pool, to show how many cores a login burst can use.
+
+    python bench_passwords.py 10 14 4
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passwords import _hash, _check
+
+PASSWORD = "correct horse battery staple"
+
+
+def logins_per_second(hashed, seconds = 2.0):
+    done = 0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < seconds:
+        _check(hashed, PASSWORD)
+        done += 1
+
+    return done / (time.perf_counter() - start)
+
+
+def pooled_logins_per_second(hashed, threads, logins):
+    with ThreadPoolExecutor(max_workers = threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda i: _check(hashed, PASSWORD), range(logins)))
+
+        return logins / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    low = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    high = int(sys.argv[2]) if len(sys.argv) > 2 else 14
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+
+    print(f"{'cost':>4} {'ms/login':>9} {'logins/s/core':>14} {f'logins/s ({threads} threads)':>24}")
+
+    for rounds in range(low, high + 1):
+        hashed = _hash(PASSWORD, rounds)
+        single = logins_per_second(hashed)
+        pooled = pooled_logins_per_second(hashed, threads, max(threads * 4, int(single * 2)))
+
+        print(f"{rounds:>4} {1000 / single:>9.1f} {single:>14.1f} {pooled:>24.1f}")
@@ -0,0 +1,87 @@
+"""Benchmark: request latency with different connection pool settings.
+
+Every simulated request checks out a connection, runs a query that takes
+QUERY_MS, and gives the connection back. The script runs the same load
+(THREADS concurrent requests per worker, like the gthread workers) against a
+few pool settings and prints the checkout wait and the request latency.
+
+    DATABASE_URL=postgresql:///doggy_walkie python bench_pool.py 50 1000
+"""
+
+import os
+import statistics
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from pool import MeasuredQueuePool, pool_metrics
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "postgresql:///doggy_walkie")
+QUERY_MS = 5
+
+SETTINGS = {
+    "pool 5 + 0 overflow": {"poolclass": MeasuredQueuePool, "pool_size": 5, "max_overflow": 0},
+    "pool 5 + 10 overflow": {"poolclass": MeasuredQueuePool, "pool_size": 5, "max_overflow": 10},
+    "pool 20 + 10 overflow": {"poolclass": MeasuredQueuePool, "pool_size": 20, "max_overflow": 10},
+    "pool 20, pre_ping": {"poolclass": MeasuredQueuePool, "pool_size": 20, "max_overflow": 10, "pool_pre_ping": True},
+    "no pool (PgBouncer mode)": {"poolclass": NullPool},
+}
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def run(options, threads, requests):
+    engine = create_engine(DATABASE_URL, pool_timeout = 30, **options)
+    latencies = []
+    lock = threading.Lock()
+    per_thread = requests // threads
+
+    def worker():
+        for i in range(per_thread):
+            start = time.perf_counter()
+
+            with engine.connect() as conn:
+                conn.execute(f"SELECT pg_sleep({QUERY_MS / 1000})")
+
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    pool_metrics.reset()
+    started = time.perf_counter()
+
+    workers = [threading.Thread(target = worker) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    metrics = pool_metrics.snapshot()
+    waits = metrics["checkout_seconds_total"] / metrics["checkouts"] if metrics["checkouts"] else 0
+
+    return {
+        "requests/s": len(latencies) / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p95 ms": percentile(latencies, 0.95) * 1000,
+        "avg checkout wait ms": waits * 1000,
+        "overflow checkouts": metrics["overflow_checkouts"],
+    }
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    print(f"{threads} concurrent requests, {requests} requests, {QUERY_MS} ms per query")
+
+    for name, options in SETTINGS.items():
+        result = run(options, threads, requests)
+        print(f"{name:>26}: " + ", ".join(f"{key} {value:.1f}" for key, value in result.items()))
@@ -0,0 +1,179 @@
+"""Local breed catalog for the dog forms.
+
+The breeds list used to be requested from TheDogApi on every GET and POST of
+the add/edit dog pages. Now the catalog lives in the `breed` table and is
+refreshed from the upstream only when it is older than BREED_CATALOG_TTL.
+A stale catalog is refreshed by a background job; until it runs (or when
+TheDogApi is unreachable) the pages keep rendering with the stale rows.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+import requests
+from flask import current_app
+
+import config
+from models import db, Breed
+from jobs import job, enqueue
+from metrics import external_call
+
+BREEDS_URL = "https://api.thedogapi.com/v1/breeds"
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "thedogapi_breeds.json")
+
+DEFAULT_TTL = 60 * 60 * 24
+STALE_CHOICES_TTL = 60
+UPSTREAM_TIMEOUT = 5
+
+# in-process cache of the (name, name) choices list used by Dog_Form and Edit_Dog_Form.
+_choices_cache = {"choices": None, "expires_at": None, "refresh_key": None}
+
+
+def api_params():
+    """ Params used to authenticate on TheDogApi """
+
+    return {
+        "x-api-key": config.api_key if config.api_key is not None else os.getenv("DOG_API_KEY", "optional-default")
+    }
+
+
+def catalog_ttl():
+    """ How long (in seconds) the local catalog is considered fresh """
+
+    return current_app.config.get("BREED_CATALOG_TTL", DEFAULT_TTL)
+
+
+def fetch_upstream_breeds():
+    """ Request the full breeds list from TheDogApi. Raises on network/HTTP errors. """
+
+    with external_call("thedogapi"):
+        res = requests.get(BREEDS_URL, params = api_params(), timeout = UPSTREAM_TIMEOUT)
+        res.raise_for_status()
+
+    return res.json()
+
+
+def load_snapshot(path = SNAPSHOT_PATH):
+    """ Read the recorded breeds snapshot shipped with the app """
+
+    with open(path) as snapshot:
+        return json.load(snapshot)
+
+
+def save_breeds(data):
+    """ Upsert the breeds list into the local catalog """
+
+    now = datetime.utcnow()
+    existing = {breed.name: breed for breed in Breed.query.all()}
+
+    for result in data:
+        breed = existing.get(result["name"])
+
+        if breed is None:
+            breed = Breed(name = result["name"])
+            db.session.add(breed)
+
+        breed.temperament = result.get("temperament")
+        breed.fetched_at = now
+
+    db.session.commit()
+    invalidate_breed_choices()
+
+
+@job("refresh_breed_catalog", max_attempts = 3)
+def refresh_breed_catalog():
+    """ Reload the local catalog from TheDogApi.
+
+    Returns True when the catalog was refreshed. If the upstream is unreachable the
+    current rows are kept, and an empty catalog is filled from the recorded snapshot.
+    """
+
+    if current_app.config.get("BREED_CATALOG_OFFLINE"):
+        data = None
+
+    else:
+        try:
+            data = fetch_upstream_breeds()
+
+        except (requests.RequestException, ValueError):
+            current_app.logger.warning("TheDogApi is unreachable, keeping the local breed catalog.")
+            data = None
+
+    if data:
+        save_breeds(data)
+        return True
+
+    if Breed.query.first() is None:
+        save_breeds(load_snapshot())
+
+    return False
+
+
+def _schedule_refresh():
+    """ Queue the revalidation of the stale catalog, at most once per hour """
+
+    key = f"refresh_breed_catalog:{datetime.utcnow():%Y-%m-%dT%H}"
+
+    if _choices_cache["refresh_key"] == key:
+        return
+
+    enqueue("refresh_breed_catalog", idempotency_key = key)
+    db.session.commit()
+
+    _choices_cache["refresh_key"] = key
+
+
+def is_catalog_stale():
+    """ Is the newest catalog row older than the TTL? """
+
+    last_fetch = db.session.query(db.func.max(Breed.fetched_at)).scalar()
+
+    if last_fetch is None:
+        return None
+
+    return datetime.utcnow() - last_fetch > timedelta(seconds = catalog_ttl())
+
+
+def get_breed_choices():
+    """ (name, name) choices for the breed SelectField, served from memory when fresh """
+
+    now = datetime.utcnow()
+
+    if _choices_cache["choices"] is not None and _choices_cache["expires_at"] > now:
+        return _choices_cache["choices"]
+
+    stale = is_catalog_stale()
+
+    if stale is None:
+        # nothing local yet: this is the only time a request waits on the upstream.
+        refresh_breed_catalog()
+
+    elif stale and not current_app.config.get("BREED_CATALOG_OFFLINE"):
+        _schedule_refresh()
+
+    breed_list = [(breed.name, breed.name) for breed in Breed.query.order_by(Breed.name)]
+    breed_list.append(("Other", "Other"))
+
+    # a stale list is kept only briefly, so the revalidated catalog shows up soon after the refresh job.
+    ttl = current_app.config.get("BREED_CHOICES_STALE_TTL", STALE_CHOICES_TTL) if stale else catalog_ttl()
+
+    _choices_cache["choices"] = breed_list
+    _choices_cache["expires_at"] = now + timedelta(seconds = ttl)
+
+    return breed_list
+
+
+def get_breed_temperament(name):
+    """ Temperament of the breed from the local catalog, or None for unknown breeds """
+
+    breed = Breed.query.filter_by(name = name).first()
+
+    return breed.temperament if breed else None
+
+
+def invalidate_breed_choices():
+    """ Drop the in-process choices list so the next form reads the catalog again """
+
+    _choices_cache["choices"] = None
+    _choices_cache["expires_at"] = None
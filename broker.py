@@ -0,0 +1,191 @@
+"""Publish/subscribe of new message events for the message streams.
+
+Every worker process keeps a local fan-out: the clients waiting on a thread
+block on their own in-memory queue, they do not poll the database. When an
+event arrives for the thread, each waiting stream runs one query for the new
+rows.
+
+- InProcessBroker: events only reach the subscribers of the same process
+  (single worker, development and tests).
+- PostgresBroker: events are sent with NOTIFY, and one LISTEN connection per
+  worker process feeds the local fan-out, so all gunicorn workers see them.
+
+An event published with a session goes out when the session's transaction
+commits, and never for a rollback: Postgres sends the NOTIFY at commit, and
+the in-process broker holds the event until the session's after_commit.
+"""
+
+import json
+import queue
+import select
+import threading
+from collections import defaultdict
+
+import psycopg2
+from sqlalchemy import event as orm_event, text
+from sqlalchemy.orm import Session
+
+from models import db
+
+NOTIFY_CHANNEL = "doggy_walkie_events"
+PENDING_EVENTS = "broker_pending_events"
+
+
+def thread_channel(dog_owner_id, dog_walker_id):
+    """ Channel name for the messages between two users """
+
+    return f"thread:{dog_owner_id}:{dog_walker_id}"
+
+
+class Subscription:
+    """One waiting client of a channel."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.events = queue.Queue()
+
+    def get(self, timeout):
+        """ Wait for the next event, None when the timeout expires """
+
+        try:
+            return self.events.get(timeout = timeout)
+
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class InProcessBroker:
+    """Fan-out of events to the subscribers of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def publish(self, channel, event, session = None):
+        """ Deliver the event now, or when the session's transaction commits """
+
+        if session is None:
+            self.deliver(channel, event)
+        else:
+            session.info.setdefault(PENDING_EVENTS, []).append((self, channel, event))
+
+    def deliver(self, channel, event):
+        """ Hand the event to every local subscriber of the channel """
+
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+
+        for subscription in subscriptions:
+            subscription.events.put_nowait(event)
+
+
+class PostgresBroker(InProcessBroker):
+    """Events travel through Postgres NOTIFY/LISTEN, so they reach every worker process."""
+
+    def __init__(self, dsn, session):
+        super().__init__()
+        self.dsn = dsn
+        self.session = session
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, channel):
+        self._start_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event, session = None):
+        """ NOTIFY in the session's transaction: Postgres sends it on commit """
+
+        payload = json.dumps({"channel": channel, "event": event})
+
+        (session or self.session).execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target = self._listen, daemon = True)
+                self._listener.start()
+
+    def _listen(self):
+        """ One LISTEN connection for the whole process """
+
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+        try:
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+
+                conn.poll()
+
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    data = json.loads(notify.payload)
+                    self.deliver(data["channel"], data["event"])
+        finally:
+            conn.close()
+
+
+@orm_event.listens_for(Session, "after_commit")
+def deliver_pending_events(session):
+    for broker, channel, event in session.info.pop(PENDING_EVENTS, []):
+        broker.deliver(channel, event)
+
+
+@orm_event.listens_for(Session, "after_soft_rollback")
+def drop_pending_events(session, previous_transaction):
+    session.info.pop(PENDING_EVENTS, None)
+
+
+def make_broker(app):
+    """ Broker selected by the MESSAGE_BROKER setting ('postgres' or 'memory') """
+
+    if app.config.get("MESSAGE_BROKER") == "postgres":
+        return PostgresBroker(app.config["SQLALCHEMY_DATABASE_URI"], db.session)
+
+    return InProcessBroker()
+
+
+def get_broker(app):
+    """ The broker of this process, created on first use """
+
+    if "message_broker" not in app.extensions:
+        app.extensions["message_broker"] = make_broker(app)
+
+    return app.extensions["message_broker"]
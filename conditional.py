@@ -0,0 +1,48 @@
+"""Conditional GET (ETag / If-None-Match) for pages that rarely change.
+
+A view builds the ETag of the page from a cheap validator (the last message id
+of a thread, the appointment list version of the user) before running its
+queries. When the browser already has that version, the view answers
+`304 Not Modified` with no query and no template render.
+
+Besides the validator, the ETag covers what every page shows around its
+content: the URL, the logged in user (id, role, profile version and the unread
+messages of the navbar badge) and the CSRF token of the forms, which
+Flask-WTF expires after WTF_CSRF_TIME_LIMIT (the tag changes every half of it). Pages with flash messages waiting are always
+rendered, the flashes have to be shown once.
+"""
+
+import hashlib
+import time
+
+from flask import current_app, g, make_response, request, session
+
+
+def page_etag(*validator):
+    """ ETag of the current page for the logged in user """
+
+    limit = current_app.config.get("WTF_CSRF_TIME_LIMIT", 3600)
+    csrf_window = int(time.time() // (limit / 2)) if limit else 0
+
+    parts = (request.full_path, g.user.id, g.user.role, g.user.version, g.user.unread_messages, csrf_window) + validator
+
+    return hashlib.sha1(repr(parts).encode("UTF-8")).hexdigest()
+
+
+def not_modified(etag):
+    """ 304 response when the browser has this version of the page, None otherwise """
+
+    if session.get("_flashes") or not request.if_none_match.contains(etag):
+        return None
+
+    return with_etag(current_app.response_class(status = 304), etag)
+
+
+def with_etag(response, etag):
+    """ The response, tagged and to be revalidated on every visit """
+
+    response = make_response(response)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    return response
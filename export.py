@@ -0,0 +1,138 @@
+"""Data export of a user's appointments, messages and reviews.
+
+The rows are read through a server side cursor, EXPORT_BATCH_SIZE at a time
+(`yield_per`), as plain tuples: nothing goes into the session. They are
+written out as they arrive, in CSV or NDJSON, and optionally gzipped on the
+fly, so the memory used is the same for ten messages or a million. The same
+stream feeds the download (`/export/<dataset>`) and `flask export-user`.
+
+The database connection stays checked out until the last row is sent.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy.orm import aliased
+
+from models import db, User, Message, Appointment, Review
+
+EXPORT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def appointments_query(kind, user_id):
+    owner = aliased(User)
+    walker = aliased(User)
+
+    column = Appointment.dog_owner_id if kind == "dog_owner" else Appointment.dog_walker_id
+
+    return (db.session.query(Appointment.id, Appointment.starts_at, Appointment.ends_at, Appointment.duration_minutes, Appointment.status,
+                             Appointment.dog_owner_id, owner.name.label("dog_owner"), Appointment.dog_walker_id, walker.name.label("dog_walker"))
+            .join(owner, owner.id == Appointment.dog_owner_id)
+            .join(walker, walker.id == Appointment.dog_walker_id)
+            .filter(column == user_id)
+            .order_by(Appointment.starts_at, Appointment.id))
+
+
+def messages_query(kind, user_id):
+    column = Message.dog_owner_id if kind == "dog_owner" else Message.dog_walker_id
+    sender = db.case([(Message.is_sender_worker, "dog_walker")], else_ = "dog_owner").label("sender")
+
+    return (db.session.query(Message.id, Message.dog_owner_id, Message.dog_walker_id, Message.thread_seq, Message.date, sender, Message.read, Message.text)
+            .filter(column == user_id)
+            .order_by(Message.id))
+
+
+def reviews_query(kind, user_id):
+    column = Appointment.dog_owner_id if kind == "dog_owner" else Appointment.dog_walker_id
+
+    return (db.session.query(Review.id, Review.appointment_id, Appointment.starts_at, Appointment.dog_owner_id, Appointment.dog_walker_id, Review.rate, Review.comment)
+            .join(Appointment, Appointment.id == Review.appointment_id)
+            .filter(column == user_id)
+            .order_by(Review.id))
+
+
+DATASETS = {"appointments": appointments_query, "messages": messages_query, "reviews": reviews_query}
+
+
+def export_rows(dataset, kind, user_id):
+    """ (column names, iterator of the rows) of the user's dataset, fetched in batches """
+
+    query = DATASETS[dataset](kind, user_id)
+    columns = [description["name"] for description in query.column_descriptions]
+
+    return columns, query.yield_per(current_app.config.get("EXPORT_BATCH_SIZE", EXPORT_BATCH_SIZE))
+
+
+def json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    return str(value)
+
+
+def csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for row in rows:
+        writer.writerow(row)
+
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(columns, rows):
+    lines = []
+    size = 0
+
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), default = json_value) + "\n"
+        lines.append(line)
+        size += len(line)
+
+        if size >= CHUNK_SIZE:
+            yield "".join(lines)
+            lines = []
+            size = 0
+
+    yield "".join(lines)
+
+
+def gzip_chunks(chunks):
+    """ The chunks compressed as one gzip stream """
+
+    compressor = zlib.compressobj(wbits = 16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+def export_stream(dataset, kind, user_id, format = "csv", gzip = False):
+    """ Bytes of the user's dataset in the format, produced while the rows are read """
+
+    columns, rows = export_rows(dataset, kind, user_id)
+    text = csv_chunks(columns, rows) if format == "csv" else ndjson_chunks(columns, rows)
+    chunks = (chunk.encode("UTF-8") for chunk in text if chunk)
+
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def export_filename(dataset, format = "csv", gzip = False):
+    return f"{dataset}.{format}" + (".gz" if gzip else "")
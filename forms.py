@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, TextAreaField, IntegerField, BooleanField, DateField, SelectField
-from wtforms.validators import DataRequired, Email, Length
+from wtforms.validators import DataRequired, Email, Length, Regexp
 
 
 class UserAddForm(FlaskForm):
@@ -17,7 +17,6 @@ class LoginForm(FlaskForm):
 
     email = StringField('E-mail', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[Length(min=6)])
-    dog_walker_check = BooleanField('Are you a Dog Walker?')
 
 class Dog_Owner_Profile_Form(FlaskForm):
     """Form to edit dog_owner profile"""
@@ -78,9 +77,16 @@ class New_Appointment_Form(FlaskForm):
 
     dog_owner_id = SelectField("Costumer", coerce = int, validators=[DataRequired()])
     date = DateField('Date', format='%m-%d-%Y', validators=[DataRequired(message="Type date as 05-25-2021")])
-    time_start = StringField('Start at', validators=[DataRequired()])
+    time_start = StringField('Start at', validators=[DataRequired(), Regexp(r"^(0?[1-9]|1[0-2])(:[0-5][0-9])?$", message="Type time as 03:30")])
     day_period = SelectField("AM or PM?", validators=[DataRequired()])
-    duration = StringField('Duration', validators=[DataRequired()])
+    duration = StringField('Duration', validators=[DataRequired(), Regexp(r"^[0-9]+$", message="Type the duration in minutes")])
+
+class Availability_Form(FlaskForm):
+    """Form to add a weekly availability window (dog_walker)"""
+
+    weekday = SelectField("Weekday", coerce = int)
+    starts = StringField('From', validators=[DataRequired(), Regexp(r"^([01]?[0-9]|2[0-3]):[0-5][0-9]$", message="Type time as 09:00")])
+    ends = StringField('To', validators=[DataRequired(), Regexp(r"^([01]?[0-9]|2[0-3]):[0-5][0-9]$", message="Type time as 17:30")])
 
 class Review_Form(FlaskForm):
     """Form to create a review about the Appointment"""
@@ -0,0 +1,182 @@
+"""Cache of the rendered dog_walker fragments.
+
+The parts of a walker's pages that are the same for every viewer (the profile
+sidebar and the search card) are rendered once and kept in the cache, keyed by
+the walker id and the walker's `version`. Everything that changes them bumps
+the version in the same transaction: the profile edit, the address and the
+rating update. The next view then misses and renders the new fragment, and
+the old one is never read again (it ages out of the LRU or its TTL).
+
+The backend is set by FRAGMENT_CACHE:
+
+- 'lru' (default): an in-process LRU of FRAGMENT_CACHE_SIZE entries, one per
+  worker process.
+- 'redis': a Redis compatible server at FRAGMENT_CACHE_URL, shared by every
+  worker and node. Entries expire after FRAGMENT_CACHE_TTL seconds.
+- 'none': no caching.
+
+Hits and misses are counted per fragment in the
+doggy_walkie_fragment_cache_requests_total metric.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import current_app, render_template, Markup
+
+from metrics import FRAGMENT_CACHE
+
+DEFAULT_SIZE = 1024
+DEFAULT_TTL = 60 * 60
+
+logger = logging.getLogger("doggy_walkie.cache")
+
+
+class LRUCache:
+    """Least recently used entries of this process"""
+
+    def __init__(self, size = DEFAULT_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+
+            if value is not None:
+                self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value, ttl = None):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.size:
+                self._entries.popitem(last = False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Entries in a Redis compatible server, shared by every process.
+
+    A server that can't be reached counts as a miss: the page is rendered
+    without the cache.
+    """
+
+    def __init__(self, url = None, client = None):
+        import redis
+
+        self._errors = redis.RedisError
+        self._client = client if client is not None else redis.Redis.from_url(url)
+
+    def get(self, key):
+        try:
+            value = self._client.get(key)
+
+        except self._errors:
+            logger.warning("Fragment cache unavailable", exc_info = True)
+            return None
+
+        return value.decode("UTF-8") if value is not None else None
+
+    def set(self, key, value, ttl = None):
+        try:
+            self._client.set(key, value, ex = ttl)
+
+        except self._errors:
+            logger.warning("Fragment cache unavailable", exc_info = True)
+
+    def clear(self):
+        """ Drop the fragments, and only them: the server may be shared """
+
+        try:
+            keys = list(self._client.scan_iter(match = "fragment:*"))
+
+            if keys:
+                self._client.delete(*keys)
+
+        except self._errors:
+            logger.warning("Fragment cache unavailable", exc_info = True)
+
+
+class NoCache:
+    """Every lookup misses"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl = None):
+        pass
+
+    def clear(self):
+        pass
+
+
+def make_fragment_cache(app):
+    """ Backend selected by the FRAGMENT_CACHE setting ('lru', 'redis' or 'none') """
+
+    kind = app.config.get("FRAGMENT_CACHE", "lru")
+
+    if kind == "redis":
+        return RedisCache(app.config["FRAGMENT_CACHE_URL"])
+
+    if kind == "none":
+        return NoCache()
+
+    return LRUCache(app.config.get("FRAGMENT_CACHE_SIZE", DEFAULT_SIZE))
+
+
+def get_fragment_cache(app):
+    """ The fragment cache of this process, created on first use """
+
+    if "fragment_cache" not in app.extensions:
+        app.extensions["fragment_cache"] = make_fragment_cache(app)
+
+    return app.extensions["fragment_cache"]
+
+
+def fragment_key(fragment, dog_walker_id, version):
+    return f"fragment:{fragment}:dog_walker:{dog_walker_id}:v{version}"
+
+
+def cached_fragment(fragment, dog_walker, template):
+    """ The rendered template for this version of the walker, from the cache when possible """
+
+    app = current_app._get_current_object()
+    cache = get_fragment_cache(app)
+    key = fragment_key(fragment, dog_walker.id, dog_walker.version)
+
+    html = cache.get(key)
+
+    if html is None:
+        FRAGMENT_CACHE.labels(fragment, "miss").inc()
+
+        html = render_template(template, dog_walker = dog_walker)
+        cache.set(key, html, app.config.get("FRAGMENT_CACHE_TTL", DEFAULT_TTL))
+
+    else:
+        FRAGMENT_CACHE.labels(fragment, "hit").inc()
+
+    return Markup(html)
+
+
+def dog_walker_profile_fragment(dog_walker):
+    return cached_fragment("profile", dog_walker, "dog_walker/dog_walker_profile.html")
+
+
+def dog_walker_card_fragment(dog_walker):
+    return cached_fragment("card", dog_walker, "dog_walker/dog_walker_card.html")
+
+
+def init_fragment_cache(app):
+    """ Make the fragments available to the templates """
+
+    app.add_template_global(dog_walker_profile_fragment)
+    app.add_template_global(dog_walker_card_fragment)
@@ -1,34 +1,112 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import User, Dog_Walker
+
+
 def is_worker(user):
-    """ Function to check the user type: Dog_Owner or Dog_Walker """
-    try:
-        user.description
+    """ Function to check the user type: Dog_Owner or Dog_Walker (False without a user) """
+
+    return user is not None and user.is_worker
+
+def add_review_to_dog_walker_rate(db, dog_walker_id, rate):
+    """ Function that adds one review rate to the dog_walker running totals.
 
-    except AttributeError:
-        return False
-    
-    return True
+    It is an UPDATE of the totals plus one of the walker version (no commit): call it in the same transaction as the Review insert.
+    """
 
-def calculate_dog_walker_rate(db, dog_walker):
-    """ Function that will get the rate average for an specific dog_walker """
+    Dog_Walker.query.filter_by(id = dog_walker_id).update({
+        Dog_Walker.review_count: Dog_Walker.review_count + 1,
+        Dog_Walker.rate_sum: Dog_Walker.rate_sum + rate,
+        Dog_Walker.rate: db.cast(Dog_Walker.rate_sum + rate, db.Numeric) / (Dog_Walker.review_count + 1),
+    }, synchronize_session = False)
 
-    appointments = dog_walker.appointments
+    # the cached profile and search card show the rate (fragments.py)
+    User.query.filter_by(id = dog_walker_id).update({User.version: User.version + 1}, synchronize_session = False)
 
-    reviews_list = [aptment.review for aptment in appointments if len(aptment.review) > 0]
-    rates = []
+def remove_dog_owner_reviews_from_rates(db, dog_owner_id):
+    """ Function that takes the reviews of a dog_owner out of the dog_walkers running totals.
 
-    for reviews in reviews_list:
-        for review in reviews:
-            rates.append(review.rate)
+    It is an UPDATE of the totals plus one of the walker versions (no commit): call it in the same transaction that deletes the dog_owner.
+    """
 
-    average = sum(rates)/len(rates)
+    db.session.execute("""
+        UPDATE dog_walker
+        SET review_count = dog_walker.review_count - totals.review_count,
+            rate_sum = dog_walker.rate_sum - totals.rate_sum,
+            rate = CAST(dog_walker.rate_sum - totals.rate_sum AS NUMERIC) / NULLIF(dog_walker.review_count - totals.review_count, 0)
+        FROM (
+            SELECT appointment.dog_walker_id, COUNT(review.id) AS review_count, SUM(review.rate) AS rate_sum
+            FROM review
+            JOIN appointment ON appointment.id = review.appointment_id
+            WHERE appointment.dog_owner_id = :dog_owner_id
+            GROUP BY appointment.dog_walker_id
+        ) AS totals
+        WHERE dog_walker.id = totals.dog_walker_id
+    """, {"dog_owner_id": dog_owner_id})
 
-    dog_walker.rate = average
-    db.session.add(dog_walker)
+    db.session.execute("""
+        UPDATE app_user
+        SET version = app_user.version + 1
+        FROM appointment
+        WHERE appointment.dog_owner_id = :dog_owner_id
+          AND app_user.id = appointment.dog_walker_id
+          AND EXISTS (SELECT 1 FROM review WHERE review.appointment_id = appointment.id)
+    """, {"dog_owner_id": dog_owner_id})
+
+def rebuild_dog_walker_rates(db):
+    """ Function that recalculates the rate totals of every dog_walker at once (for backfills) """
+
+    db.session.execute("""
+        UPDATE dog_walker
+        SET review_count = COALESCE(totals.review_count, 0),
+            rate_sum = COALESCE(totals.rate_sum, 0),
+            rate = CAST(totals.rate_sum AS NUMERIC) / NULLIF(totals.review_count, 0)
+        FROM dog_walker AS walker
+        LEFT JOIN (
+            SELECT appointment.dog_walker_id, COUNT(review.id) AS review_count, SUM(review.rate) AS rate_sum
+            FROM review
+            JOIN appointment ON appointment.id = review.appointment_id
+            GROUP BY appointment.dog_walker_id
+        ) AS totals ON totals.dog_walker_id = walker.id
+        WHERE dog_walker.id = walker.id
+    """)
+    db.session.execute("UPDATE app_user SET version = version + 1 WHERE role = 'dog_walker'")
     db.session.commit()
 
+def encode_keyset_cursor(cursor):
+    """ Function that turns a (datetime, id) cursor of messages or appointments into a string for the URL """
+
+    date, row_id = cursor
+    return f"{date.isoformat()}_{row_id}"
+
+def decode_keyset_cursor(text):
+    """ Function that reads a (datetime, id) cursor from the URL, None if it is missing or invalid """
+
+    try:
+        date, row_id = text.replace(" ", "+").split("_")
+        return datetime.fromisoformat(date), int(row_id)
+
+    except (AttributeError, ValueError):
+        return None
 
 
+class QueryCounter:
+    """ Context manager that counts the SQL statements sent to the database inside it """
 
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.statements = []
 
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
 
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
 
+    def __exit__(self, *args):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
@@ -0,0 +1,22 @@
+"""gunicorn settings read on start (gunicorn loads ./gunicorn.conf.py by default)."""
+
+import glob
+import os
+
+METRICS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir")
+
+
+def on_starting(server):
+    """ Start the metrics from zero: remove the files of the previous run (see metrics.py) """
+
+    if METRICS_DIR:
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.db")):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    """ Drop the metrics files of a worker that exited """
+
+    if METRICS_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
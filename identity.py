@@ -0,0 +1,143 @@
+"""Logged in user identity.
+
+The session keeps a small "principal" for the logged in user (id, kind, name,
+photo, address summary, the profile version and the unread messages count).
+Pages that only need to know who is logged in (the navbar, redirects, the 404
+page) read `g.principal` and never touch the database. The full `g.user`
+entity is loaded on first use, at most once per request, and refreshes the
+principal when the profile version or the unread count changed.
+"""
+
+from flask import session, g
+from flask.ctx import _AppCtxGlobals
+
+from models import Dog_Owner, Dog_Walker
+from functions import is_worker
+
+CURR_USER_KEY = "curr_user"
+PRINCIPAL_KEY = "principal"
+
+
+def user_kind(user):
+    """ 'dog_walker' or 'dog_owner' """
+
+    return "dog_walker" if is_worker(user) else "dog_owner"
+
+
+def make_principal(user):
+    """ Compact, session friendly summary of the user """
+
+    address = user.address
+
+    return {
+        "id": user.id,
+        "kind": user_kind(user),
+        "name": user.name,
+        "photo": user.photo,
+        "address": f"{address.neighbor}, {address.city}" if address else None,
+        "version": user.version,
+        "unread": user.unread_messages,
+    }
+
+
+def remember_user(user):
+    """ Store the user identity in the signed session """
+
+    session[CURR_USER_KEY] = user.id
+    session["is_worker"] = is_worker(user)
+    session[PRINCIPAL_KEY] = make_principal(user)
+
+
+def remember_unread(count):
+    """ Update the unread messages count of the principal (the navbar badge) """
+
+    principal = session.get(PRINCIPAL_KEY)
+
+    if principal:
+        session[PRINCIPAL_KEY] = dict(principal, unread = count)
+
+
+def forget_user():
+    """ Remove the user identity from the session """
+
+    session.pop(CURR_USER_KEY, None)
+    session.pop("is_worker", None)
+    session.pop(PRINCIPAL_KEY, None)
+
+
+def _session_principal():
+    """ The principal in the session, if it belongs to the logged in user """
+
+    principal = session.get(PRINCIPAL_KEY)
+    kind = "dog_walker" if session.get("is_worker") else "dog_owner"
+
+    if principal and principal["id"] == session.get(CURR_USER_KEY) and principal["kind"] == kind:
+        return principal
+
+    return None
+
+
+def load_current_user():
+    """ Load the logged in user entity: one primary key lookup """
+
+    if CURR_USER_KEY not in session:
+        return None
+
+    model = Dog_Walker if session.get("is_worker") else Dog_Owner
+    user = model.query.get(session[CURR_USER_KEY])
+
+    # the account was deleted (or its id changed): log the session out
+    if user is None:
+        forget_user()
+        g.principal = None
+        return None
+
+    principal = _session_principal()
+
+    if principal is None or principal["version"] != user.version:
+        session[PRINCIPAL_KEY] = make_principal(user)
+
+    elif principal.get("unread") != user.unread_messages:
+        remember_unread(user.unread_messages)
+
+    return user
+
+
+def load_current_principal():
+    """ The principal from the session, loading the user only for sessions without one """
+
+    if CURR_USER_KEY not in session:
+        return None
+
+    principal = _session_principal()
+
+    if principal is None and g.user:
+        principal = session[PRINCIPAL_KEY]
+
+    return principal
+
+
+class RequestGlobals(_AppCtxGlobals):
+    """Flask `g` where `user` and `principal` are resolved lazily, on first access."""
+
+    @property
+    def user(self):
+        if "_user" not in self.__dict__:
+            self._user = load_current_user()
+
+        return self._user
+
+    @user.setter
+    def user(self, value):
+        self._user = value
+
+    @property
+    def principal(self):
+        if "_principal" not in self.__dict__:
+            self._principal = load_current_principal()
+
+        return self._principal
+
+    @principal.setter
+    def principal(self, value):
+        self._principal = value
@@ -0,0 +1,219 @@
+"""Per-request database instrumentation.
+
+Every statement sent by SQLAlchemy during a request is timed (the
+before/after_cursor_execute engine events) and counted on the request, by
+statement shape: the SQL with its parameters, numbers and strings replaced by
+`?`. When the request ends (Flask's request_finished signal):
+
+- statements slower than SLOW_QUERY_MS are logged with their shape;
+- a shape run more than N_PLUS_ONE_THRESHOLD times is logged as a likely
+  N+1 (a query per row of a list);
+- the counts go to per-endpoint histograms (`query_stats`, one per process);
+- with QUERY_STATS_HEADERS (or in debug) the response gets X-Query-Count,
+  X-Query-Time-Ms and X-Query-N-Plus-One headers.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request, request_started, request_finished
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = 200
+N_PLUS_ONE_THRESHOLD = 10
+
+# upper bounds of the per-request histograms
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, float("inf"))
+DB_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf"))
+
+logger = logging.getLogger("doggy_walkie.sql")
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement):
+    """ Shape of a statement: the same query with other values gives the same shape """
+
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _STRING.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+
+    return _SPACES.sub(" ", shape).strip()
+
+
+class RequestQueries:
+    """Statements run during one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.slow = []
+
+    def add(self, statement, seconds, slow_seconds):
+        shape = normalize_sql(statement)
+
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[shape] += 1
+
+        if seconds >= slow_seconds:
+            self.slow.append((shape, seconds))
+
+    def repeated(self, threshold):
+        """ (shape, times) of the shapes run more than `threshold` times """
+
+        return [(shape, times) for shape, times in self.shapes.most_common() if times > threshold]
+
+
+class Histogram:
+    """Cumulative counts per upper bound, plus sum and count"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def snapshot(self):
+        return {
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+            "sum": round(self.sum, 6),
+            "count": self.count,
+        }
+
+
+class QueryStats:
+    """Per-endpoint query histograms of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+
+    def observe(self, endpoint, queries, n_plus_one):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    "requests": 0,
+                    "queries": Histogram(QUERY_COUNT_BUCKETS),
+                    "db_seconds": Histogram(DB_SECONDS_BUCKETS),
+                    "slow_queries": 0,
+                    "n_plus_one": 0,
+                }
+
+            stats["requests"] += 1
+            stats["queries"].observe(queries.count)
+            stats["db_seconds"].observe(queries.seconds)
+            stats["slow_queries"] += len(queries.slow)
+            stats["n_plus_one"] += 1 if n_plus_one else 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": stats["requests"],
+                    "queries": stats["queries"].snapshot(),
+                    "db_seconds": stats["db_seconds"].snapshot(),
+                    "slow_queries": stats["slow_queries"],
+                    "n_plus_one": stats["n_plus_one"],
+                }
+                for endpoint, stats in self.endpoints.items()
+            }
+
+
+query_stats = QueryStats()
+
+
+def _current_queries():
+    if not has_app_context():
+        return None
+
+    return g.get("_request_queries")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_queries() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current_queries()
+    starts = conn.info.get("query_start")
+
+    if queries is None or not starts:
+        return
+
+    seconds = time.perf_counter() - starts.pop()
+    queries.add(statement, seconds, g._slow_query_seconds)
+
+
+def _handle_error(context):
+    # after_cursor_execute won't run for a failed statement
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+
+    if starts:
+        starts.pop()
+
+
+def _request_started(app, **extra):
+    g._request_queries = RequestQueries()
+    g._slow_query_seconds = app.config.get("SLOW_QUERY_MS", SLOW_QUERY_MS) / 1000
+
+
+def _request_finished(app, response, **extra):
+    queries = g.pop("_request_queries", None)
+
+    if queries is None:
+        return
+
+    endpoint = request.endpoint or "unmatched"
+
+    for shape, seconds in queries.slow:
+        logger.warning("Slow query (%.1f ms) in %s: %s", seconds * 1000, endpoint, shape)
+
+    repeated = queries.repeated(app.config.get("N_PLUS_ONE_THRESHOLD", N_PLUS_ONE_THRESHOLD))
+
+    for shape, times in repeated:
+        logger.warning("Possible N+1 in %s, ran %s times: %s", endpoint, times, shape)
+
+    query_stats.observe(endpoint, queries, repeated)
+
+    if app.config.get("QUERY_STATS_HEADERS") or app.debug:
+        response.headers["X-Query-Count"] = str(queries.count)
+        response.headers["X-Query-Time-Ms"] = f"{queries.seconds * 1000:.1f}"
+        response.headers["X-Query-N-Plus-One"] = str(len(repeated))
+
+
+def init_query_instrumentation(app):
+    """ Listen to every engine and to the requests of the app """
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+    request_started.connect(_request_started, app)
+    request_finished.connect(_request_finished, app)
@@ -0,0 +1,186 @@
+"""Background jobs, queued in the `job` table.
+
+Views enqueue slow side effects and return right away; `flask work` runs them.
+Only Postgres is needed:
+
+- enqueue() inserts the job in the caller's transaction, so the job exists only
+  if the request commits. Jobs with an idempotency key are enqueued once.
+- Workers claim jobs with `FOR UPDATE SKIP LOCKED`: any number of workers can
+  poll the same table without waiting on each other or running a job twice.
+- A job that raises is retried with exponential backoff, up to its
+  max_attempts, then marked as failed. Jobs left running by a dead worker are
+  queued again after JOB_LOCK_TIMEOUT; long jobs call touch_job() as they go
+  to show they are alive. Handlers have to be safe to run again.
+- With JOBS_EAGER the jobs run in the process that enqueues them (tests and
+  local development without a worker).
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import db, Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE = 30
+BACKOFF_MAX = 60 * 60
+LOCK_TIMEOUT = 10 * 60
+POLL_INTERVAL = 1
+
+_handlers = {}
+
+# the job run by this thread's worker, for touch_job()
+_running = threading.local()
+
+
+def job(name, max_attempts = DEFAULT_MAX_ATTEMPTS):
+    """ Decorator registering a function as the handler of the `name` jobs """
+
+    def register(function):
+        _handlers[name] = (function, max_attempts)
+        return function
+
+    return register
+
+
+def run_handler(name, payload):
+    function = _handlers[name][0]
+    return function(**payload)
+
+
+def backoff(attempts):
+    """ Seconds to wait before trying a job again """
+
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def enqueue(name, payload = None, idempotency_key = None, delay = 0):
+    """ Add a job to the current transaction (the caller commits) """
+
+    if name not in _handlers:
+        raise KeyError(f"Unknown job: {name}")
+
+    payload = payload or {}
+
+    if current_app.config.get("JOBS_EAGER"):
+        run_handler(name, payload)
+        return
+
+    max_attempts = _handlers[name][1]
+    now = datetime.utcnow()
+
+    stmt = pg_insert(Job.__table__).values(
+        name = name,
+        payload = payload,
+        idempotency_key = idempotency_key,
+        max_attempts = max_attempts,
+        run_at = now + timedelta(seconds = delay),
+        created_at = now,
+    )
+
+    if idempotency_key:
+        stmt = stmt.on_conflict_do_nothing(index_elements = [Job.__table__.c.idempotency_key])
+
+    db.session.execute(stmt)
+
+
+def claim_job():
+    """ Lock the next job ready to run and mark it as running, None when there is none """
+
+    claimed = db.session.execute("""
+        UPDATE job
+        SET status = 'running', attempts = attempts + 1, locked_at = :now
+        WHERE id = (
+            SELECT id FROM job
+            WHERE status = 'queued' AND run_at <= :now
+            ORDER BY run_at, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, name, payload, attempts, max_attempts
+    """, {"now": datetime.utcnow()}).first()
+
+    db.session.commit()
+
+    return claimed
+
+
+def requeue_stale_jobs():
+    """ Queue again the jobs left running by a worker that died """
+
+    lock_timeout = current_app.config.get("JOB_LOCK_TIMEOUT", LOCK_TIMEOUT)
+    now = datetime.utcnow()
+
+    db.session.execute("""
+        UPDATE job
+        SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+            run_at = :now,
+            last_error = 'worker lost'
+        WHERE status = 'running' AND locked_at < :stale
+    """, {"now": now, "stale": now - timedelta(seconds = lock_timeout)})
+
+    db.session.commit()
+
+
+def touch_job():
+    """ Push back the lock timeout of the job this worker is running (no commit; nothing outside a worker) """
+
+    job_id = getattr(_running, "job_id", None)
+
+    if job_id is not None:
+        Job.query.filter_by(id = job_id, status = "running").update({Job.locked_at: datetime.utcnow()}, synchronize_session = False)
+
+
+def work_one():
+    """ Run the next job ready to run. False when the queue is empty """
+
+    claimed = claim_job()
+
+    if claimed is None:
+        return False
+
+    _running.job_id = claimed.id
+
+    try:
+        run_handler(claimed.name, claimed.payload)
+        db.session.commit()
+
+        values = {Job.status: "done", Job.finished_at: datetime.utcnow(), Job.last_error: None}
+
+    except Exception as error:
+        db.session.rollback()
+        current_app.logger.exception(f"Job #{claimed.id} ({claimed.name}) failed, attempt {claimed.attempts}")
+
+        if claimed.attempts < claimed.max_attempts:
+            values = {Job.status: "queued", Job.run_at: datetime.utcnow() + timedelta(seconds = backoff(claimed.attempts)), Job.last_error: repr(error)}
+        else:
+            values = {Job.status: "failed", Job.finished_at: datetime.utcnow(), Job.last_error: repr(error)}
+
+    finally:
+        _running.job_id = None
+
+    Job.query.filter_by(id = claimed.id).update(values, synchronize_session = False)
+    db.session.commit()
+
+    return True
+
+
+def work(burst = False):
+    """ Worker loop. With burst it returns once the queue is empty. Returns the number of jobs run """
+
+    poll_interval = current_app.config.get("JOB_POLL_INTERVAL", POLL_INTERVAL)
+    done = 0
+
+    while True:
+        requeue_stale_jobs()
+
+        while work_one():
+            done += 1
+
+        if burst:
+            return done
+
+        time.sleep(poll_interval)
@@ -0,0 +1,112 @@
+"""Prometheus metrics, served by /metrics in the text exposition format.
+
+- doggy_walkie_request_duration_seconds: per endpoint, method and status.
+- doggy_walkie_template_render_seconds: per template.
+- doggy_walkie_external_call_seconds: calls to external APIs (TheDogApi),
+  per service and outcome.
+- doggy_walkie_fragment_cache_requests_total: fragment cache lookups
+  (fragments.py), per fragment and result (hit or miss).
+
+Under gunicorn every worker process has its own counters. Set
+PROMETHEUS_MULTIPROC_DIR (an empty directory, before the workers start) and
+prometheus_client writes them to files there; /metrics then adds up every
+worker, whichever one answers. gunicorn.conf.py removes the files of the
+workers that exit.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, request, request_started, request_finished, before_render_template, template_rendered
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+
+REQUEST_DURATION = Histogram(
+    "doggy_walkie_request_duration_seconds",
+    "Time to answer a request.",
+    ["endpoint", "method", "status"],
+)
+
+TEMPLATE_RENDER = Histogram(
+    "doggy_walkie_template_render_seconds",
+    "Time to render a Jinja template.",
+    ["template"],
+)
+
+EXTERNAL_CALL = Histogram(
+    "doggy_walkie_external_call_seconds",
+    "Time of the calls to external APIs.",
+    ["service", "outcome"],
+)
+
+FRAGMENT_CACHE = Counter(
+    "doggy_walkie_fragment_cache_requests",
+    "Lookups in the fragment cache.",
+    ["fragment", "result"],
+)
+
+
+@contextmanager
+def external_call(service):
+    """ Time the block as a call to `service`, 'error' when it raises """
+
+    start = time.perf_counter()
+    outcome = "ok"
+
+    try:
+        yield
+
+    except Exception:
+        outcome = "error"
+        raise
+
+    finally:
+        EXTERNAL_CALL.labels(service, outcome).observe(time.perf_counter() - start)
+
+
+def _request_started(app, **extra):
+    g._request_start = time.perf_counter()
+
+
+def _request_finished(app, response, **extra):
+    start = g.pop("_request_start", None)
+
+    if start is not None:
+        REQUEST_DURATION.labels(request.endpoint or "unmatched", request.method, response.status_code).observe(time.perf_counter() - start)
+
+
+def _before_render_template(app, template, context, **extra):
+    g.setdefault("_render_starts", []).append(time.perf_counter())
+
+
+def _template_rendered(app, template, context, **extra):
+    starts = g.get("_render_starts")
+
+    if starts:
+        TEMPLATE_RENDER.labels(template.name or "string").observe(time.perf_counter() - starts.pop())
+
+
+def init_metrics(app):
+    """ Record the requests and template renders of the app """
+
+    request_started.connect(_request_started, app)
+    request_finished.connect(_request_finished, app)
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
+
+
+def metrics_registry():
+    """ Registry of this process, or of every worker in multiprocess mode """
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ or "prometheus_multiproc_dir" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+
+    return REGISTRY
+
+
+def render_metrics():
+    """ (body, content type) of the /metrics response """
+
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,5 @@
+-- Profile version stamp used to refresh the session principal (identity.py)
+-- when a user edits the profile or the address.
+
+ALTER TABLE dog_owner ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE dog_walker ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
@@ -0,0 +1,17 @@
+-- Normalized, trigram indexed name for the dog_walker search (search.py)
+-- plus the indexes used by the address filters and the rate ranking.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE dog_walker ADD COLUMN IF NOT EXISTS search_name TEXT;
+
+UPDATE dog_walker
+SET search_name = lower(regexp_replace(trim(first_name || ' ' || last_name), '\s+', ' ', 'g'))
+WHERE search_name IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_dog_walker_search_name_trgm ON dog_walker USING gin (search_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_dog_walker_rate_rank ON dog_walker ((CAST(coalesce(rate, 0) AS FLOAT)) DESC, id);
+
+CREATE INDEX IF NOT EXISTS ix_address_city_lower ON address (lower(city));
+CREATE INDEX IF NOT EXISTS ix_address_neighbor_lower ON address (lower(neighbor));
+CREATE INDEX IF NOT EXISTS ix_address_zipcode ON address (zipcode);
@@ -0,0 +1,6 @@
+-- Running review totals on dog_walker (functions.add_review_to_dog_walker_rate)
+-- and a fractional rate. Backfill with `flask rebuild-rates` afterwards.
+
+ALTER TABLE dog_walker ADD COLUMN IF NOT EXISTS review_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE dog_walker ADD COLUMN IF NOT EXISTS rate_sum INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE dog_walker ALTER COLUMN rate TYPE NUMERIC(3, 2);
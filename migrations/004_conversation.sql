@@ -0,0 +1,34 @@
+-- One conversation row per (dog_owner, dog_walker) pair, kept up to date by the
+-- Message after_insert listener in models.py. Backfilled from the message table.
+
+CREATE TABLE IF NOT EXISTS conversation (
+    id SERIAL PRIMARY KEY,
+    dog_owner_id INTEGER NOT NULL REFERENCES dog_owner (id) ON DELETE CASCADE,
+    dog_walker_id INTEGER NOT NULL REFERENCES dog_walker (id) ON DELETE CASCADE,
+    last_message_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    last_message VARCHAR,
+    is_last_sender_worker BOOLEAN NOT NULL DEFAULT FALSE,
+    dog_owner_unread INTEGER NOT NULL DEFAULT 0,
+    dog_walker_unread INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT uq_conversation_pair UNIQUE (dog_owner_id, dog_walker_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_conversation_owner_inbox ON conversation (dog_owner_id, last_message_at);
+CREATE INDEX IF NOT EXISTS ix_conversation_walker_inbox ON conversation (dog_walker_id, last_message_at);
+
+INSERT INTO conversation (dog_owner_id, dog_walker_id, last_message_at, last_message, is_last_sender_worker, dog_owner_unread, dog_walker_unread)
+SELECT last.dog_owner_id, last.dog_walker_id, last.date, left(last.text, 100), last.is_sender_worker, counts.owner_unread, counts.walker_unread
+FROM (
+    SELECT DISTINCT ON (dog_owner_id, dog_walker_id) dog_owner_id, dog_walker_id, date, text, is_sender_worker
+    FROM message
+    WHERE dog_owner_id IS NOT NULL AND dog_walker_id IS NOT NULL
+    ORDER BY dog_owner_id, dog_walker_id, date DESC, id DESC
+) AS last
+JOIN (
+    SELECT dog_owner_id, dog_walker_id,
+           COUNT(*) FILTER (WHERE is_sender_worker AND NOT COALESCE(read, FALSE)) AS owner_unread,
+           COUNT(*) FILTER (WHERE NOT is_sender_worker AND NOT COALESCE(read, FALSE)) AS walker_unread
+    FROM message
+    GROUP BY dog_owner_id, dog_walker_id
+) AS counts USING (dog_owner_id, dog_walker_id)
+ON CONFLICT (dog_owner_id, dog_walker_id) DO NOTHING;
@@ -0,0 +1,3 @@
+-- Keyset pagination of a thread (Message.thread_page) on (date, id).
+
+CREATE INDEX IF NOT EXISTS ix_message_thread ON message (dog_owner_id, dog_walker_id, date, id);
@@ -0,0 +1,29 @@
+-- Typed appointment schedule: starts_at (timestamptz), duration_minutes and
+-- ends_at, backfilled from the text fields typed in New_Appointment_Form.
+-- The text fields stay for compatibility; models.sync_appointment_schedule keeps
+-- both in sync. Use the same timezone as APP_TIMEZONE.
+--
+-- ends_at is a regular column written by the app, not a GENERATED column:
+-- timestamptz + interval is not immutable, so Postgres rejects it there.
+
+ALTER TABLE appointment ADD COLUMN IF NOT EXISTS starts_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE appointment ADD COLUMN IF NOT EXISTS duration_minutes INTEGER;
+ALTER TABLE appointment ADD COLUMN IF NOT EXISTS ends_at TIMESTAMP WITH TIME ZONE;
+
+UPDATE appointment
+SET starts_at = (
+        CASE WHEN date ~ '^\d{4}-' THEN to_date(date, 'YYYY-MM-DD') ELSE to_date(date, 'MM-DD-YYYY') END
+        + (mod(split_part(time_start, ':', 1)::INTEGER, 12) + CASE WHEN upper(day_period) = 'PM' THEN 12 ELSE 0 END) * INTERVAL '1 hour'
+        + COALESCE(NULLIF(split_part(time_start, ':', 2), ''), '0')::INTEGER * INTERVAL '1 minute'
+    ) AT TIME ZONE 'America/New_York',
+    duration_minutes = COALESCE(NULLIF(regexp_replace(duration, '\D', '', 'g'), ''), '0')::INTEGER
+WHERE starts_at IS NULL;
+
+UPDATE appointment SET ends_at = starts_at + duration_minutes * INTERVAL '1 minute' WHERE ends_at IS NULL;
+
+ALTER TABLE appointment ALTER COLUMN starts_at SET NOT NULL;
+ALTER TABLE appointment ALTER COLUMN duration_minutes SET NOT NULL;
+ALTER TABLE appointment ALTER COLUMN ends_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_appointment_walker_start ON appointment (dog_walker_id, starts_at);
+CREATE INDEX IF NOT EXISTS ix_appointment_owner_start ON appointment (dog_owner_id, starts_at);
@@ -0,0 +1,7 @@
+-- Partial indexes for the pending and done appointment pages of each user.
+-- The predicates match the filters of Appointment.status_page.
+
+CREATE INDEX IF NOT EXISTS ix_appointment_walker_pending ON appointment (dog_walker_id, starts_at, id) WHERE status IS NOT true;
+CREATE INDEX IF NOT EXISTS ix_appointment_walker_done ON appointment (dog_walker_id, starts_at, id) WHERE status IS true;
+CREATE INDEX IF NOT EXISTS ix_appointment_owner_pending ON appointment (dog_owner_id, starts_at, id) WHERE status IS NOT true;
+CREATE INDEX IF NOT EXISTS ix_appointment_owner_done ON appointment (dog_owner_id, starts_at, id) WHERE status IS true;
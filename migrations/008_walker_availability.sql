@@ -0,0 +1,25 @@
+-- Weekly availability windows of the dog_walkers, and no overlapping
+-- appointments for the same walker.
+--
+-- The exclusion constraint fails to build while overlapping appointments exist;
+-- list them first with:
+--   SELECT a.id, b.id FROM appointment a JOIN appointment b
+--     ON a.dog_walker_id = b.dog_walker_id AND a.id < b.id
+--     AND tstzrange(a.starts_at, a.ends_at) && tstzrange(b.starts_at, b.ends_at);
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+CREATE TABLE IF NOT EXISTS availability (
+    id SERIAL PRIMARY KEY,
+    dog_walker_id INTEGER NOT NULL REFERENCES dog_walker (id) ON DELETE CASCADE,
+    weekday INTEGER NOT NULL,
+    starts TIME NOT NULL,
+    ends TIME NOT NULL,
+    CONSTRAINT ck_availability_weekday CHECK (weekday BETWEEN 0 AND 6),
+    CONSTRAINT ck_availability_window CHECK (ends > starts)
+);
+
+CREATE INDEX IF NOT EXISTS ix_availability_walker ON availability (dog_walker_id, weekday);
+
+ALTER TABLE appointment ADD CONSTRAINT ex_appointment_walker_overlap
+    EXCLUDE USING gist (dog_walker_id WITH =, tstzrange(starts_at, ends_at) WITH &&);
@@ -0,0 +1,40 @@
+-- Account deletion is done by Postgres: every foreign key to the users (and to
+-- the appointments) is ON DELETE CASCADE, with an index on the referencing
+-- column so the cascade does not scan the table. Large accounts are purged in
+-- the background and tracked in account_purge.
+
+ALTER TABLE message DROP CONSTRAINT IF EXISTS message_dog_owner_id_fkey;
+ALTER TABLE message ADD CONSTRAINT message_dog_owner_id_fkey FOREIGN KEY (dog_owner_id) REFERENCES dog_owner (id) ON DELETE CASCADE;
+ALTER TABLE message DROP CONSTRAINT IF EXISTS message_dog_walker_id_fkey;
+ALTER TABLE message ADD CONSTRAINT message_dog_walker_id_fkey FOREIGN KEY (dog_walker_id) REFERENCES dog_walker (id) ON DELETE CASCADE;
+
+ALTER TABLE appointment DROP CONSTRAINT IF EXISTS appointment_dog_owner_id_fkey;
+ALTER TABLE appointment ADD CONSTRAINT appointment_dog_owner_id_fkey FOREIGN KEY (dog_owner_id) REFERENCES dog_owner (id) ON DELETE CASCADE;
+ALTER TABLE appointment DROP CONSTRAINT IF EXISTS appointment_dog_walker_id_fkey;
+ALTER TABLE appointment ADD CONSTRAINT appointment_dog_walker_id_fkey FOREIGN KEY (dog_walker_id) REFERENCES dog_walker (id) ON DELETE CASCADE;
+
+ALTER TABLE dog DROP CONSTRAINT IF EXISTS dog_dog_owner_id_fkey;
+ALTER TABLE dog ADD CONSTRAINT dog_dog_owner_id_fkey FOREIGN KEY (dog_owner_id) REFERENCES dog_owner (id) ON DELETE CASCADE;
+
+ALTER TABLE review DROP CONSTRAINT IF EXISTS review_appointment_id_fkey;
+ALTER TABLE review ADD CONSTRAINT review_appointment_id_fkey FOREIGN KEY (appointment_id) REFERENCES appointment (id) ON DELETE CASCADE;
+
+CREATE INDEX IF NOT EXISTS ix_message_walker ON message (dog_walker_id);
+CREATE INDEX IF NOT EXISTS ix_dog_owner ON dog (dog_owner_id);
+CREATE INDEX IF NOT EXISTS ix_review_appointment ON review (appointment_id);
+
+-- reviews left without appointment by the old row by row deletion
+DELETE FROM review WHERE appointment_id IS NULL;
+
+CREATE TABLE IF NOT EXISTS account_purge (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR NOT NULL,
+    user_id INTEGER NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'pending',
+    total_messages INTEGER NOT NULL DEFAULT 0,
+    deleted_messages INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_account_purge_user ON account_purge (kind, user_id);
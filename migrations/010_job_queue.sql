@@ -0,0 +1,20 @@
+-- Background job queue (jobs.py). Workers claim the queued jobs with
+-- FOR UPDATE SKIP LOCKED; run them with `flask work`.
+
+CREATE TABLE IF NOT EXISTS job (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    payload JSON NOT NULL DEFAULT '{}',
+    idempotency_key VARCHAR UNIQUE,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_job_queued ON job (run_at, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS ix_job_running ON job (locked_at) WHERE status = 'running';
@@ -0,0 +1,78 @@
+-- One identity table for both kinds of users (models.User): the shared columns
+-- move from dog_owner and dog_walker to app_user, with a `role` discriminator
+-- and one unique email index. dog_owner and dog_walker keep their own columns
+-- and share the app_user id (joined table inheritance).
+--
+-- dog_owner ids are kept. dog_walker ids move above every old id, so an old
+-- /dog_walkers/<id> URL never points to another walker: the old id stays in
+-- dog_walker.legacy_id and the app redirects those URLs to the new one.
+-- Sessions of walkers logged in before the migration are logged out.
+--
+-- The INSERT into app_user fails while an email is used by both a dog_owner
+-- and a dog_walker; list them first with:
+--   SELECT email FROM dog_owner INTERSECT SELECT email FROM dog_walker;
+
+BEGIN;
+
+CREATE TABLE app_user (
+    id SERIAL PRIMARY KEY,
+    role VARCHAR NOT NULL,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    cellphone VARCHAR,
+    address_id INTEGER REFERENCES address (id) ON DELETE CASCADE,
+    photo TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    CONSTRAINT app_user_email_key UNIQUE (email)
+);
+
+-- move the dog_walker ids, and every reference to them, past the old ids
+CREATE TEMPORARY TABLE walker_id_offset ON COMMIT DROP AS
+SELECT GREATEST((SELECT COALESCE(MAX(id), 0) FROM dog_owner), (SELECT COALESCE(MAX(id), 0) FROM dog_walker)) AS value;
+
+ALTER TABLE message DROP CONSTRAINT message_dog_walker_id_fkey;
+ALTER TABLE appointment DROP CONSTRAINT appointment_dog_walker_id_fkey;
+ALTER TABLE conversation DROP CONSTRAINT conversation_dog_walker_id_fkey;
+ALTER TABLE availability DROP CONSTRAINT availability_dog_walker_id_fkey;
+
+ALTER TABLE dog_walker ADD COLUMN legacy_id INTEGER UNIQUE;
+
+UPDATE dog_walker SET legacy_id = id, id = id + (SELECT value FROM walker_id_offset);
+UPDATE message SET dog_walker_id = dog_walker_id + (SELECT value FROM walker_id_offset) WHERE dog_walker_id IS NOT NULL;
+UPDATE appointment SET dog_walker_id = dog_walker_id + (SELECT value FROM walker_id_offset) WHERE dog_walker_id IS NOT NULL;
+UPDATE conversation SET dog_walker_id = dog_walker_id + (SELECT value FROM walker_id_offset);
+UPDATE availability SET dog_walker_id = dog_walker_id + (SELECT value FROM walker_id_offset);
+UPDATE account_purge SET user_id = user_id + (SELECT value FROM walker_id_offset) WHERE kind = 'dog_walker';
+
+ALTER TABLE message ADD CONSTRAINT message_dog_walker_id_fkey FOREIGN KEY (dog_walker_id) REFERENCES dog_walker (id) ON DELETE CASCADE;
+ALTER TABLE appointment ADD CONSTRAINT appointment_dog_walker_id_fkey FOREIGN KEY (dog_walker_id) REFERENCES dog_walker (id) ON DELETE CASCADE;
+ALTER TABLE conversation ADD CONSTRAINT conversation_dog_walker_id_fkey FOREIGN KEY (dog_walker_id) REFERENCES dog_walker (id) ON DELETE CASCADE;
+ALTER TABLE availability ADD CONSTRAINT availability_dog_walker_id_fkey FOREIGN KEY (dog_walker_id) REFERENCES dog_walker (id) ON DELETE CASCADE;
+
+INSERT INTO app_user (id, role, first_name, last_name, email, password, cellphone, address_id, photo, version)
+SELECT id, 'dog_owner', first_name, last_name, email, password, cellphone, address_id, photo, version FROM dog_owner
+UNION ALL
+SELECT id, 'dog_walker', first_name, last_name, email, password, cellphone, address_id, photo, version FROM dog_walker;
+
+SELECT setval('app_user_id_seq', GREATEST((SELECT MAX(id) FROM app_user), 1));
+
+-- dog_owner and dog_walker ids now come from app_user
+ALTER TABLE dog_owner ALTER COLUMN id DROP DEFAULT;
+ALTER TABLE dog_walker ALTER COLUMN id DROP DEFAULT;
+DROP SEQUENCE dog_owner_id_seq;
+DROP SEQUENCE dog_walker_id_seq;
+
+ALTER TABLE dog_owner ADD CONSTRAINT dog_owner_id_fkey FOREIGN KEY (id) REFERENCES app_user (id) ON DELETE CASCADE;
+ALTER TABLE dog_walker ADD CONSTRAINT dog_walker_id_fkey FOREIGN KEY (id) REFERENCES app_user (id) ON DELETE CASCADE;
+
+ALTER TABLE dog_owner
+    DROP COLUMN first_name, DROP COLUMN last_name, DROP COLUMN email, DROP COLUMN password,
+    DROP COLUMN cellphone, DROP COLUMN address_id, DROP COLUMN photo, DROP COLUMN version;
+
+ALTER TABLE dog_walker
+    DROP COLUMN first_name, DROP COLUMN last_name, DROP COLUMN email, DROP COLUMN password,
+    DROP COLUMN cellphone, DROP COLUMN address_id, DROP COLUMN photo, DROP COLUMN version;
+
+COMMIT;
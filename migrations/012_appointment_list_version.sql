@@ -0,0 +1,5 @@
+-- Version of each user's appointment lists, bumped by the Appointment / Review
+-- listeners in models.py. It is the ETag validator of the appointment pages
+-- (conditional.py).
+
+ALTER TABLE app_user ADD COLUMN IF NOT EXISTS appointments_version INTEGER NOT NULL DEFAULT 0;
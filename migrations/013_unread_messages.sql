@@ -0,0 +1,52 @@
+-- Unread messages of each user, kept with the conversation counters by the
+-- Message listener in models.py and taken off both when a thread is opened
+-- (unread.py). The partial indexes hold only the unread messages of each side
+-- of a thread, so marking a thread read doesn't scan the messages already read.
+
+ALTER TABLE app_user ADD COLUMN IF NOT EXISTS unread_messages INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS ix_message_unread_owner ON message (dog_owner_id, dog_walker_id)
+    WHERE is_sender_worker AND read IS NOT TRUE;
+CREATE INDEX IF NOT EXISTS ix_message_unread_walker ON message (dog_walker_id, dog_owner_id)
+    WHERE NOT is_sender_worker AND read IS NOT TRUE;
+
+-- Nothing marked messages read before: take as read every message the
+-- recipient answered later in the same thread.
+UPDATE message
+SET read = TRUE
+WHERE read IS NOT TRUE
+  AND EXISTS (
+    SELECT 1
+    FROM message AS reply
+    WHERE reply.dog_owner_id = message.dog_owner_id
+      AND reply.dog_walker_id = message.dog_walker_id
+      AND reply.is_sender_worker <> message.is_sender_worker
+      AND (reply.date, reply.id) > (message.date, message.id)
+  );
+
+UPDATE conversation
+SET dog_owner_unread = COALESCE(counts.owner_unread, 0),
+    dog_walker_unread = COALESCE(counts.walker_unread, 0)
+FROM conversation AS pair
+LEFT JOIN (
+    SELECT dog_owner_id, dog_walker_id,
+           COUNT(*) FILTER (WHERE is_sender_worker) AS owner_unread,
+           COUNT(*) FILTER (WHERE NOT is_sender_worker) AS walker_unread
+    FROM message
+    WHERE read IS NOT TRUE
+    GROUP BY dog_owner_id, dog_walker_id
+) AS counts ON counts.dog_owner_id = pair.dog_owner_id AND counts.dog_walker_id = pair.dog_walker_id
+WHERE conversation.id = pair.id;
+
+UPDATE app_user
+SET unread_messages = totals.unread
+FROM (
+    SELECT user_id, SUM(unread) AS unread
+    FROM (
+        SELECT dog_owner_id AS user_id, dog_owner_unread AS unread FROM conversation
+        UNION ALL
+        SELECT dog_walker_id, dog_walker_unread FROM conversation
+    ) AS pairs
+    GROUP BY user_id
+) AS totals
+WHERE app_user.id = totals.user_id;
@@ -0,0 +1,48 @@
+-- Message dates come from the database clock, and each thread numbers its
+-- messages (thread_seq) through the conversation upsert of the Message
+-- listener in models.py.
+--
+-- Until now message.date defaulted to the time the web worker was started, so
+-- every message of a worker carried the same, too old, date. Ids are handed
+-- out in the order the messages were sent, so no message is older than one
+-- with a lower id: each date is lifted to the latest date of the messages
+-- before it. The dates of the other timestamp columns were right, they only
+-- get the server default.
+
+ALTER TABLE message ALTER COLUMN date SET DEFAULT timezone('utc', now());
+ALTER TABLE breed ALTER COLUMN fetched_at SET DEFAULT timezone('utc', now());
+ALTER TABLE account_purge ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+ALTER TABLE job ALTER COLUMN run_at SET DEFAULT timezone('utc', now());
+ALTER TABLE job ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+
+UPDATE message
+SET date = repaired.date
+FROM (
+    SELECT id, MAX(date) OVER (ORDER BY id ROWS UNBOUNDED PRECEDING) AS date
+    FROM message
+) AS repaired
+WHERE message.id = repaired.id AND message.date < repaired.date;
+
+ALTER TABLE message ADD COLUMN IF NOT EXISTS thread_seq INTEGER;
+ALTER TABLE conversation ADD COLUMN IF NOT EXISTS last_seq INTEGER NOT NULL DEFAULT 0;
+
+UPDATE message
+SET thread_seq = numbered.thread_seq
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY dog_owner_id, dog_walker_id ORDER BY id) AS thread_seq
+    FROM message
+) AS numbered
+WHERE message.id = numbered.id;
+
+ALTER TABLE message ALTER COLUMN thread_seq SET NOT NULL;
+ALTER TABLE message ADD CONSTRAINT uq_message_thread_seq UNIQUE (dog_owner_id, dog_walker_id, thread_seq);
+
+UPDATE conversation
+SET last_seq = threads.last_seq,
+    last_message_at = threads.last_message_at
+FROM (
+    SELECT dog_owner_id, dog_walker_id, MAX(thread_seq) AS last_seq, MAX(date) AS last_message_at
+    FROM message
+    GROUP BY dog_owner_id, dog_walker_id
+) AS threads
+WHERE conversation.dog_owner_id = threads.dog_owner_id AND conversation.dog_walker_id = threads.dog_walker_id;
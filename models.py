@@ -1,26 +1,57 @@
 """SQLAlchemy models for Doggy-Walkie."""
 
 
-from datetime import datetime
+import os
+from datetime import date, datetime, time, timedelta
+
+from dateutil import tz
 
-from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import column_property, validates
+from sqlalchemy import event, inspect, DDL
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import column_property, joinedload, selectinload, validates, with_polymorphic
 
+from pool import apply_pool_options
+from passwords import hash_password, check_password, rehash_if_needed
 
-bcrypt = Bcrypt()
-db = SQLAlchemy()
 
-class Dog_Owner(db.Model):
-    """User dog_owner in the system."""
+class PooledSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy with the pool settings of pool.py"""
 
-    __tablename__ = 'dog_owner'
+    def apply_driver_hacks(self, app, info, options):
+        super().apply_driver_hacks(app, info, options)
+        apply_pool_options(app.config, options)
+
+
+db = PooledSQLAlchemy()
+
+# timezone of the dates and times typed in the appointment form.
+LOCAL_TIMEZONE = tz.gettz(os.environ.get("APP_TIMEZONE", "America/New_York"))
+
+# the current UTC time on the database server, the default of the timestamp
+# columns (they have no time zone). now() is the start of the transaction.
+UTC_NOW = "timezone('utc', now())"
+
+class User(db.Model):
+    """Identity of both kinds of users: one row per account, one unique email.
+
+    Dog_Owner and Dog_Walker extend it (joined table inheritance): `role` says
+    which one a row is, and their own columns live in the dog_owner and
+    dog_walker tables, sharing the app_user id.
+    """
+
+    __tablename__ = 'app_user'
 
     id = db.Column(
         db.Integer,
         primary_key=True,
     )
 
+    role = db.Column(
+        db.String,
+        nullable=False,
+    )
+
     first_name = db.Column(
         db.Text,
         nullable=False,
@@ -58,34 +89,61 @@ class Dog_Owner(db.Model):
         db.Text, 
         default = "/static/images/profile_no_photo.jpg"
     )
-    
+
+    version = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 1,
+        server_default = "1"
+    )
+
+    # bumped whenever the user's appointment lists change (ETag of those pages, see conditional.py)
+    appointments_version = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 0,
+        server_default = "0"
+    )
+
+    # messages received and not read yet, in every conversation (see unread.py)
+    unread_messages = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 0,
+        server_default = "0"
+    )
+
+    __mapper_args__ = {"polymorphic_on": role}
+
     def __repr__(self):
-        return f"<Dog_Owner User #{self.id}: {self.email}, {self.first_name} {self.last_name}>"
+        return f"<User #{self.id} ({self.role}): {self.email}, {self.first_name} {self.last_name}>"
+
+    @property
+    def is_worker(self):
+        return self.role == "dog_walker"
 
     @validates('first_name', 'last_name')
     def convert_upper(self, key, value):
         return value.capitalize()
 
-   
-
     @classmethod
     def signup(cls, first_name, last_name, email, password):
-        """Sign up dog_owner.
+        """Sign up a dog_owner or a dog_walker (call it on Dog_Owner or Dog_Walker).
 
         Hashes password and adds user to system.
         """
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
+        hashed_pwd = hash_password(password)
 
-        dog_owner = Dog_Owner(
+        user = cls(
             first_name=first_name,
             last_name = last_name,
             email=email,
             password=hashed_pwd,
         )
 
-        db.session.add(dog_owner)
-        return dog_owner
+        db.session.add(user)
+        return user
 
     @classmethod
     def authenticate(cls, email, password):
@@ -95,15 +153,22 @@ class Dog_Owner(db.Model):
         It searches for a user whose password hash matches this password
         and, if it finds such a user, returns that user object.
 
+        Called on User, it is one lookup on the email index that returns a
+        Dog_Owner or a Dog_Walker, with its own columns loaded in the same query.
+
         If can't find matching user (or if password is wrong), returns False.
         """
 
-        dog_owner = cls.query.filter_by(email=email).first()
+        entity = with_polymorphic(cls, "*")
+        user = db.session.query(entity).filter(entity.email == email).first()
 
-        if dog_owner:
-            is_auth = bcrypt.check_password_hash(dog_owner.password, password)
+        if user:
+            is_auth = check_password(user.password, password)
             if is_auth:
-                return dog_owner
+                if rehash_if_needed(user, password):
+                    db.session.commit()
+
+                return user
 
         return False
 
@@ -111,128 +176,115 @@ class Dog_Owner(db.Model):
     def update_address(cls, email, address_string):
         """ Add the address to the user profile  """
 
-        dog_owner = cls.query.filter_by(email = email).first()
+        user = cls.query.filter_by(email = email).first()
         address = Address.query.filter_by(address = address_string).first()
 
-        dog_owner.address_id = address.id
+        user.address_id = address.id
+        user.version += 1
 
-        db.session.add(dog_owner)
+        db.session.add(user)
         db.session.commit()
 
-class Dog_Walker(db.Model):
-    """User dog_walker in the system."""
 
-    __tablename__ = 'dog_walker'
+class Dog_Owner(User):
+    """User dog_owner in the system."""
+
+    __tablename__ = 'dog_owner'
 
     id = db.Column(
         db.Integer,
+        db.ForeignKey('app_user.id', ondelete = "cascade"),
         primary_key=True,
     )
 
-    first_name = db.Column(
-        db.Text,
-        nullable=False,
-    )
+    __mapper_args__ = {"polymorphic_identity": "dog_owner"}
 
-    last_name = db.Column(
-        db.Text,
-        nullable=False,
-    )
+    def __repr__(self):
+        return f"<Dog_Owner User #{self.id}: {self.email}, {self.first_name} {self.last_name}>"
 
-    name = column_property(first_name + " " + last_name)
 
-    email = db.Column(
-        db.Text,
-        nullable=False,
-        unique=True,
-    )
+class Dog_Walker(User):
+    """User dog_walker in the system."""
 
-    password = db.Column(
-        db.Text,
-        nullable=False,
-    )
+    __tablename__ = 'dog_walker'
 
-    cellphone= db.Column(
-        db.String,
+    id = db.Column(
+        db.Integer,
+        db.ForeignKey('app_user.id', ondelete = "cascade"),
+        primary_key=True,
     )
 
-    address_id = db.Column(
+    # id of the walker before the users were unified (migrations/011), so the old /dog_walkers/<id> URLs redirect.
+    legacy_id = db.Column(
         db.Integer,
-        db.ForeignKey('address.id', ondelete = "cascade"),
-        nullable = True
+        unique = True,
     )
 
     description = db.Column(
         db.String(450),
     )
 
-    photo = db.Column(
-        db.Text, 
-        default = "/static/images/profile_no_photo.jpg"
+    rate = db.Column(
+        db.Numeric(3, 2)
     )
 
-    rate = db.Column(
-        db.Integer
+    # running totals of the reviews, so a new review updates the rate without reading the walker's history.
+    review_count = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 0,
+        server_default = "0"
+    )
+
+    rate_sum = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 0,
+        server_default = "0"
+    )
+
+    # lower-cased "first last" name, kept in sync by set_search_name() and indexed for the search page.
+    search_name = db.Column(
+        db.Text,
     )
 
+    __mapper_args__ = {"polymorphic_identity": "dog_walker"}
+
     def __repr__(self):
         return f"<Dog_Walker User #{self.id}: {self.email}, {self.first_name} {self.last_name}>"
-    
-    @validates('first_name', 'last_name')
-    def convert_upper(self, key, value):
-        return value.capitalize()
-        
+
     @classmethod
-    def signup(cls, first_name, last_name, email, password):
-        """Sign up dog_owner.
+    def id_for_legacy_id(cls, legacy_id):
+        """ Current id of the walker that had `legacy_id` before migrations/011, or None """
 
-        Hashes password and adds user to system.
-        """
+        return db.session.query(cls.id).filter(cls.legacy_id == legacy_id).scalar()
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
 
-        dog_walker = Dog_Walker(
-            first_name=first_name,
-            last_name = last_name,
-            email=email,
-            password=hashed_pwd,
-        )
+def normalize_search_text(text):
+    """ Lower case and collapse the whitespaces of a text used for searching """
 
-        db.session.add(dog_walker)
+    return " ".join((text or "").lower().split())
 
 
-        return dog_walker
+@event.listens_for(Dog_Walker, "before_insert")
+@event.listens_for(Dog_Walker, "before_update")
+def set_search_name(mapper, connection, dog_walker):
+    """ Keep dog_walker.search_name in sync with the first and last names """
 
-    @classmethod
-    def authenticate(cls, email, password):
-        """Find user with `email` and `password`.
+    dog_walker.search_name = normalize_search_text(f"{dog_walker.first_name} {dog_walker.last_name}")
 
-        This is a class method (call it on the class, not an individual user.)
-        It searches for a user whose password hash matches this password
-        and, if it finds such a user, returns that user object.
 
-        If can't find matching user (or if password is wrong), returns False.
-        """
+# trigram index, so `search_name LIKE '%term%'` does not scan the whole table.
+event.listen(db.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
 
-        dog_walker = cls.query.filter_by(email=email).first()
+def rate_rank():
+    """ Rank used to list dog_walkers by rate (walkers with no reviews last) """
 
-        if dog_walker:
-            is_auth = bcrypt.check_password_hash(dog_walker.password, password)
-            if is_auth:
-                return dog_walker
+    return db.cast(db.func.coalesce(Dog_Walker.rate, 0), db.Float)
 
-        return False
 
-    @classmethod
-    def update_address(cls, email, address_string):
-        """ Add the address to the user profile  """
-        dog_walker = cls.query.filter_by(email = email).first()
-        address = Address.query.filter_by(address = address_string).first()
-
-        dog_walker.address_id = address.id
-
-        db.session.add(dog_walker)
-        db.session.commit()
+db.Index("ix_dog_walker_rate_rank", rate_rank().desc(), Dog_Walker.id)
+db.Index("ix_dog_walker_search_name_trgm", Dog_Walker.search_name, postgresql_using = "gin", postgresql_ops = {"search_name": "gin_trgm_ops"})
 
 
 class Address(db.Model):
@@ -269,14 +321,17 @@ class Address(db.Model):
         nullable = False
     )
 
-    dog_owner = db.relationship("Dog_Owner", backref = "address")
-
-    dog_walker = db.relationship("Dog_Walker", backref = "address")
+    users = db.relationship("User", backref = "address")
 
     def __repr__(self):
         return f"<Address #{self.id}: {self.zipcode}, {self.city} - {self.state} >"
 
 
+db.Index("ix_address_city_lower", db.func.lower(Address.city))
+db.Index("ix_address_neighbor_lower", db.func.lower(Address.neighbor))
+db.Index("ix_address_zipcode", Address.zipcode)
+
+
 class Dog(db.Model):
     """Dogs in the system"""
 
@@ -325,12 +380,47 @@ class Dog(db.Model):
         default = "/static/images/profile_no_photo.jpg"
     )
 
-    dog_owner = db.relationship("Dog_Owner", backref = "dog")
+    dog_owner = db.relationship("Dog_Owner", backref = db.backref("dog", passive_deletes = True))
+
+    __table_args__ = (
+        db.Index("ix_dog_owner", "dog_owner_id"),
+    )
 
     def __repr__(self):
         return f"<Dog #{self.id}: {self.first_name} - {self.breed} - Dog_Owner = {self.dog_owner.id} - {self.dog_owner.first_name} {self.dog_owner.last_name} >"
 
 
+class Breed(db.Model):
+    """Local snapshot of TheDogApi breeds catalog"""
+
+    __tablename__ = "breed"
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+    )
+
+    name = db.Column(
+        db.Text,
+        nullable = False,
+        unique = True,
+    )
+
+    temperament = db.Column(
+        db.Text,
+    )
+
+    fetched_at = db.Column(
+        db.DateTime,
+        nullable = False,
+        default = datetime.utcnow,
+        server_default = db.text(UTC_NOW)
+    )
+
+    def __repr__(self):
+        return f"<Breed #{self.id}: {self.name} >"
+
+
 class Message(db.Model):
     """Messages in the system"""
 
@@ -362,10 +452,17 @@ class Message(db.Model):
         nullable = False
     )
 
+    # set from the conversation upsert when the message is added (see next_in_thread)
     date = db.Column(
         db.DateTime,
         nullable=False,
-        default = datetime.utcnow()
+        server_default = db.text(UTC_NOW)
+    )
+
+    # position of the message in its thread: 1, 2, 3... in the order the messages were committed
+    thread_seq = db.Column(
+        db.Integer,
+        nullable = False
     )
 
     read = db.Column(
@@ -373,12 +470,194 @@ class Message(db.Model):
         default = False
     )
 
-    dog_owner = db.relationship("Dog_Owner", backref = "message")
-    dog_walker = db.relationship("Dog_Walker", backref = "message")
+    dog_owner = db.relationship("Dog_Owner", backref = db.backref("message", passive_deletes = True))
+    dog_walker = db.relationship("Dog_Walker", backref = db.backref("message", passive_deletes = True))
+
+    __table_args__ = (
+        db.Index("ix_message_thread", "dog_owner_id", "dog_walker_id", "date", "id"),
+        # the ON DELETE CASCADE of dog_walker_id (ix_message_thread only covers dog_owner_id)
+        db.Index("ix_message_walker", "dog_walker_id"),
+        db.UniqueConstraint("dog_owner_id", "dog_walker_id", "thread_seq", name = "uq_message_thread_seq"),
+        # unread messages of each side of a thread, for marking them read (unread.py)
+        db.Index("ix_message_unread_owner", "dog_owner_id", "dog_walker_id", postgresql_where = db.text("is_sender_worker AND read IS NOT TRUE")),
+        db.Index("ix_message_unread_walker", "dog_walker_id", "dog_owner_id", postgresql_where = db.text("NOT is_sender_worker AND read IS NOT TRUE")),
+    )
 
     def __repr__(self):
         return f"<Message #{self.id} >"
 
+    @classmethod
+    def thread_last_id(cls, dog_owner_id, dog_walker_id):
+        """ Id of the latest message between two users (None without messages): the version of the thread """
+
+        return db.session.query(db.func.max(cls.id)).filter_by(dog_owner_id = dog_owner_id, dog_walker_id = dog_walker_id).scalar()
+
+    @classmethod
+    def thread_page(cls, dog_owner_id, dog_walker_id, before = None, per_page = 50):
+        """Page of the messages between two users, oldest first.
+
+        Pages are read backwards from the latest message with a keyset on (date, id):
+        `before` is the cursor returned for the previous (newer) page.
+        Returns (messages, cursor for the older page or None).
+        """
+
+        query = cls.query.filter_by(dog_owner_id = dog_owner_id, dog_walker_id = dog_walker_id)
+
+        if before:
+            date, message_id = before
+            query = query.filter(db.or_(cls.date < date, db.and_(cls.date == date, cls.id < message_id)))
+
+        messages = query.order_by(cls.date.desc(), cls.id.desc()).limit(per_page + 1).all()
+
+        older = None
+
+        if len(messages) > per_page:
+            messages = messages[:per_page]
+            older = (messages[-1].date, messages[-1].id)
+
+        messages.reverse()
+
+        return messages, older
+
+
+class Conversation(db.Model):
+    """Conversation between a dog_owner and a dog_walker: one row per pair, updated on every new message"""
+
+    __tablename__ = "conversation"
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+    )
+
+    dog_owner_id = db.Column(
+        db.Integer,
+        db.ForeignKey('dog_owner.id', ondelete = "cascade"),
+        nullable = False
+    )
+
+    dog_walker_id = db.Column(
+        db.Integer,
+        db.ForeignKey('dog_walker.id', ondelete = "cascade"),
+        nullable = False
+    )
+
+    last_message_at = db.Column(
+        db.DateTime,
+        nullable = False
+    )
+
+    last_message = db.Column(
+        db.String,
+    )
+
+    is_last_sender_worker = db.Column(
+        db.Boolean,
+        default = False,
+        nullable = False
+    )
+
+    dog_owner_unread = db.Column(
+        db.Integer,
+        default = 0,
+        nullable = False
+    )
+
+    dog_walker_unread = db.Column(
+        db.Integer,
+        default = 0,
+        nullable = False
+    )
+
+    # thread_seq of the latest message; only grows, also when messages are deleted
+    last_seq = db.Column(
+        db.Integer,
+        default = 0,
+        server_default = "0",
+        nullable = False
+    )
+
+    dog_owner = db.relationship("Dog_Owner", backref = db.backref("conversations", passive_deletes = True))
+    dog_walker = db.relationship("Dog_Walker", backref = db.backref("conversations", passive_deletes = True))
+
+    __table_args__ = (
+        db.UniqueConstraint("dog_owner_id", "dog_walker_id", name = "uq_conversation_pair"),
+        db.Index("ix_conversation_owner_inbox", "dog_owner_id", "last_message_at"),
+        db.Index("ix_conversation_walker_inbox", "dog_walker_id", "last_message_at"),
+    )
+
+    PREVIEW_LENGTH = 100
+
+    def __repr__(self):
+        return f"<Conversation #{self.id}: Dog_Owner = {self.dog_owner_id} - Dog_Walker = {self.dog_walker_id} >"
+
+    @classmethod
+    def inbox_for(cls, user_id, is_worker):
+        """ Conversations of the user, newest first, with the other participant already loaded """
+
+        if is_worker:
+            query = cls.query.filter_by(dog_walker_id = user_id).options(db.joinedload(cls.dog_owner))
+        else:
+            query = cls.query.filter_by(dog_owner_id = user_id).options(db.joinedload(cls.dog_walker))
+
+        return query.order_by(cls.last_message_at.desc()).all()
+
+    @classmethod
+    def contacts_of_walker(cls, dog_walker_id):
+        """ (id, name) of the dog_owners the dog_walker has a conversation with, by name.
+
+        One row per pair, read through the walker inbox index: no message is loaded.
+        """
+
+        return (db.session.query(User.id, User.name)
+                .join(cls, cls.dog_owner_id == User.id)
+                .filter(cls.dog_walker_id == dog_walker_id)
+                .order_by(User.name, User.id)
+                .all())
+
+
+@event.listens_for(Message, "before_insert")
+def next_in_thread(mapper, connection, message):
+    """ Upsert the pair's conversation and count the message unread for its recipient, in the same transaction as the new message.
+
+    The upsert locks the conversation row until the commit, so it also hands
+    out the message's thread_seq (and its date, when not given) in the order
+    the messages of the thread are committed.
+    """
+
+    table = Conversation.__table__
+    date = message.date if message.date is not None else db.literal_column(UTC_NOW)
+
+    stmt = pg_insert(table).values(
+        dog_owner_id = message.dog_owner_id,
+        dog_walker_id = message.dog_walker_id,
+        last_message_at = date,
+        last_message = message.text[:Conversation.PREVIEW_LENGTH],
+        is_last_sender_worker = bool(message.is_sender_worker),
+        dog_owner_unread = 1 if message.is_sender_worker else 0,
+        dog_walker_unread = 0 if message.is_sender_worker else 1,
+        last_seq = 1,
+    )
+
+    stmt = stmt.on_conflict_do_update(
+        index_elements = [table.c.dog_owner_id, table.c.dog_walker_id],
+        set_ = {
+            "last_message_at": stmt.excluded.last_message_at,
+            "last_message": stmt.excluded.last_message,
+            "is_last_sender_worker": stmt.excluded.is_last_sender_worker,
+            "dog_owner_unread": table.c.dog_owner_unread + stmt.excluded.dog_owner_unread,
+            "dog_walker_unread": table.c.dog_walker_unread + stmt.excluded.dog_walker_unread,
+            "last_seq": table.c.last_seq + 1,
+        }
+    ).returning(table.c.last_seq, table.c.last_message_at)
+
+    message.thread_seq, message.date = connection.execute(stmt).first()
+
+    recipient_id = message.dog_owner_id if message.is_sender_worker else message.dog_walker_id
+    users = User.__table__
+
+    connection.execute(users.update().where(users.c.id == recipient_id).values(unread_messages = users.c.unread_messages + 1))
+
 class Appointment(db.Model):
     """Appointments in the system"""
 
@@ -419,17 +698,216 @@ class Appointment(db.Model):
         nullable = False
     )
 
+    # typed schedule, kept in sync with the text fields above by sync_appointment_schedule().
+    starts_at = db.Column(
+        db.DateTime(timezone = True),
+        nullable = False
+    )
+
+    duration_minutes = db.Column(
+        db.Integer,
+        nullable = False
+    )
+
+    ends_at = db.Column(
+        db.DateTime(timezone = True),
+        nullable = False
+    )
+
     status = db.Column(
         db.Boolean,
         default = False
     )
 
-    dog_owner = db.relationship("Dog_Owner", backref = "appointments")
-    dog_walker = db.relationship("Dog_Walker", backref = "appointments")
+    dog_owner = db.relationship("Dog_Owner", backref = db.backref("appointments", passive_deletes = True))
+    dog_walker = db.relationship("Dog_Walker", backref = db.backref("appointments", passive_deletes = True))
+
+    __table_args__ = (
+        db.Index("ix_appointment_walker_start", "dog_walker_id", "starts_at"),
+        db.Index("ix_appointment_owner_start", "dog_owner_id", "starts_at"),
+        # one partial index per status, matching the pending/done pages of each user
+        db.Index("ix_appointment_walker_pending", "dog_walker_id", "starts_at", "id", postgresql_where = db.text("status IS NOT true")),
+        db.Index("ix_appointment_walker_done", "dog_walker_id", "starts_at", "id", postgresql_where = db.text("status IS true")),
+        db.Index("ix_appointment_owner_pending", "dog_owner_id", "starts_at", "id", postgresql_where = db.text("status IS NOT true")),
+        db.Index("ix_appointment_owner_done", "dog_owner_id", "starts_at", "id", postgresql_where = db.text("status IS true")),
+    )
 
     def __repr__(self):
         return f"<Appointment #{self.id} >"
 
+    @classmethod
+    def overlapping(cls, start, end, dog_walker_id = None, dog_owner_id = None):
+        """ Query of the appointments that overlap the [start, end) interval """
+
+        # tstzrange && tstzrange can use the gist index of ex_appointment_walker_overlap.
+        query = cls.query.filter(db.func.tstzrange(cls.starts_at, cls.ends_at).op("&&")(db.func.tstzrange(start, end)))
+
+        if dog_walker_id is not None:
+            query = query.filter(cls.dog_walker_id == dog_walker_id)
+        if dog_owner_id is not None:
+            query = query.filter(cls.dog_owner_id == dog_owner_id)
+
+        return query.order_by(cls.starts_at)
+
+    @classmethod
+    def status_page(cls, done, dog_walker_id = None, dog_owner_id = None, after = None, per_page = 20):
+        """Page of the pending or done appointments of one user.
+
+        Pending appointments come by upcoming start time, done ones most recent first,
+        with a keyset on (starts_at, id): `after` is the cursor returned for the previous page.
+        The other side of the appointment is loaded in the same query.
+        Returns (appointments, cursor for the next page or None).
+        """
+
+        if dog_walker_id is not None:
+            query = cls.query.filter(cls.dog_walker_id == dog_walker_id).options(joinedload(cls.dog_owner))
+        else:
+            query = cls.query.filter(cls.dog_owner_id == dog_owner_id).options(joinedload(cls.dog_walker))
+
+        if done:
+            query = query.filter(cls.status.is_(True)).options(selectinload(cls.review))
+        else:
+            query = query.filter(cls.status.isnot(True))
+
+        if after:
+            starts_at, appointment_id = after
+
+            if done:
+                query = query.filter(db.or_(cls.starts_at < starts_at, db.and_(cls.starts_at == starts_at, cls.id < appointment_id)))
+            else:
+                query = query.filter(db.or_(cls.starts_at > starts_at, db.and_(cls.starts_at == starts_at, cls.id > appointment_id)))
+
+        if done:
+            query = query.order_by(cls.starts_at.desc(), cls.id.desc())
+        else:
+            query = query.order_by(cls.starts_at, cls.id)
+
+        appointments = query.limit(per_page + 1).all()
+
+        next_cursor = None
+
+        if len(appointments) > per_page:
+            appointments = appointments[:per_page]
+            next_cursor = (appointments[-1].starts_at, appointments[-1].id)
+
+        return appointments, next_cursor
+
+
+def parse_appointment_date(value):
+    """ Date of an appointment: a date object, "2021-05-25" or "05-25-2021" """
+
+    if isinstance(value, date):
+        return value
+
+    for date_format in ("%Y-%m-%d", "%m-%d-%Y"):
+        try:
+            return datetime.strptime(value.strip(), date_format).date()
+        except ValueError:
+            pass
+
+    raise ValueError(f"Invalid appointment date: {value}")
+
+
+def parse_appointment_start(date_value, time_start, day_period):
+    """ Timezone aware start of an appointment, from the New_Appointment_Form fields """
+
+    hours, _, minutes = time_start.strip().partition(":")
+    hour = int(hours) % 12 + (12 if day_period.strip().upper() == "PM" else 0)
+
+    start = datetime.combine(parse_appointment_date(date_value), time(hour, int(minutes or 0)))
+
+    return start.replace(tzinfo = LOCAL_TIMEZONE)
+
+
+def parse_duration(duration):
+    """ Duration in minutes, from the New_Appointment_Form field """
+
+    return int(str(duration).strip())
+
+
+@event.listens_for(Appointment, "before_insert")
+@event.listens_for(Appointment, "before_update")
+def sync_appointment_schedule(mapper, connection, appointment):
+    """ Keep the typed schedule and the text fields of the appointment in sync """
+
+    state = inspect(appointment)
+    typed_changed = any(state.attrs[key].history.has_changes() for key in ("starts_at", "duration_minutes"))
+    text_changed = any(state.attrs[key].history.has_changes() for key in ("date", "time_start", "day_period", "duration"))
+
+    if typed_changed and appointment.starts_at is not None:
+        local_start = appointment.starts_at.astimezone(LOCAL_TIMEZONE)
+
+        appointment.date = local_start.date().isoformat()
+        appointment.time_start = local_start.strftime("%I:%M")
+        appointment.day_period = local_start.strftime("%p")
+        appointment.duration = str(appointment.duration_minutes)
+
+    elif text_changed or appointment.starts_at is None:
+        appointment.starts_at = parse_appointment_start(appointment.date, appointment.time_start, appointment.day_period)
+        appointment.duration_minutes = parse_duration(appointment.duration)
+
+    if typed_changed or text_changed or appointment.ends_at is None:
+        appointment.ends_at = appointment.starts_at + timedelta(minutes = appointment.duration_minutes)
+
+# two appointments of the same walker can't overlap: Postgres rejects the second one,
+# even when both are inserted at the same time. btree_gist lets `dog_walker_id WITH =` into the gist index.
+event.listen(db.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+event.listen(Appointment.__table__, "after_create", DDL(
+    "ALTER TABLE appointment ADD CONSTRAINT ex_appointment_walker_overlap "
+    "EXCLUDE USING gist (dog_walker_id WITH =, tstzrange(starts_at, ends_at) WITH &&)"
+))
+
+
+class Availability(db.Model):
+    """Weekly availability window of a dog_walker, in local time"""
+
+    __tablename__ = "availability"
+
+    WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+    )
+
+    dog_walker_id = db.Column(
+        db.Integer,
+        db.ForeignKey('dog_walker.id', ondelete = "cascade"),
+        nullable = False
+    )
+
+    # 0 is Monday, like date.weekday()
+    weekday = db.Column(
+        db.Integer,
+        nullable = False
+    )
+
+    starts = db.Column(
+        db.Time,
+        nullable = False
+    )
+
+    ends = db.Column(
+        db.Time,
+        nullable = False
+    )
+
+    dog_walker = db.relationship("Dog_Walker", backref = db.backref("availability", passive_deletes = True))
+
+    __table_args__ = (
+        db.CheckConstraint("weekday BETWEEN 0 AND 6", name = "ck_availability_weekday"),
+        db.CheckConstraint("ends > starts", name = "ck_availability_window"),
+        db.Index("ix_availability_walker", "dog_walker_id", "weekday"),
+    )
+
+    def __repr__(self):
+        return f"<Availability #{self.id}: {self.weekday_name} {self.starts} - {self.ends} >"
+
+    @property
+    def weekday_name(self):
+        return self.WEEKDAYS[self.weekday]
+
+
 class Review(db.Model):
     """Dog_Owner Review about the appointment"""
 
@@ -454,13 +932,218 @@ class Review(db.Model):
         db.String,
     )
 
-    appointment = db.relationship("Appointment", backref = "review")
+    appointment = db.relationship("Appointment", backref = db.backref("review", passive_deletes = True))
+
+    __table_args__ = (
+        db.Index("ix_review_appointment", "appointment_id"),
+    )
     
 
     def __repr__(self):
         return f"<Review #{self.id} - Rate: {self.rate} - Appointment: {self.appointment_id} >"
 
 
+def bump_appointments_version(connection, user_ids):
+    """ Mark the appointment lists of the users as changed (user_ids: ids or a select of ids) """
+
+    table = User.__table__
+
+    connection.execute(table.update().where(table.c.id.in_(user_ids)).values(appointments_version = table.c.appointments_version + 1))
+
+
+@event.listens_for(Appointment, "after_insert")
+@event.listens_for(Appointment, "after_update")
+@event.listens_for(Appointment, "after_delete")
+def appointment_lists_changed(mapper, connection, appointment):
+    bump_appointments_version(connection, [appointment.dog_owner_id, appointment.dog_walker_id])
+
+
+@event.listens_for(Review, "after_insert")
+@event.listens_for(Review, "after_delete")
+def reviewed_appointment_lists_changed(mapper, connection, review):
+    table = Appointment.__table__
+    participants = db.union(
+        db.select([table.c.dog_owner_id]).where(table.c.id == review.appointment_id),
+        db.select([table.c.dog_walker_id]).where(table.c.id == review.appointment_id),
+    )
+
+    bump_appointments_version(connection, participants)
+
+
+@event.listens_for(User, "after_update", propagate = True)
+def counterpart_lists_changed(mapper, connection, user):
+    """ The appointment lists of the other side show the user's name """
+
+    state = inspect(user)
+
+    if not (state.attrs.first_name.history.has_changes() or state.attrs.last_name.history.has_changes()):
+        return
+
+    table = Appointment.__table__
+    counterparts = db.union(
+        db.select([table.c.dog_walker_id]).where(table.c.dog_owner_id == user.id),
+        db.select([table.c.dog_owner_id]).where(table.c.dog_walker_id == user.id),
+    )
+
+    bump_appointments_version(connection, counterparts)
+
+
+class AccountPurge(db.Model):
+    """Background deletion of a large account, with its progress"""
+
+    __tablename__ = "account_purge"
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+    )
+
+    # 'dog_owner' or 'dog_walker'; no foreign key, the user row is deleted at the end of the purge.
+    kind = db.Column(
+        db.String,
+        nullable = False
+    )
+
+    user_id = db.Column(
+        db.Integer,
+        nullable = False
+    )
+
+    # 'pending', 'running', 'done' or 'failed'
+    status = db.Column(
+        db.String,
+        nullable = False,
+        default = "pending"
+    )
+
+    total_messages = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 0
+    )
+
+    deleted_messages = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 0
+    )
+
+    created_at = db.Column(
+        db.DateTime,
+        nullable = False,
+        default = datetime.utcnow,
+        server_default = db.text(UTC_NOW)
+    )
+
+    finished_at = db.Column(
+        db.DateTime,
+    )
+
+    __table_args__ = (
+        db.Index("ix_account_purge_user", "kind", "user_id"),
+    )
+
+    def __repr__(self):
+        return f"<AccountPurge #{self.id}: {self.kind} {self.user_id} - {self.status} {self.deleted_messages}/{self.total_messages} >"
+
+    @property
+    def progress(self):
+        """ Share of the messages already deleted, from 0 to 1 """
+
+        if not self.total_messages:
+            return 1.0 if self.status == "done" else 0.0
+
+        return min(self.deleted_messages / self.total_messages, 1.0)
+
+    @classmethod
+    def in_progress(cls, kind, user_id):
+        """ Is the account being purged? (a failed purge is retried, so it counts) """
+
+        return db.session.query(cls.query.filter(cls.kind == kind, cls.user_id == user_id, cls.status != "done").exists()).scalar()
+
+
+class Job(db.Model):
+    """Background job waiting in the queue (see jobs.py)"""
+
+    __tablename__ = "job"
+
+    id = db.Column(
+        db.Integer,
+        primary_key=True,
+    )
+
+    name = db.Column(
+        db.String,
+        nullable = False
+    )
+
+    payload = db.Column(
+        db.JSON,
+        nullable = False,
+        default = dict
+    )
+
+    # enqueueing twice with the same key only keeps the first job.
+    idempotency_key = db.Column(
+        db.String,
+        unique = True
+    )
+
+    # 'queued', 'running', 'done' or 'failed'
+    status = db.Column(
+        db.String,
+        nullable = False,
+        default = "queued"
+    )
+
+    attempts = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 0
+    )
+
+    max_attempts = db.Column(
+        db.Integer,
+        nullable = False,
+        default = 5
+    )
+
+    run_at = db.Column(
+        db.DateTime,
+        nullable = False,
+        default = datetime.utcnow,
+        server_default = db.text(UTC_NOW)
+    )
+
+    locked_at = db.Column(
+        db.DateTime,
+    )
+
+    last_error = db.Column(
+        db.Text,
+    )
+
+    created_at = db.Column(
+        db.DateTime,
+        nullable = False,
+        default = datetime.utcnow,
+        server_default = db.text(UTC_NOW)
+    )
+
+    finished_at = db.Column(
+        db.DateTime,
+    )
+
+    __table_args__ = (
+        # the workers only look at the jobs still to run
+        db.Index("ix_job_queued", "run_at", "id", postgresql_where = db.text("status = 'queued'")),
+        db.Index("ix_job_running", "locked_at", postgresql_where = db.text("status = 'running'")),
+    )
+
+    def __repr__(self):
+        return f"<Job #{self.id}: {self.name} - {self.status} ({self.attempts}/{self.max_attempts}) >"
+
+
 def connect_db(app):
     """Connect this database to provided Flask app."""
 
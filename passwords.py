@@ -0,0 +1,97 @@
+"""Password hashing.
+
+- BCRYPT_LOG_ROUNDS sets the bcrypt cost of the new hashes. Hashes made with
+  another cost still work; they are replaced on the next successful login
+  (see rehash_if_needed).
+- PASSWORD_HASHING_POOL ('thread' or 'process') runs bcrypt in a pool of
+  PASSWORD_HASHING_WORKERS per worker process. bcrypt releases the GIL, so
+  with the thread pool the other threads of a gthread worker keep serving
+  requests during a login, and the pool size caps how many CPUs one worker
+  spends on hashing in a login burst. The process pool also spreads a single
+  worker's hashing over several cores. Without it, bcrypt runs in the request
+  thread.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+from flask import current_app, has_app_context
+
+DEFAULT_LOG_ROUNDS = 12
+
+_executor = {"kind": None, "pool": None}
+
+
+def _config(key, default = None):
+    if has_app_context():
+        return current_app.config.get(key, default)
+
+    return default
+
+
+def log_rounds():
+    return _config("BCRYPT_LOG_ROUNDS", DEFAULT_LOG_ROUNDS)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("UTF-8"), bcrypt.gensalt(rounds)).decode("UTF-8")
+
+
+def _check(hashed, password):
+    return bcrypt.checkpw(password.encode("UTF-8"), hashed.encode("UTF-8"))
+
+
+def _get_pool():
+    """ The hashing pool of this process, created on first use (after gunicorn forks) """
+
+    kind = _config("PASSWORD_HASHING_POOL")
+
+    if not kind:
+        return None
+
+    if _executor["kind"] != kind:
+        workers = _config("PASSWORD_HASHING_WORKERS") or os.cpu_count()
+        executor_class = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+
+        _executor["pool"] = executor_class(max_workers = workers)
+        _executor["kind"] = kind
+
+    return _executor["pool"]
+
+
+def _run(function, *args):
+    pool = _get_pool()
+
+    if pool is None:
+        return function(*args)
+
+    return pool.submit(function, *args).result()
+
+
+def hash_password(password):
+    """ bcrypt hash of the password, with the configured cost """
+
+    return _run(_hash, password, log_rounds())
+
+
+def check_password(hashed, password):
+    """ Does the password match the hash? """
+
+    return _run(_check, hashed, password)
+
+
+def hash_rounds(hashed):
+    """ Cost of a bcrypt hash: '$2b$12$...' -> 12 """
+
+    return int(hashed.split("$")[2])
+
+
+def rehash_if_needed(user, password):
+    """ After a successful login, store a new hash if the cost changed (no commit) """
+
+    if hash_rounds(user.password) != log_rounds():
+        user.password = hash_password(password)
+        return True
+
+    return False
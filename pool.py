@@ -0,0 +1,125 @@
+"""Database connection pool settings and health metrics.
+
+The pool is configured from the app config (see app.py for the environment
+variables): SQLALCHEMY_POOL_SIZE / SQLALCHEMY_MAX_OVERFLOW /
+SQLALCHEMY_POOL_TIMEOUT / SQLALCHEMY_POOL_RECYCLE, read by Flask-SQLAlchemy,
+plus DB_POOL_PRE_PING and DB_PGBOUNCER applied here.
+
+- pre_ping tests every connection on checkout, so the connections broken by a
+  Postgres restart are replaced one by one instead of failing requests.
+- With DB_PGBOUNCER the app keeps no pool of its own (NullPool): PgBouncer
+  does the pooling, and a connection is opened per checkout.
+
+MeasuredQueuePool records how long each checkout waits for a connection,
+the checkouts that needed an overflow connection and the ones that timed
+out. Every process keeps its own numbers (`pool_metrics`).
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+# upper bounds, in seconds, of the checkout wait histogram
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+
+
+class PoolMetrics:
+    """Checkout counters of the pools of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_seconds = 0.0
+            self.checkout_max_seconds = 0.0
+            self.checkout_buckets = [0] * len(CHECKOUT_BUCKETS)
+            self.overflow_checkouts = 0
+            self.timeouts = 0
+
+    def observe_checkout(self, seconds, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            self.checkout_max_seconds = max(self.checkout_max_seconds, seconds)
+
+            for i, bound in enumerate(CHECKOUT_BUCKETS):
+                if seconds <= bound:
+                    self.checkout_buckets[i] += 1
+                    break
+
+            if overflow:
+                self.overflow_checkouts += 1
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_seconds_total": round(self.checkout_seconds, 6),
+                "checkout_seconds_max": round(self.checkout_max_seconds, 6),
+                "checkout_seconds_buckets": {str(bound): count for bound, count in zip(CHECKOUT_BUCKETS, self.checkout_buckets)},
+                "overflow_checkouts": self.overflow_checkouts,
+                "timeouts": self.timeouts,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeasuredQueuePool(QueuePool):
+    """QueuePool recording the checkout waits in pool_metrics"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+
+        try:
+            connection = super()._do_get()
+
+        except PoolTimeoutError:
+            pool_metrics.observe_timeout()
+            raise
+
+        pool_metrics.observe_checkout(time.perf_counter() - start, self.overflow() > 0)
+
+        return connection
+
+
+def apply_pool_options(config, options):
+    """ Engine options for the pool settings of the app config """
+
+    options["pool_pre_ping"] = config.get("DB_POOL_PRE_PING", True)
+
+    if config.get("DB_PGBOUNCER"):
+        options["poolclass"] = NullPool
+
+        for key in ("pool_size", "max_overflow", "pool_timeout"):
+            options.pop(key, None)
+
+    else:
+        options["poolclass"] = MeasuredQueuePool
+
+
+def pool_status(pool):
+    """ Current state of the pool plus the checkout metrics of this process """
+
+    status = {"pool": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+
+    status.update(pool_metrics.snapshot())
+
+    return status
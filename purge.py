@@ -0,0 +1,185 @@
+"""Deletion of dog_owner and dog_walker accounts.
+
+The rows that belong to an account (messages, conversations, appointments and
+their reviews, dogs, availability) are deleted by Postgres through the
+ON DELETE CASCADE foreign keys. Deleting an account is one DELETE for the user
+and one for its address; the relationships are passive_deletes, so nothing is
+loaded into the session.
+
+Accounts with more than ACCOUNT_PURGE_THRESHOLD messages are purged by a
+background job instead: the messages go in batches of PURGE_BATCH_SIZE, one
+transaction each, and the account_purge row keeps the progress. The account
+can't log in while it is being purged.
+"""
+
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, User, Address, Message, Appointment, AccountPurge, Job, bump_appointments_version
+from functions import remove_dog_owner_reviews_from_rates
+from identity import user_kind
+from unread import forget_unread_from
+from jobs import job, enqueue, touch_job
+
+PURGE_THRESHOLD = 5000
+PURGE_BATCH_SIZE = 1000
+
+MESSAGE_COLUMNS = {"dog_owner": Message.dog_owner_id, "dog_walker": Message.dog_walker_id}
+
+# (column of the user, column of the other side) of the appointments
+APPOINTMENT_COLUMNS = {"dog_owner": (Appointment.dog_owner_id, Appointment.dog_walker_id), "dog_walker": (Appointment.dog_walker_id, Appointment.dog_owner_id)}
+
+
+def purge_threshold():
+    return current_app.config.get("ACCOUNT_PURGE_THRESHOLD", PURGE_THRESHOLD)
+
+
+def delete_account(kind, user_id):
+    """ Delete the user, its address and, by cascade, everything else (no commit) """
+
+    address_id = db.session.query(User.address_id).filter(User.id == user_id, User.role == kind).scalar()
+
+    if kind == "dog_owner":
+        remove_dog_owner_reviews_from_rates(db, user_id)
+
+    forget_unread_from(kind, user_id)
+
+    # the appointments go by cascade, without the Appointment listeners: change the other side's lists here
+    own, other = APPOINTMENT_COLUMNS[kind]
+    bump_appointments_version(db.session, db.select([other]).where(own == user_id))
+
+    # the dog_owner / dog_walker row goes with the app_user row (ON DELETE CASCADE)
+    User.query.filter_by(id = user_id, role = kind).delete(synchronize_session = False)
+
+    if address_id is not None:
+        Address.query.filter_by(id = address_id).delete(synchronize_session = False)
+
+
+def has_many_messages(kind, user_id):
+    """ Does the account have more messages than the purge threshold? (stops counting there) """
+
+    column = MESSAGE_COLUMNS[kind]
+
+    return db.session.query(Message.query.filter(column == user_id).offset(purge_threshold()).exists()).scalar()
+
+
+def delete_user(user):
+    """ Delete the account now, or start a background purge for a large one.
+
+    Returns the AccountPurge, or None when the account is already deleted.
+    """
+
+    kind = user_kind(user)
+
+    if has_many_messages(kind, user.id):
+        return start_purge(kind, user.id)
+
+    delete_account(kind, user.id)
+    db.session.commit()
+
+    return None
+
+
+def start_purge(kind, user_id):
+    """ Record the purge of the account and queue the job running it """
+
+    column = MESSAGE_COLUMNS[kind]
+    total = db.session.query(db.func.count(Message.id)).filter(column == user_id).scalar()
+
+    purge = AccountPurge(kind = kind, user_id = user_id, total_messages = total)
+    db.session.add(purge)
+    db.session.flush()
+
+    enqueue("purge_account", {"purge_id": purge.id}, idempotency_key = f"purge_account:{purge.id}")
+    db.session.commit()
+
+    return purge
+
+
+@job("purge_account")
+def run_purge(purge_id, batch_size = PURGE_BATCH_SIZE):
+    """ Delete the messages of the account batch by batch, then the account. Safe to run again after a failure """
+
+    purge = AccountPurge.query.get(purge_id)
+
+    if purge is None or purge.status == "done":
+        return purge
+
+    purge.status = "running"
+    db.session.commit()
+
+    column = MESSAGE_COLUMNS[purge.kind].name
+
+    try:
+        while True:
+            result = db.session.execute(
+                f"DELETE FROM message WHERE id IN (SELECT id FROM message WHERE {column} = :user_id LIMIT :batch_size)",
+                {"user_id": purge.user_id, "batch_size": batch_size}
+            )
+
+            if not result.rowcount:
+                break
+
+            # in SQL: a second run of the job (after a lost worker) can't overwrite the count
+            AccountPurge.query.filter_by(id = purge.id).update({AccountPurge.deleted_messages: AccountPurge.deleted_messages + result.rowcount}, synchronize_session = False)
+            touch_job()
+            db.session.commit()
+
+        delete_account(purge.kind, purge.user_id)
+
+        purge.status = "done"
+        purge.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    except Exception:
+        db.session.rollback()
+
+        purge.status = "failed"
+        db.session.commit()
+
+        raise
+
+    return purge
+
+
+def unfinished_purges():
+    return AccountPurge.query.filter(AccountPurge.status != "done").order_by(AccountPurge.id).all()
+
+
+def purge_jobs(purge_id):
+    """ The jobs of the purge: the first one and its retries (purge_account:<id>:<attempt>) """
+
+    key = f"purge_account:{purge_id}"
+
+    return Job.query.filter(Job.name == "purge_account", db.or_(Job.idempotency_key == key, Job.idempotency_key.like(f"{key}:%")))
+
+
+def retry_purges():
+    """ Queue again the unfinished purges that have no job waiting or running.
+
+    Returns (purge, what happened) for every unfinished purge; one failure
+    doesn't stop the others.
+    """
+
+    results = []
+
+    for purge in unfinished_purges():
+        jobs = purge_jobs(purge.id)
+
+        if jobs.filter(Job.status.in_(("queued", "running"))).count():
+            results.append((purge, "already queued"))
+            continue
+
+        try:
+            enqueue("purge_account", {"purge_id": purge.id}, idempotency_key = f"purge_account:{purge.id}:{jobs.count()}")
+            db.session.commit()
+
+        except Exception as error:
+            db.session.rollback()
+            results.append((purge, f"failed to queue: {error!r}"))
+            continue
+
+        results.append((purge, "queued again"))
+
+    return results
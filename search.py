@@ -0,0 +1,108 @@
+"""Dog walker search for the /dog_walkers page.
+
+The name filter runs against the normalized `dog_walker.search_name` column
+(trigram indexed) and the address filters against the lower(city) /
+lower(neighbor) / zipcode indexes. Results are ranked (name similarity when
+searching by name, the walker rate otherwise) and paginated with a keyset
+cursor on (rank, id), so every page costs the same no matter how deep it is.
+"""
+
+from sqlalchemy import and_, or_
+
+from models import db, Dog_Walker, Address, normalize_search_text, rate_rank
+
+DEFAULT_PAGE_SIZE = 12
+MAX_PAGE_SIZE = 100
+
+
+def dog_walker_listing():
+    """ Listing projection: only the columns a dog_walker card needs.
+
+    Walker and address come back in the same row (one round-trip for the whole
+    page), instead of lazy loading `dog_walker.address` once per card. The name,
+    photo and address_id live in app_user, joined to dog_walker on the id.
+    """
+
+    return db.session.query(
+        Dog_Walker.id,
+        Dog_Walker.name.label("name"),
+        Dog_Walker.photo,
+        Dog_Walker.rate,
+        Dog_Walker.version,
+        Address.neighbor,
+        Address.city,
+        Address.state,
+    ).select_from(Dog_Walker).outerjoin(Address, Dog_Walker.address_id == Address.id)
+
+
+def page_size(per_page):
+    """ Keep the requested page size between 1 and MAX_PAGE_SIZE """
+
+    if not per_page or per_page < 1:
+        return DEFAULT_PAGE_SIZE
+
+    return min(per_page, MAX_PAGE_SIZE)
+
+
+def encode_cursor(rank, dog_walker_id):
+    """ Cursor pointing right after the given row """
+
+    return f"{rank!r}:{dog_walker_id}"
+
+
+def decode_cursor(cursor):
+    """ (rank, id) from a cursor, or None for a missing/invalid one """
+
+    try:
+        rank, dog_walker_id = cursor.split(":")
+        return float(rank), int(dog_walker_id)
+
+    except (AttributeError, ValueError):
+        return None
+
+
+def search_dog_walkers(q = None, neighbor = None, city = None, zipcode = None, min_rate = None, after = None, per_page = DEFAULT_PAGE_SIZE):
+    """ Search dog_walkers, returning (listing rows, next_cursor).
+
+    next_cursor is None on the last page.
+    """
+
+    per_page = page_size(per_page)
+    term = normalize_search_text(q)
+
+    if term:
+        rank = db.cast(db.func.similarity(Dog_Walker.search_name, term), db.Float)
+    else:
+        rank = rate_rank()
+
+    query = dog_walker_listing().add_columns(rank.label("rank"))
+
+    if term:
+        pattern = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(Dog_Walker.search_name.like(f"%{pattern}%", escape = "\\"))
+
+    if neighbor:
+        query = query.filter(db.func.lower(Address.neighbor) == normalize_search_text(neighbor))
+    if city:
+        query = query.filter(db.func.lower(Address.city) == normalize_search_text(city))
+    if zipcode:
+        query = query.filter(Address.zipcode == zipcode)
+
+    if min_rate:
+        query = query.filter(Dog_Walker.rate >= min_rate)
+
+    cursor = decode_cursor(after)
+
+    if cursor:
+        last_rank, last_id = cursor
+        query = query.filter(or_(rank < last_rank, and_(rank == last_rank, Dog_Walker.id > last_id)))
+
+    rows = query.order_by(rank.desc(), Dog_Walker.id).limit(per_page + 1).all()
+
+    next_cursor = None
+
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].id)
+
+    return rows, next_cursor
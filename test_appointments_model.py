@@ -1,7 +1,9 @@
 import os
+from datetime import date, datetime, time, timedelta
 from unittest import TestCase
 
-from models import db, Dog_Owner, Dog_Walker, Dog, Message, Appointment, Review
+from models import LOCAL_TIMEZONE, db, Dog_Owner, Dog_Walker, Dog, Message, Appointment, Availability, Review
+from availability import free_slots, book_appointment, subtract_intervals
 
 from sqlalchemy.exc import IntegrityError
 
@@ -48,7 +50,7 @@ class AppointmentModelTestCase(TestCase):
     def test_appointment_model(self):
         """Testing appointment model"""
 
-        appointment = Appointment(dog_owner_id = self.walker1_id, dog_walker_id = self.owner1_id, date = "2021-05-02", time_start = "03:00", day_period = "PM", duration = "15")
+        appointment = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-02", time_start = "03:00", day_period = "PM", duration = "15")
         
         db.session.add(appointment)
         db.session.commit()
@@ -59,3 +61,83 @@ class AppointmentModelTestCase(TestCase):
         self.assertFalse(appointment.status)
 
         
+
+    def test_appointment_schedule(self):
+        """Will the form fields be turned into the typed schedule?"""
+
+        appointment = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "05-02-2021", time_start = "03:30", day_period = "PM", duration = "45")
+
+        db.session.add(appointment)
+        db.session.commit()
+
+        starts_at = appointment.starts_at.astimezone(LOCAL_TIMEZONE)
+
+        self.assertEqual((starts_at.year, starts_at.month, starts_at.day, starts_at.hour, starts_at.minute), (2021, 5, 2, 15, 30))
+        self.assertEqual(appointment.duration_minutes, 45)
+        self.assertEqual(appointment.ends_at - appointment.starts_at, timedelta(minutes = 45))
+
+    def test_appointment_overlapping(self):
+        """Will the range query find only the appointments inside the interval?"""
+
+        morning = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-02", time_start = "09:00", day_period = "AM", duration = "60")
+        evening = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-02", time_start = "06:00", day_period = "PM", duration = "30")
+
+        db.session.add_all([morning, evening])
+        db.session.commit()
+
+        start = datetime(2021, 5, 2, 9, 30, tzinfo = LOCAL_TIMEZONE)
+        end = datetime(2021, 5, 2, 12, 0, tzinfo = LOCAL_TIMEZONE)
+
+        self.assertEqual(Appointment.overlapping(start, end, dog_walker_id = self.walker1_id).all(), [morning])
+
+    def test_appointment_status_page(self):
+        """Will pending appointments come soonest first and done ones most recent first, page by page?"""
+
+        appointments = [Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = f"2021-05-0{day}", time_start = "09:00", day_period = "AM", duration = "30", status = day % 2 == 0) for day in range(1, 8)]
+
+        db.session.add_all(appointments)
+        db.session.commit()
+
+        first_page, cursor = Appointment.status_page(done = False, dog_walker_id = self.walker1_id, per_page = 2)
+        second_page, last_cursor = Appointment.status_page(done = False, dog_walker_id = self.walker1_id, after = cursor, per_page = 2)
+
+        self.assertEqual([appointment.date for appointment in first_page + second_page], ["2021-05-01", "2021-05-03", "2021-05-05", "2021-05-07"])
+        self.assertIsNone(last_cursor)
+
+        done, cursor = Appointment.status_page(done = True, dog_owner_id = self.owner1_id)
+
+        self.assertEqual([appointment.date for appointment in done], ["2021-05-06", "2021-05-04", "2021-05-02"])
+        self.assertIsNone(cursor)
+
+    def test_subtract_intervals(self):
+        """Will the busy intervals be cut out of the windows?"""
+
+        windows = [(9, 12), (14, 18)]
+        busy = [(8, 10), (11, 15), (16, 17)]
+
+        self.assertEqual(subtract_intervals(windows, busy), [(10, 11), (15, 16), (17, 18)])
+
+    def test_free_slots(self):
+        """Will the free slots be the weekly windows minus the appointments?"""
+
+        # 2021-05-03 is a Monday
+        db.session.add(Availability(dog_walker_id = self.walker1_id, weekday = 0, starts = time(9, 0), ends = time(12, 0)))
+        db.session.add(Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-03", time_start = "10:00", day_period = "AM", duration = "30"))
+        db.session.commit()
+
+        slots = free_slots(self.walker1_id, start_date = date(2021, 5, 3), days = 14)
+        local_slots = [(start.astimezone(LOCAL_TIMEZONE).strftime("%m-%d %H:%M"), end.astimezone(LOCAL_TIMEZONE).strftime("%H:%M")) for start, end in slots]
+
+        self.assertEqual(local_slots, [("05-03 09:00", "10:00"), ("05-03 10:30", "12:00"), ("05-10 09:00", "12:00")])
+
+    def test_book_appointment_conflict(self):
+        """Will an appointment overlapping another one of the walker be rejected?"""
+
+        first = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-03", time_start = "10:00", day_period = "AM", duration = "60")
+        overlapping = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-03", time_start = "10:30", day_period = "AM", duration = "30")
+        after = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-03", time_start = "11:00", day_period = "AM", duration = "30")
+
+        self.assertTrue(book_appointment(first))
+        self.assertFalse(book_appointment(overlapping))
+        self.assertTrue(book_appointment(after))
+        self.assertEqual(Appointment.query.filter_by(dog_walker_id = self.walker1_id).count(), 2)
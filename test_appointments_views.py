@@ -1,8 +1,10 @@
 import os
 from unittest import TestCase
 
-from models import db, connect_db, Dog_Owner, Dog_Walker, Appointment, Message
-from functions import is_worker
+from flask import template_rendered
+
+from models import db, User, connect_db, Dog_Owner, Dog_Walker, Appointment, Message
+from functions import is_worker, QueryCounter
 
 os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
 
@@ -19,8 +21,7 @@ class AppointmentTestCase(TestCase):
     def setUp(self):
         """Create test client and sample data"""
 
-        Dog_Owner.query.delete()
-        Dog_Walker.query.delete()
+        User.query.delete()
         Message.query.delete()
         Appointment.query.delete()
 
@@ -72,6 +73,30 @@ class AppointmentTestCase(TestCase):
         self.assertIn("2021-02-03", html)
         self.assertIn("Done", html)
     
+    def test_new_appointment_contacts(self):
+        """Will the dog_owner list have each contact once, without loading the messages?"""
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testwalker.id
+                sess["is_worker"] = True
+
+            for text in ("Hi, good morning!", "Are you free on Monday?", "Thanks!"):
+                db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, text = text))
+            db.session.add(Message(dog_owner_id = self.testowner2.id, dog_walker_id = self.testwalker.id, text = "Hello!"))
+            db.session.add(Message(dog_owner_id = self.testowner2.id, dog_walker_id = self.testwalker2.id, text = "Hello!"))
+            db.session.commit()
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get("/appointments/new")
+
+            html = res.get_data(as_text = True)
+
+        self.assertEqual(html.count("Nathalia Owner"), 1)
+        self.assertEqual(html.count("Amanda Owner"), 1)
+        self.assertFalse([statement for statement in counter.statements if "FROM message" in statement])
+
     def test_create_new_appointment_with_no_previous_message(self):
         """Will the dog_walker be able to create an appointment when he did not exchange messages with the dog_owner?"""
 
@@ -111,6 +136,17 @@ class AppointmentTestCase(TestCase):
         self.assertIsNone(appointment)
         self.assertIn("Access Unauthorized", html)
     
+    def test_anonymous_create_new_appointment(self):
+        """Will a visitor who is not logged in be turned away from the appointment form?"""
+
+        with self.client as c:
+
+            res = c.get("/appointments/new", follow_redirects = True)
+            html = res.get_data(as_text = True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("Access Unauthorized", html)
+
     def test_change_appointment_status(self):
         """Will the dog_walker be able to change the appointment to done?"""
 
@@ -249,3 +285,117 @@ class AppointmentTestCase(TestCase):
 
 
     
+
+    def test_dog_walker_appointments_page_query_count(self):
+        """Will the pending appointments page load the dog_owners with the appointments, in one query?"""
+
+        for day in range(1, 10):
+            db.session.add(Appointment(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, date = f"2021-05-0{day}", time_start = "09:00", day_period = "AM", duration = "30", status = day == 9))
+        db.session.commit()
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testwalker.id
+                sess["is_worker"] = True
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get(f"/dog_walkers/{self.testwalker.id}/appointments")
+
+            html = res.get_data(as_text = True)
+
+        self.assertEqual(html.count("Nathalia Owner"), 8)
+        self.assertNotIn("2021-05-09", html)
+        # the logged in user and the page of appointments
+        self.assertLessEqual(counter.count, 2)
+
+    def test_create_overlapping_appointment(self):
+        """Will the dog_walker be stopped from booking two walks at the same time?"""
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testwalker.id
+                sess["is_worker"] = True
+
+            db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, text = "Hi, good morning!"))
+            db.session.add(Appointment(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, date = "02-03-2021", time_start = "03:00", day_period = "PM", duration = "60"))
+            db.session.commit()
+
+            res = c.post("/appointments/new", data = {"dog_owner_id": self.testowner.id, "date": "02-03-2021", "time_start": "03:30", "day_period": "PM", "duration": "15"})
+            html = res.get_data(as_text = True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("overlaps another one of your appointments", html)
+        self.assertEqual(Appointment.query.filter_by(dog_walker_id = self.testwalker.id).count(), 1)
+
+    def test_appointments_not_modified(self):
+        """Will an unchanged appointment list answer 304 without rendering the template, until an appointment changes?"""
+
+        rendered = []
+
+        def record(sender, template, context, **extra):
+            rendered.append(template.name)
+
+        appointment = Appointment(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, date = "2021-05-03", time_start = "09:00", day_period = "AM", duration = "30")
+        db.session.add(appointment)
+        db.session.commit()
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testwalker.id
+                sess["is_worker"] = True
+
+            res = c.get(f"/dog_walkers/{self.testwalker.id}/appointments")
+            etag = res.headers["ETag"]
+
+            template_rendered.connect(record, app)
+
+            try:
+                with QueryCounter(db.engine) as counter:
+                    res = c.get(f"/dog_walkers/{self.testwalker.id}/appointments", headers = {"If-None-Match": etag})
+
+            finally:
+                template_rendered.disconnect(record, app)
+
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(rendered, [])
+            # only the logged in user
+            self.assertEqual(counter.count, 1)
+
+            c.post(f"/appointments/{appointment.id}/change_status", data = {"status": True})
+
+            res = c.get(f"/dog_walkers/{self.testwalker.id}/appointments", headers = {"If-None-Match": etag})
+
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn("Nathalia Owner", res.get_data(as_text = True))
+
+    def test_deleted_owner_changes_walker_list(self):
+        """Will deleting a dog_owner account change the ETag of the walker's appointment list?"""
+
+        db.session.add(Appointment(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, date = "2021-05-03", time_start = "09:00", day_period = "AM", duration = "30"))
+        db.session.commit()
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testwalker.id
+                sess["is_worker"] = True
+
+            etag = c.get(f"/dog_walkers/{self.testwalker.id}/appointments").headers["ETag"]
+
+        with app.test_client() as owner:
+
+            with owner.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testowner.id
+                sess["is_worker"] = False
+
+            owner.post("/dog_owners/delete")
+
+        with self.client as c:
+
+            res = c.get(f"/dog_walkers/{self.testwalker.id}/appointments", headers = {"If-None-Match": etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("Nathalia Owner", res.get_data(as_text = True))
@@ -0,0 +1,152 @@
+import os
+from datetime import datetime, timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+import requests
+
+from models import db, User, Dog_Owner, Dog, Breed
+from functions import is_worker, QueryCounter
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app, CURR_USER_KEY
+from breeds import get_breed_choices, get_breed_temperament, refresh_breed_catalog, invalidate_breed_choices, load_snapshot
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class FakeResponse:
+    """Replays the recorded TheDogApi breeds response"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class BreedCatalogTestCase(TestCase):
+    """Test the local breed catalog"""
+
+    def setUp(self):
+        """Start every test with an empty catalog"""
+
+        Dog.query.delete()
+        User.query.filter_by(role = "dog_owner").delete()
+        Breed.query.delete()
+        db.session.commit()
+
+        invalidate_breed_choices()
+        app.config['BREED_CATALOG_OFFLINE'] = False
+
+        self.client = app.test_client()
+        self.recorded = load_snapshot()
+
+    def tearDown(self):
+
+        db.session.rollback()
+        invalidate_breed_choices()
+
+    def test_refresh_from_upstream(self):
+        """Does the refresh save every breed from the upstream response?"""
+
+        with app.app_context():
+            with patch("breeds.requests.get", return_value = FakeResponse(self.recorded)):
+                self.assertTrue(refresh_breed_catalog())
+
+        self.assertEqual(Breed.query.count(), len(self.recorded))
+        self.assertIn("Docile", get_breed_temperament("Akita"))
+
+    def test_empty_catalog_with_upstream_down(self):
+        """Will an empty catalog be filled from the recorded snapshot when the upstream is down?"""
+
+        with app.app_context():
+            with patch("breeds.requests.get", side_effect = requests.ConnectionError):
+                choices = get_breed_choices()
+
+        self.assertIn(("Lhasa Apso", "Lhasa Apso"), choices)
+        self.assertEqual(choices[-1], ("Other", "Other"))
+
+    def test_fresh_choices_come_from_memory(self):
+        """Will a fresh catalog be served without calling the upstream again?"""
+
+        with app.app_context():
+            with patch("breeds.requests.get", return_value = FakeResponse(self.recorded)) as upstream:
+                get_breed_choices()
+                get_breed_choices()
+                get_breed_choices()
+
+        self.assertEqual(upstream.call_count, 1)
+
+    def test_stale_catalog_with_upstream_down(self):
+        """Will a stale catalog still be served when the upstream is unreachable?"""
+
+        old = datetime.utcnow() - timedelta(days = 30)
+        db.session.add(Breed(name = "Akita", temperament = "Docile", fetched_at = old))
+        db.session.commit()
+
+        with app.app_context():
+            with patch("breeds.requests.get", side_effect = requests.ConnectionError):
+                choices = get_breed_choices()
+
+        self.assertEqual(choices, [("Akita", "Akita"), ("Other", "Other")])
+
+    def test_stale_choices_kept_briefly(self):
+        """Will a stale catalog be served from memory for a short while, then read again?"""
+
+        app.config['BREED_CATALOG_OFFLINE'] = True
+
+        old = datetime.utcnow() - timedelta(days = 30)
+        db.session.add(Breed(name = "Akita", temperament = "Docile", fetched_at = old))
+        db.session.commit()
+
+        with app.app_context():
+            get_breed_choices()
+
+            with QueryCounter(db.engine) as counter:
+                choices = get_breed_choices()
+
+            self.assertEqual(counter.count, 0)
+            self.assertEqual(choices, [("Akita", "Akita"), ("Other", "Other")])
+
+            app.config['BREED_CHOICES_STALE_TTL'] = 0
+
+            try:
+                with QueryCounter(db.engine) as counter:
+                    get_breed_choices()
+                    get_breed_choices()
+
+            finally:
+                del app.config['BREED_CHOICES_STALE_TTL']
+
+        self.assertGreater(counter.count, 0)
+
+    def test_add_dog_without_upstream(self):
+        """Can a dog be added with its temperament while TheDogApi is offline?"""
+
+        app.config['BREED_CATALOG_OFFLINE'] = True
+
+        owner = Dog_Owner.signup(first_name = "Nathalia", last_name = "Owner", email = "nathalia@gmail.com", password = "123456")
+        db.session.commit()
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = owner.id
+                sess["is_worker"] = is_worker(owner)
+
+            with patch("breeds.requests.get") as upstream:
+                res = c.post(f"/dog_owners/{owner.id}/dogs/add", data = {"first_name": "Buzz", "breed": "Lhasa Apso", "weight": 18, "age": 4}, follow_redirects = True)
+
+            dog = Dog.query.filter_by(first_name = "Buzz").first()
+
+            self.assertEqual(res.status_code, 200)
+            self.assertFalse(upstream.called)
+            self.assertIn("Fearless", dog.description)
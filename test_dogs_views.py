@@ -1,7 +1,7 @@
 import os
 from unittest import TestCase
 
-from models import db, connect_db, Dog_Owner, Dog_Walker, Dog, Message
+from models import db, User, connect_db, Dog_Owner, Dog_Walker, Dog, Message
 from functions import is_worker
 
 os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
@@ -13,14 +13,16 @@ db.create_all()
 # Don't have WTForms use CSRF at all.
 app.config['WTF_CSRF_ENABLED'] = False
 
+# Serve the breeds from the recorded snapshot instead of TheDogApi.
+app.config['BREED_CATALOG_OFFLINE'] = True
+
 class DogsTestCase(TestCase):
     """Test dogs views"""
 
     def setUp(self):
         """Create test client and sample data"""
 
-        Dog_Owner.query.delete()
-        Dog_Walker.query.delete()
+        User.query.delete()
         Message.query.delete()
         Dog.query.delete()
 
@@ -0,0 +1,124 @@
+import os
+import csv
+import gzip
+import io
+import json
+from unittest import TestCase
+
+from models import db, User, Dog_Owner, Dog_Walker, Message, Appointment, Review
+from functions import is_worker
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app, CURR_USER_KEY
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class ExportTestCase(TestCase):
+    """Test the data export of a user"""
+
+    def setUp(self):
+        """Create test client and sample data"""
+
+        User.query.delete()
+
+        self.client = app.test_client()
+
+        self.testowner = Dog_Owner.signup(first_name = "Nathalia", last_name = "Owner", email = "nathalia@gmail.com", password = "123456")
+        self.testowner2 = Dog_Owner.signup(first_name = "Amanda", last_name = "Owner", email = "amanda@gmail.com", password = "123456")
+        self.testwalker = Dog_Walker.signup(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com",  password = "123456")
+
+        db.session.commit()
+
+        for i in range(5):
+            db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, text = f"Message, number {i}"))
+        db.session.add(Message(dog_owner_id = self.testowner2.id, dog_walker_id = self.testwalker.id, text = "Not yours"))
+
+        appointment = Appointment(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, date = "2021-05-02", time_start = "03:00", day_period = "PM", duration = "15")
+        db.session.add(appointment)
+        db.session.commit()
+
+        db.session.add(Review(appointment_id = appointment.id, rate = 5, comment = "Great"))
+        db.session.commit()
+
+        # a batch smaller than the rows, so they are fetched in several round trips
+        app.config['EXPORT_BATCH_SIZE'] = 2
+
+    def tearDown(self):
+
+        app.config['EXPORT_BATCH_SIZE'] = 1000
+        db.session.rollback()
+
+    def login(self, c, user):
+
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = user.id
+            sess["is_worker"] = is_worker(user)
+
+    def test_export_messages_csv(self):
+        """Will the CSV export have a header and only the user's messages?"""
+
+        with self.client as c:
+
+            self.login(c, self.testowner)
+            res = c.get("/export/messages")
+
+        rows = list(csv.DictReader(io.StringIO(res.get_data(as_text = True))))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, "text/csv")
+        self.assertIn("attachment; filename=messages.csv", res.headers["Content-Disposition"])
+        self.assertEqual([row["text"] for row in rows], [f"Message, number {i}" for i in range(5)])
+        self.assertEqual([row["thread_seq"] for row in rows], ["1", "2", "3", "4", "5"])
+
+    def test_export_ndjson_gzip(self):
+        """Will the gzipped NDJSON export have one JSON object per line?"""
+
+        with self.client as c:
+
+            self.login(c, self.testwalker)
+            res = c.get("/export/messages?format=ndjson&gzip=1")
+
+        lines = gzip.decompress(res.get_data()).decode("UTF-8").splitlines()
+        messages = [json.loads(line) for line in lines]
+
+        self.assertEqual(res.mimetype, "application/gzip")
+        self.assertEqual(len(messages), 6)
+        self.assertEqual(messages[-1]["text"], "Not yours")
+        self.assertEqual(messages[0]["sender"], "dog_owner")
+
+    def test_export_appointments_and_reviews(self):
+        """Will the appointments and reviews carry both participants?"""
+
+        with self.client as c:
+
+            self.login(c, self.testwalker)
+            appointments = [json.loads(line) for line in c.get("/export/appointments?format=ndjson").get_data(as_text = True).splitlines()]
+            reviews = list(csv.DictReader(io.StringIO(c.get("/export/reviews").get_data(as_text = True))))
+
+        self.assertEqual(appointments[0]["dog_owner"], "Nathalia Owner")
+        self.assertEqual(appointments[0]["dog_walker"], "Jordana Walker")
+        self.assertEqual(reviews[0]["rate"], "5")
+        self.assertEqual(reviews[0]["comment"], "Great")
+
+    def test_export_unknown_dataset(self):
+        """Will an unknown dataset or format be a 404?"""
+
+        with self.client as c:
+
+            self.login(c, self.testowner)
+
+            self.assertEqual(c.get("/export/dogs").status_code, 404)
+            self.assertEqual(c.get("/export/messages?format=xml").status_code, 404)
+
+    def test_export_user_command(self):
+        """Can support export a user's messages from the command line?"""
+
+        result = app.test_cli_runner().invoke(args = ["export-user", str(self.testowner.id), "messages", "--format", "ndjson"])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(result.output.splitlines()), 5)
@@ -0,0 +1,211 @@
+import os
+import fnmatch
+from unittest import TestCase
+
+import redis
+
+from models import db, User, Dog_Owner, Dog_Walker
+from functions import QueryCounter, add_review_to_dog_walker_rate, is_worker
+from fragments import LRUCache, RedisCache, cached_fragment, get_fragment_cache
+from metrics import REGISTRY
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app, CURR_USER_KEY
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+def lookups(result):
+    """ Fragment cache lookups of this process with that result """
+
+    return REGISTRY.get_sample_value("doggy_walkie_fragment_cache_requests_total", {"fragment": "profile", "result": result}) or 0
+
+
+class LRUCacheTestCase(TestCase):
+    """Test the in-process backend"""
+
+    def test_evicts_least_recently_used(self):
+        """Will the oldest unused entry go first?"""
+
+        cache = LRUCache(size = 2)
+
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "3")
+
+
+class FakeRedis:
+    """Stand-in for a Redis server: a dict of bytes"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex = None):
+        self.data[key] = value.encode("UTF-8")
+
+    def scan_iter(self, match):
+        return [key for key in self.data if fnmatch.fnmatch(key, match)]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class DownRedis:
+    """A Redis server that can't be reached"""
+
+    def get(self, key):
+        raise redis.ConnectionError("unreachable")
+
+    def set(self, key, value, ex = None):
+        raise redis.ConnectionError("unreachable")
+
+
+class RedisCacheTestCase(TestCase):
+    """Test the shared backend with a stand-in server"""
+
+    def setUp(self):
+
+        User.query.delete()
+
+        self.testwalker = Dog_Walker.signup(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com",  password = "123456")
+        self.testwalker.description = "Loves big dogs"
+
+        db.session.commit()
+
+        self.backend = get_fragment_cache(app)
+
+    def tearDown(self):
+
+        db.session.rollback()
+
+        app.extensions["fragment_cache"] = self.backend
+
+    def render_twice(self, client):
+        """ Render the profile fragment twice with the client as the server; (html, misses, hits) added """
+
+        app.extensions["fragment_cache"] = RedisCache(client = client)
+
+        misses = lookups("miss")
+        hits = lookups("hit")
+
+        with app.test_request_context():
+            html = cached_fragment("profile", self.testwalker, "dog_walker/dog_walker_profile.html")
+            cached_fragment("profile", self.testwalker, "dog_walker/dog_walker_profile.html")
+
+        return html, lookups("miss") - misses, lookups("hit") - hits
+
+    def test_miss_then_hit(self):
+        """Will the first render be stored in the server and the second read from it?"""
+
+        server = FakeRedis()
+        server.set("other:key", "not a fragment")
+
+        html, misses, hits = self.render_twice(server)
+
+        self.assertIn("Loves big dogs", html)
+        self.assertEqual((misses, hits), (1, 1))
+
+        RedisCache(client = server).clear()
+
+        self.assertEqual(list(server.data), ["other:key"])
+
+    def test_server_unreachable(self):
+        """Will an unreachable server count as a miss and still render the fragment?"""
+
+        html, misses, hits = self.render_twice(DownRedis())
+
+        self.assertIn("Loves big dogs", html)
+        self.assertEqual((misses, hits), (2, 0))
+
+
+class FragmentCacheTestCase(TestCase):
+    """Test the cached dog_walker fragments"""
+
+    def setUp(self):
+
+        User.query.delete()
+
+        self.client = app.test_client()
+
+        self.testowner = Dog_Owner.signup(first_name = "Nathalia", last_name = "Owner", email = "nathalia@gmail.com", password = "123456")
+        self.testwalker = Dog_Walker.signup(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com",  password = "123456")
+        self.testwalker.description = "Loves big dogs"
+
+        db.session.commit()
+
+        get_fragment_cache(app).clear()
+
+    def tearDown(self):
+
+        db.session.rollback()
+
+    def login(self, c, user):
+
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = user.id
+            sess["is_worker"] = is_worker(user)
+
+    def test_profile_served_from_cache(self):
+        """Will the second view of a profile skip the render and the address query?"""
+
+        with self.client as c:
+
+            self.login(c, self.testowner)
+
+            misses = lookups("miss")
+            hits = lookups("hit")
+
+            c.get(f"/dog_walkers/{self.testwalker.id}")
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get(f"/dog_walkers/{self.testwalker.id}")
+
+            html = res.get_data(as_text = True)
+
+            self.assertIn("Loves big dogs", html)
+            self.assertEqual(lookups("miss"), misses + 1)
+            self.assertEqual(lookups("hit"), hits + 1)
+            self.assertFalse([statement for statement in counter.statements if "FROM address" in statement])
+
+    def test_profile_edit_invalidates(self):
+        """Will the profile show the new description after an edit?"""
+
+        with self.client as c:
+
+            self.login(c, self.testwalker)
+
+            c.get(f"/dog_walkers/{self.testwalker.id}")
+            c.post("/dog_walkers/profile", data = {"first_name": "Jordana", "last_name": "Walker", "email": "jordana@gmail.com", "description": "Walks small dogs", "password": "123456"})
+
+            res = c.get(f"/dog_walkers/{self.testwalker.id}")
+            html = res.get_data(as_text = True)
+
+            self.assertIn("Walks small dogs", html)
+            self.assertNotIn("Loves big dogs", html)
+
+    def test_rating_update_bumps_version(self):
+        """Will a new review change the walker version, so the cached fragments are replaced?"""
+
+        version = self.testwalker.version
+
+        add_review_to_dog_walker_rate(db, self.testwalker.id, 5)
+        db.session.commit()
+
+        walker = Dog_Walker.query.get(self.testwalker.id)
+        db.session.refresh(walker)
+
+        self.assertEqual(walker.version, version + 1)
+        self.assertEqual(walker.rate, 5)
@@ -0,0 +1,137 @@
+import os
+from unittest import TestCase
+
+from models import db, User, Dog_Owner, Dog_Walker, Address
+from functions import is_worker, QueryCounter
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app, CURR_USER_KEY
+from identity import PRINCIPAL_KEY
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+class IdentityTestCase(TestCase):
+    """Test the logged in user identity cache"""
+
+    def setUp(self):
+        """Create test client and sample data"""
+
+        User.query.delete()
+        Address.query.delete()
+
+        self.client = app.test_client()
+
+        self.testwalker = Dog_Walker.signup(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com",  password = "123456")
+
+        db.session.commit()
+
+        self.walker_id = self.testwalker.id
+
+    def tearDown(self):
+
+        db.session.rollback()
+
+    def login(self, c):
+        """Log in the walker and let the first request build the principal"""
+
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.walker_id
+            sess["is_worker"] = True
+
+        c.get(f"/dog_walkers/{self.walker_id}")
+
+    def test_principal_in_session(self):
+        """Will the session keep a compact principal for the logged in user?"""
+
+        with self.client as c:
+
+            self.login(c)
+
+            with c.session_transaction() as sess:
+                principal = sess[PRINCIPAL_KEY]
+
+        self.assertEqual(principal["id"], self.walker_id)
+        self.assertEqual(principal["kind"], "dog_walker")
+        self.assertEqual(principal["name"], "Jordana Walker")
+        self.assertIsNone(principal["address"])
+
+    def test_redirect_without_queries(self):
+        """Can the home page redirect the logged in user without querying the database?"""
+
+        with self.client as c:
+
+            self.login(c)
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get("/")
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(counter.count, 0)
+
+    def test_not_found_without_queries(self):
+        """Will the 404 page render for a logged in user without querying the database?"""
+
+        with self.client as c:
+
+            self.login(c)
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get("/this-page-does-not-exist")
+
+        self.assertEqual(res.status_code, 404)
+        self.assertIn("Log out", res.get_data(as_text = True))
+        self.assertEqual(counter.count, 0)
+
+    def test_own_page_reuses_user(self):
+        """Will the address page use g.user instead of loading the walker twice?"""
+
+        with self.client as c:
+
+            self.login(c)
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get(f"/dog_walkers/{self.walker_id}/address")
+
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(counter.count, 1)
+
+    def test_profile_edit_refreshes_principal(self):
+        """Will editing the profile bump the version and refresh the principal?"""
+
+        with self.client as c:
+
+            self.login(c)
+
+            c.post("/dog_walkers/profile", data = {"first_name": "Jordy", "last_name": "Walker", "email": "jordana@gmail.com", "password": "123456"})
+
+            with c.session_transaction() as sess:
+                principal = sess[PRINCIPAL_KEY]
+
+        dog_walker = Dog_Walker.query.get(self.walker_id)
+
+        self.assertEqual(dog_walker.version, 2)
+        self.assertEqual(principal["version"], 2)
+        self.assertEqual(principal["name"], "Jordy Walker")
+
+    def test_deleted_user_is_logged_out(self):
+        """Will a session of a deleted account be logged out instead of redirected forever?"""
+
+        with self.client as c:
+
+            self.login(c)
+
+            User.query.filter_by(id = self.walker_id).delete()
+            db.session.commit()
+
+            res = c.get("/", follow_redirects = True)
+
+            with c.session_transaction() as sess:
+                self.assertNotIn(CURR_USER_KEY, sess)
+                self.assertNotIn(PRINCIPAL_KEY, sess)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("Log in", res.get_data(as_text = True))
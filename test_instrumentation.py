@@ -0,0 +1,88 @@
+import os
+from unittest import TestCase
+
+from models import db, User, Dog_Walker
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app
+from instrumentation import normalize_sql, query_stats
+
+db.create_all()
+
+
+@app.route("/test/one_query_per_walker")
+def one_query_per_walker():
+    """N+1 on purpose: one query per walker"""
+
+    names = [Dog_Walker.query.filter_by(id = walker_id).first().name for (walker_id,) in db.session.query(Dog_Walker.id)]
+    return ", ".join(names)
+
+
+class InstrumentationTestCase(TestCase):
+    """Test the per-request query instrumentation"""
+
+    def setUp(self):
+
+        User.query.filter_by(role = "dog_walker").delete()
+
+        for i in range(12):
+            db.session.add(Dog_Walker(first_name = f"Walker{i}", last_name = "Test", email = f"walker{i}@gmail.com", password = "HASHED_PASSWORD"))
+        db.session.commit()
+
+        self.client = app.test_client()
+        app.config["QUERY_STATS_HEADERS"] = True
+        query_stats.reset()
+
+    def tearDown(self):
+
+        db.session.rollback()
+        app.config["QUERY_STATS_HEADERS"] = False
+
+    def test_normalize_sql(self):
+        """Will the same statement with other values have the same shape?"""
+
+        first = normalize_sql("SELECT * FROM dog_walker WHERE id = %(id_1)s AND rate > 4.5 LIMIT 10")
+        second = normalize_sql("SELECT *   FROM dog_walker\n WHERE id = %(id_1)s AND rate > 3 LIMIT 20")
+
+        self.assertEqual(first, second)
+        self.assertEqual(normalize_sql("SELECT * FROM breed WHERE name IN ('Akita', 'Pug', 'Boxer')"), "SELECT * FROM breed WHERE name IN (?)")
+
+    def test_query_headers(self):
+        """Will the response tell how many queries the request ran?"""
+
+        res = self.client.get("/dog_walkers")
+
+        self.assertEqual(res.headers["X-Query-Count"], "1")
+        self.assertIn("X-Query-Time-Ms", res.headers)
+        self.assertEqual(res.headers["X-Query-N-Plus-One"], "0")
+
+    def test_n_plus_one_flagged(self):
+        """Will the same statement run once per row be flagged?"""
+
+        with self.assertLogs("doggy_walkie.sql", level = "WARNING") as logs:
+            res = self.client.get("/test/one_query_per_walker")
+
+        self.assertEqual(res.headers["X-Query-Count"], "13")
+        self.assertEqual(res.headers["X-Query-N-Plus-One"], "1")
+        self.assertIn("Possible N+1 in one_query_per_walker, ran 12 times", logs.output[0])
+
+        stats = query_stats.snapshot()["one_query_per_walker"]
+
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["n_plus_one"], 1)
+        self.assertEqual(stats["queries"]["sum"], 13)
+
+    def test_slow_query_logged(self):
+        """Will a statement over the threshold be logged with its shape?"""
+
+        app.config["SLOW_QUERY_MS"] = 0
+
+        try:
+            with self.assertLogs("doggy_walkie.sql", level = "WARNING") as logs:
+                self.client.get("/dog_walkers")
+        finally:
+            app.config["SLOW_QUERY_MS"] = 200
+
+        self.assertIn("Slow query", logs.output[0])
+        self.assertIn("in search", logs.output[0])
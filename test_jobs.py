@@ -0,0 +1,170 @@
+import os
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from models import db, Job
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app
+from jobs import job, enqueue, claim_job, work_one, work, requeue_stale_jobs, touch_job
+
+db.create_all()
+
+calls = []
+
+@job("test_record")
+def record(value):
+    calls.append(value)
+
+@job("test_broken", max_attempts = 2)
+def broken():
+    raise ValueError("broken job")
+
+@job("test_long")
+def long_running():
+    """ A long job: its lock is already old when it reports progress """
+
+    Job.query.update({Job.locked_at: datetime.utcnow() - timedelta(hours = 1)})
+    touch_job()
+    db.session.commit()
+
+    requeue_stale_jobs()
+    calls.append(Job.query.one().status)
+
+
+class JobQueueTestCase(TestCase):
+    """Test the background job queue"""
+
+    def setUp(self):
+        """Start every test with an empty queue"""
+
+        Job.query.delete()
+        db.session.commit()
+
+        calls.clear()
+        self.jobs_eager = app.config.get("JOBS_EAGER")
+        app.config["JOBS_EAGER"] = False
+
+        self.ctx = app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+
+        db.session.rollback()
+        self.ctx.pop()
+
+        app.config["JOBS_EAGER"] = self.jobs_eager
+
+    def test_enqueue_and_work(self):
+        """Will a queued job run once, by the worker, and be marked as done?"""
+
+        enqueue("test_record", {"value": 1})
+        db.session.commit()
+
+        self.assertEqual(calls, [])
+        self.assertEqual(work(burst = True), 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.query.one().status, "done")
+
+    def test_idempotency_key(self):
+        """Will a job enqueued twice with the same key run only once?"""
+
+        enqueue("test_record", {"value": 1}, idempotency_key = "record:1")
+        enqueue("test_record", {"value": 1}, idempotency_key = "record:1")
+        db.session.commit()
+
+        work(burst = True)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.query.count(), 1)
+
+    def test_job_rolled_back_with_the_request(self):
+        """Will a job enqueued in a transaction that rolls back be dropped?"""
+
+        enqueue("test_record", {"value": 1})
+        db.session.rollback()
+
+        self.assertEqual(Job.query.count(), 0)
+
+    def test_retry_with_backoff(self):
+        """Will a failing job be tried again later, then marked as failed?"""
+
+        enqueue("test_broken")
+        db.session.commit()
+
+        work_one()
+        queued = Job.query.one()
+
+        self.assertEqual(queued.status, "queued")
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_at, datetime.utcnow())
+        self.assertIn("broken job", queued.last_error)
+
+        # not ready yet
+        self.assertFalse(work_one())
+
+        Job.query.update({Job.run_at: datetime.utcnow() - timedelta(seconds = 1)})
+        db.session.commit()
+        work_one()
+
+        failed = Job.query.one()
+        db.session.refresh(failed)
+
+        self.assertEqual(failed.status, "failed")
+        self.assertEqual(failed.attempts, 2)
+
+    def test_skip_locked(self):
+        """Will a worker skip the job another worker has locked?"""
+
+        enqueue("test_record", {"value": 1})
+        enqueue("test_record", {"value": 2})
+        db.session.commit()
+
+        first_id = Job.query.order_by(Job.id).first().id
+
+        with db.engine.connect() as other_worker:
+            transaction = other_worker.begin()
+            other_worker.execute(f"SELECT id FROM job WHERE id = {first_id} FOR UPDATE")
+
+            claimed = claim_job()
+
+            transaction.rollback()
+
+        self.assertNotEqual(claimed.id, first_id)
+        self.assertEqual(claimed.payload, {"value": 2})
+
+    def test_stale_jobs_requeued(self):
+        """Will a job left running by a dead worker be queued again?"""
+
+        enqueue("test_record", {"value": 1})
+        db.session.commit()
+
+        claim_job()
+        Job.query.update({Job.locked_at: datetime.utcnow() - timedelta(hours = 1)})
+        db.session.commit()
+
+        requeue_stale_jobs()
+
+        self.assertEqual(Job.query.one().status, "queued")
+
+    def test_touch_keeps_job_locked(self):
+        """Will a job that reports progress stay with its worker past the lock timeout?"""
+
+        enqueue("test_long")
+        db.session.commit()
+
+        work_one()
+
+        self.assertEqual(calls, ["running"])
+        self.assertEqual(Job.query.one().status, "done")
+
+    def test_eager_mode(self):
+        """Will the jobs run right away, without a worker, in eager mode?"""
+
+        app.config["JOBS_EAGER"] = True
+
+        enqueue("test_record", {"value": 1})
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.query.count(), 0)
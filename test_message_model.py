@@ -1,7 +1,7 @@
 import os
 from unittest import TestCase
 
-from models import db, Dog_Owner, Dog_Walker, Dog, Message, Appointment, Review
+from models import db, Dog_Owner, Dog_Walker, Dog, Message, Conversation, Appointment, Review
 
 from sqlalchemy.exc import IntegrityError
 
@@ -64,4 +64,58 @@ class MessageModelTestCase(TestCase):
         self.assertFalse(msg.is_sender_worker)
         self.assertIsNotNone(msg.date)
 
+    def test_conversation_summary(self):
+        """Will each new message update the conversation of the pair?"""
 
+        db.session.add(Message(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, text = "Hi, how are you?"))
+        db.session.add(Message(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, text = "Are you free on Monday?"))
+        db.session.commit()
+
+        db.session.add(Message(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, is_sender_worker = True, text = "Yes, I am!"))
+        db.session.commit()
+
+        conversations = Conversation.query.all()
+
+        self.assertEqual(len(conversations), 1)
+        self.assertEqual(conversations[0].last_message, "Yes, I am!")
+        self.assertTrue(conversations[0].is_last_sender_worker)
+        self.assertEqual(conversations[0].dog_walker_unread, 2)
+        self.assertEqual(conversations[0].dog_owner_unread, 1)
+
+    def test_thread_seq_and_date(self):
+        """Will each thread number its messages on its own, and every message get the time it was sent?"""
+
+        walker2 = Dog_Walker.signup(first_name = "Joane", last_name = "Walker", email = "joane@test.com", password = "HASHED_PASSWORD")
+        db.session.commit()
+
+        first = Message(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, text = "Hi, how are you?")
+        second = Message(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, text = "Are you free on Monday?")
+        db.session.add_all([first, second])
+        db.session.commit()
+
+        other = Message(dog_owner_id = self.owner1_id, dog_walker_id = walker2.id, text = "Hello")
+        third = Message(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, is_sender_worker = True, text = "Yes, I am!")
+        db.session.add_all([other, third])
+        db.session.commit()
+
+        self.assertEqual([first.thread_seq, second.thread_seq, third.thread_seq], [1, 2, 3])
+        self.assertEqual(other.thread_seq, 1)
+        self.assertEqual(first.date, second.date)
+        self.assertGreater(third.date, first.date)
+        self.assertEqual(Conversation.query.filter_by(dog_walker_id = self.walker1_id).one().last_seq, 3)
+
+    def test_inbox(self):
+        """Will the inbox list one row per conversation partner?"""
+
+        walker2 = Dog_Walker.signup(first_name = "Joane", last_name = "Walker", email = "joane@test.com", password = "HASHED_PASSWORD")
+        db.session.commit()
+
+        for i in range(5):
+            db.session.add(Message(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, text = f"Message {i}"))
+        db.session.add(Message(dog_owner_id = self.owner1_id, dog_walker_id = walker2.id, text = "Hello"))
+        db.session.commit()
+
+        inbox = Conversation.inbox_for(self.owner1_id, is_worker = False)
+
+        self.assertEqual(len(inbox), 2)
+        self.assertEqual({conversation.dog_walker.name for conversation in inbox}, {"Jordana Walker", "Joane Walker"})
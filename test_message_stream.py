@@ -0,0 +1,131 @@
+import os
+import threading
+from unittest import TestCase
+
+from models import db, User, Dog_Owner, Dog_Walker, Message
+from functions import is_worker
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app, CURR_USER_KEY
+from broker import InProcessBroker, thread_channel
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+# in-process stand-in for the Postgres broker, and short lived streams.
+app.config['MESSAGE_BROKER'] = 'memory'
+app.config['MESSAGE_STREAM_KEEPALIVE'] = 1
+app.config['MESSAGE_STREAM_TIMEOUT'] = 1
+app.extensions.pop('message_broker', None)
+
+
+class BrokerTestCase(TestCase):
+    """Test the in-process message broker"""
+
+    def test_fan_out(self):
+        """Will one event reach every subscriber of the channel, and only them?"""
+
+        broker = InProcessBroker()
+        subscriptions = [broker.subscribe(thread_channel(1, 1)) for i in range(20)]
+        other = broker.subscribe(thread_channel(1, 2))
+
+        broker.publish(thread_channel(1, 1), 42)
+
+        self.assertEqual([subscription.get(timeout = 1) for subscription in subscriptions], [42] * 20)
+        self.assertIsNone(other.get(timeout = 0.01))
+
+    def test_waiting_subscriber_wakes_up(self):
+        """Will a blocked subscriber wake up as soon as an event is published?"""
+
+        broker = InProcessBroker()
+        received = []
+
+        with broker.subscribe(thread_channel(1, 1)) as subscription:
+            waiter = threading.Thread(target = lambda: received.append(subscription.get(timeout = 5)))
+            waiter.start()
+
+            broker.publish(thread_channel(1, 1), 7)
+            waiter.join(timeout = 5)
+
+        self.assertEqual(received, [7])
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_publish_on_commit(self):
+        """Will an event published with a session wait for the commit, and be dropped on rollback?"""
+
+        broker = InProcessBroker()
+
+        with broker.subscribe(thread_channel(1, 1)) as subscription:
+
+            broker.publish(thread_channel(1, 1), 1, db.session)
+            db.session.rollback()
+
+            broker.publish(thread_channel(1, 1), 2, db.session)
+            self.assertIsNone(subscription.get(timeout = 0.01))
+
+            db.session.commit()
+
+            self.assertEqual(subscription.get(timeout = 1), 2)
+            self.assertIsNone(subscription.get(timeout = 0.01))
+
+
+class MessageStreamTestCase(TestCase):
+    """Test the server-sent events stream of a thread"""
+
+    def setUp(self):
+        """Create test client and sample data"""
+
+        User.query.delete()
+        Message.query.delete()
+
+        self.client = app.test_client()
+
+        self.testowner = Dog_Owner.signup(first_name = "Nathalia", last_name = "Owner", email = "nathalia@gmail.com", password = "123456")
+        self.testwalker = Dog_Walker.signup(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com",  password = "123456")
+
+        db.session.commit()
+
+    def tearDown(self):
+
+        db.session.rollback()
+
+    def test_stream_new_messages(self):
+        """Will the stream send only the messages after the cursor?"""
+
+        old = Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, text = "Old message")
+        db.session.add(old)
+        db.session.commit()
+
+        new = Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, text = "New message")
+        db.session.add(new)
+        db.session.commit()
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testowner.id
+                sess["is_worker"] = is_worker(self.testowner)
+
+            res = c.get(f"/messages/{self.testowner.id}/{self.testwalker.id}/stream?after={old.thread_seq}")
+            body = res.get_data(as_text = True)
+
+        self.assertEqual(res.mimetype, "text/event-stream")
+        self.assertIn(f"id: {new.thread_seq}", body)
+        self.assertIn("New message", body)
+        self.assertNotIn("Old message", body)
+
+    def test_stream_for_dog_walker_with_no_message(self):
+        """Can a dog_walker open the stream of a thread that does not exist?"""
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testwalker.id
+                sess["is_worker"] = is_worker(self.testwalker)
+
+            res = c.get(f"/messages/{self.testowner.id}/{self.testwalker.id}/stream")
+
+        self.assertEqual(res.status_code, 403)
@@ -1,8 +1,11 @@
 import os
+from datetime import datetime, timedelta
 from unittest import TestCase
 
-from models import db, connect_db, Dog_Owner, Dog_Walker, Message
-from functions import is_worker
+from flask import template_rendered
+
+from models import db, User, connect_db, Dog_Owner, Dog_Walker, Message, Conversation
+from functions import is_worker, QueryCounter
 
 os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
 
@@ -19,8 +22,7 @@ class MessageTestCase(TestCase):
     def setUp(self):
         """Create test client and sample data"""
 
-        Dog_Owner.query.delete()
-        Dog_Walker.query.delete()
+        User.query.delete()
         Message.query.delete()
 
 
@@ -143,4 +145,108 @@ class MessageTestCase(TestCase):
 
                
 
+    def test_messages_pagination(self):
+        """Will the thread show the latest page first and link to the older messages?"""
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testowner.id
+                sess["is_worker"] = is_worker(self.testowner)
+
+            dog_walker = Dog_Walker.query.filter_by(first_name = "Jordana").first()
+            start = datetime(2021, 5, 1)
+
+            for i in range(60):
+                db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = dog_walker.id, text = f"Message number {i:02d}", date = start + timedelta(minutes = i)))
+            db.session.commit()
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get(f"/messages/{self.testowner.id}/{dog_walker.id}")
+            html = res.get_data(as_text = True)
+
+            self.assertIn("Message number 59", html)
+            self.assertIn("Message number 10", html)
+            self.assertNotIn("Message number 09", html)
+            self.assertIn("Older messages", html)
+            # the logged in user, the dog_walker, the thread version (ETag) and the page
+            self.assertLessEqual(counter.count, 4)
+
+            res = c.get(f"/messages/{self.testowner.id}/{dog_walker.id}?before=2021-05-01T00:10:00_{Message.query.filter_by(text = 'Message number 10').first().id}")
+            html = res.get_data(as_text = True)
+
+            self.assertIn("Message number 00", html)
+            self.assertIn("Message number 09", html)
+            self.assertNotIn("Message number 10", html)
+            self.assertNotIn("Older messages", html)
+
+    def test_messages_not_modified(self):
+        """Will an unchanged thread answer 304 without rendering the template?"""
+
+        rendered = []
+
+        def record(sender, template, context, **extra):
+            rendered.append(template.name)
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testowner.id
+                sess["is_worker"] = is_worker(self.testowner)
+
+            db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, text = "Hi, good morning!"))
+            db.session.commit()
+
+            res = c.get(f"/messages/{self.testowner.id}/{self.testwalker.id}")
+            etag = res.headers["ETag"]
+
+            template_rendered.connect(record, app)
+
+            try:
+                res = c.get(f"/messages/{self.testowner.id}/{self.testwalker.id}", headers = {"If-None-Match": etag})
+
+            finally:
+                template_rendered.disconnect(record, app)
+
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(rendered, [])
+
+            c.post(f"/messages/{self.testowner.id}/{self.testwalker.id}", data = {"text": "Are you free tomorrow?"})
+
+            res = c.get(f"/messages/{self.testowner.id}/{self.testwalker.id}", headers = {"If-None-Match": etag})
+
+            self.assertEqual(res.status_code, 200)
+            self.assertIn("Are you free tomorrow?", res.get_data(as_text = True))
+            self.assertNotEqual(res.headers["ETag"], etag)
+
+    def test_open_thread_marks_read(self):
+        """Will opening a thread mark the received messages read in one UPDATE and clear the counters?"""
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testowner.id
+                sess["is_worker"] = is_worker(self.testowner)
+
+            for text in ("Hi!", "Are you there?", "I can walk Bob today"):
+                db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, is_sender_worker = True, text = text))
+            db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker2.id, is_sender_worker = True, text = "Hello from Joane"))
+            db.session.commit()
+
+            res = c.get(f"/dog_owners/{self.testowner.id}")
+            self.assertIn('<span class="badge badge-primary">4</span>', res.get_data(as_text = True))
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get(f"/messages/{self.testowner.id}/{self.testwalker.id}")
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(len([statement for statement in counter.statements if statement.startswith("UPDATE message")]), 1)
+            self.assertIn('<span class="badge badge-primary">1</span>', res.get_data(as_text = True))
+
+            db.session.expire_all()
+
+            self.assertEqual(Message.query.filter_by(dog_walker_id = self.testwalker.id, read = True).count(), 3)
+            self.assertEqual(Conversation.query.filter_by(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id).one().dog_owner_unread, 0)
+            self.assertEqual(User.query.get(self.testowner.id).unread_messages, 1)
 
+            self.assertEqual(Message.query.filter_by(dog_walker_id = self.testwalker2.id, read = True).count(), 0)
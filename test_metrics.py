@@ -0,0 +1,78 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from models import db
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app
+from breeds import fetch_upstream_breeds
+from metrics import REGISTRY
+
+import requests
+
+db.create_all()
+
+
+def sample(name, **labels):
+    """ Current value of a metric sample of this process """
+
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTestCase(TestCase):
+    """Test the Prometheus metrics"""
+
+    def setUp(self):
+
+        self.client = app.test_client()
+        app.config["METRICS_TOKEN"] = None
+
+    def tearDown(self):
+
+        db.session.rollback()
+
+    def test_request_duration(self):
+        """Will every request be counted by endpoint and status?"""
+
+        before = sample("doggy_walkie_request_duration_seconds_count", endpoint = "search", method = "GET", status = "200")
+        missing = sample("doggy_walkie_request_duration_seconds_count", endpoint = "unmatched", method = "GET", status = "404")
+
+        self.client.get("/dog_walkers")
+        self.client.get("/this-page-does-not-exist")
+
+        self.assertEqual(sample("doggy_walkie_request_duration_seconds_count", endpoint = "search", method = "GET", status = "200"), before + 1)
+        self.assertEqual(sample("doggy_walkie_request_duration_seconds_count", endpoint = "unmatched", method = "GET", status = "404"), missing + 1)
+
+    def test_template_render(self):
+        """Will the template render time be recorded?"""
+
+        before = sample("doggy_walkie_template_render_seconds_count", template = "search.html")
+
+        self.client.get("/dog_walkers")
+
+        self.assertEqual(sample("doggy_walkie_template_render_seconds_count", template = "search.html"), before + 1)
+
+    def test_external_call(self):
+        """Will a failed call to TheDogApi be recorded as an error?"""
+
+        before = sample("doggy_walkie_external_call_seconds_count", service = "thedogapi", outcome = "error")
+
+        with app.app_context():
+            with patch("breeds.requests.get", side_effect = requests.ConnectionError):
+                with self.assertRaises(requests.ConnectionError):
+                    fetch_upstream_breeds()
+
+        self.assertEqual(sample("doggy_walkie_external_call_seconds_count", service = "thedogapi", outcome = "error"), before + 1)
+
+    def test_metrics_endpoint(self):
+        """Will /metrics serve the text exposition format?"""
+
+        self.client.get("/dog_walkers")
+        res = self.client.get("/metrics")
+        text = res.get_data(as_text = True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("text/plain", res.headers["Content-Type"])
+        self.assertIn('doggy_walkie_request_duration_seconds_bucket{endpoint="search",method="GET",status="200",le="0.005"}', text)
@@ -0,0 +1,91 @@
+import os
+from unittest import TestCase
+
+from models import db, User, Dog_Owner, Dog_Walker
+from functions import QueryCounter
+from passwords import hash_password, check_password, hash_rounds
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app, CURR_USER_KEY
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class PasswordsTestCase(TestCase):
+    """Test the password hashing settings"""
+
+    def setUp(self):
+
+        User.query.delete()
+
+        app.config["BCRYPT_LOG_ROUNDS"] = 4
+        app.config["PASSWORD_HASHING_POOL"] = None
+
+        self.client = app.test_client()
+
+        with app.app_context():
+            Dog_Walker.signup(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com", password = "123456")
+            db.session.commit()
+
+    def tearDown(self):
+
+        db.session.rollback()
+        app.config["BCRYPT_LOG_ROUNDS"] = 12
+        app.config["PASSWORD_HASHING_POOL"] = None
+
+    def test_configured_cost(self):
+        """Will new hashes use the configured cost?"""
+
+        walker = Dog_Walker.query.filter_by(email = "jordana@gmail.com").one()
+
+        self.assertEqual(hash_rounds(walker.password), 4)
+
+    def test_rehash_on_login(self):
+        """Will the hash be replaced with the new cost on the next login?"""
+
+        app.config["BCRYPT_LOG_ROUNDS"] = 5
+
+        res = self.client.post("/login", data = {"email": "jordana@gmail.com", "password": "123456"})
+
+        walker = Dog_Walker.query.filter_by(email = "jordana@gmail.com").one()
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(hash_rounds(walker.password), 5)
+
+        with app.app_context():
+            self.assertTrue(check_password(walker.password, "123456"))
+
+    def test_thread_pool(self):
+        """Will hashing through the thread pool give the same results?"""
+
+        app.config["PASSWORD_HASHING_POOL"] = "thread"
+        app.config["PASSWORD_HASHING_WORKERS"] = 2
+
+        with app.app_context():
+            hashed = hash_password("secret")
+
+            self.assertTrue(check_password(hashed, "secret"))
+            self.assertFalse(check_password(hashed, "wrong"))
+
+    def test_profile_save_without_lookup(self):
+        """Will saving the profile check the password without looking the walker up again?"""
+
+        walker = Dog_Walker.query.filter_by(email = "jordana@gmail.com").one()
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = walker.id
+                sess["is_worker"] = True
+
+            with QueryCounter(db.engine) as counter:
+                c.post("/dog_walkers/profile", data = {"first_name": "Jordy", "last_name": "Walker", "email": "jordana@gmail.com", "password": "123456"})
+
+        lookups = [statement for statement in counter.statements if statement.lstrip().startswith("SELECT") and "dog_walker.email =" in statement]
+
+        self.assertEqual(lookups, [])
+        self.assertEqual(Dog_Walker.query.get(walker.id).first_name, "Jordy")
@@ -0,0 +1,80 @@
+import os
+from unittest import TestCase
+
+from sqlalchemy.pool import NullPool
+
+from models import db, Dog_Walker
+from pool import MeasuredQueuePool, apply_pool_options, pool_metrics
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app
+
+db.create_all()
+
+
+class PoolTestCase(TestCase):
+    """Test the connection pool settings and metrics"""
+
+    def setUp(self):
+
+        self.client = app.test_client()
+        app.config["METRICS_TOKEN"] = None
+
+    def tearDown(self):
+
+        db.session.rollback()
+        app.config["METRICS_TOKEN"] = None
+
+    def test_pool_options(self):
+        """Will the engine get the measured pool with pre_ping?"""
+
+        options = {"pool_size": 5, "max_overflow": 10}
+        apply_pool_options({"DB_POOL_PRE_PING": True}, options)
+
+        self.assertIs(options["poolclass"], MeasuredQueuePool)
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(options["pool_size"], 5)
+
+    def test_pgbouncer_options(self):
+        """Will PgBouncer mode leave the pooling to PgBouncer?"""
+
+        options = {"pool_size": 5, "max_overflow": 10, "pool_timeout": 10, "pool_recycle": 1800}
+        apply_pool_options({"DB_PGBOUNCER": True}, options)
+
+        self.assertIs(options["poolclass"], NullPool)
+        self.assertNotIn("pool_size", options)
+        self.assertNotIn("max_overflow", options)
+        self.assertEqual(options["pool_recycle"], 1800)
+
+    def test_app_engine_pool(self):
+        """Is the app engine using the configured pool?"""
+
+        pool = db.engine.pool
+
+        self.assertIsInstance(pool, MeasuredQueuePool)
+        self.assertEqual(pool.size(), app.config["SQLALCHEMY_POOL_SIZE"])
+
+    def test_pool_metrics_endpoint(self):
+        """Will the endpoint show the checkouts of this process?"""
+
+        pool_metrics.reset()
+        Dog_Walker.query.first()
+        db.session.rollback()
+
+        res = self.client.get("/metrics/pool")
+        metrics = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(metrics["pool"], "MeasuredQueuePool")
+        self.assertGreaterEqual(metrics["checkouts"], 1)
+        self.assertIn("in_use", metrics)
+        self.assertIn("overflow_checkouts", metrics)
+
+    def test_pool_metrics_token(self):
+        """Will the metrics need the token when one is set?"""
+
+        app.config["METRICS_TOKEN"] = "secret-token"
+
+        self.assertEqual(self.client.get("/metrics/pool").status_code, 403)
+        self.assertEqual(self.client.get("/metrics/pool", headers = {"Authorization": "Bearer secret-token"}).status_code, 200)
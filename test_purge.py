@@ -0,0 +1,124 @@
+import os
+from unittest import TestCase
+
+from models import db, Dog_Owner, Dog_Walker, Address, Dog, Message, Conversation, Appointment, Review, AccountPurge, Job
+from functions import add_review_to_dog_walker_rate, QueryCounter
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app
+from purge import delete_user, has_many_messages, run_purge, retry_purges
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+class PurgeTestCase(TestCase):
+    """Test the deletion of accounts"""
+
+    def setUp(self):
+        """Create test client and sample data"""
+
+        db.drop_all()
+        db.create_all()
+
+        self.client = app.test_client()
+
+        address = Address(address = "112 Poplar Street", zipcode = 28202, city = "Charlotte", state = "North Carolina", neighbor = "Dilworth")
+        owner = Dog_Owner(first_name = "Nathalia", last_name = "Owner", email = "nathalia@gmail.com", password = "HASHED_PASSWORD", address = address)
+        walker = Dog_Walker(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com", password = "HASHED_PASSWORD")
+        db.session.add_all([owner, walker])
+        db.session.commit()
+
+        self.owner_id = owner.id
+        self.walker_id = walker.id
+
+        for i in range(30):
+            db.session.add(Message(dog_owner_id = owner.id, dog_walker_id = walker.id, text = f"Message {i}"))
+
+        db.session.add(Dog(dog_owner_id = owner.id, first_name = "Tobby", breed = "Akita", weight = 30, age = 3))
+
+        appointment = Appointment(dog_owner_id = owner.id, dog_walker_id = walker.id, date = "2021-05-02", time_start = "03:00", day_period = "PM", duration = "15", status = True)
+        db.session.add(appointment)
+        db.session.commit()
+
+        db.session.add(Review(appointment_id = appointment.id, rate = 4))
+        add_review_to_dog_walker_rate(db, walker.id, 4)
+        db.session.commit()
+
+    def tearDown(self):
+
+        db.session.rollback()
+
+    def test_delete_dog_owner(self):
+        """Will deleting a dog_owner remove everything that belongs to it, with a few statements?"""
+
+        owner = Dog_Owner.query.get(self.owner_id)
+
+        with app.app_context(), QueryCounter(db.engine) as counter:
+            purge = delete_user(owner)
+
+        self.assertIsNone(purge)
+        self.assertLessEqual(counter.count, 5)
+
+        self.assertIsNone(Dog_Owner.query.get(self.owner_id))
+        self.assertEqual(Address.query.count(), 0)
+        self.assertEqual(Message.query.count(), 0)
+        self.assertEqual(Conversation.query.count(), 0)
+        self.assertEqual(Appointment.query.count(), 0)
+        self.assertEqual(Review.query.count(), 0)
+        self.assertEqual(Dog.query.count(), 0)
+
+        walker = Dog_Walker.query.get(self.walker_id)
+
+        self.assertEqual(walker.review_count, 0)
+        self.assertIsNone(walker.rate)
+
+    def test_purge_in_batches(self):
+        """Will a purge delete the messages batch by batch and keep the progress?"""
+
+        purge = AccountPurge(kind = "dog_walker", user_id = self.walker_id, total_messages = 30)
+        db.session.add(purge)
+        db.session.commit()
+
+        self.assertTrue(AccountPurge.in_progress("dog_walker", self.walker_id))
+
+        purge = run_purge(purge.id, batch_size = 7)
+
+        self.assertEqual(purge.status, "done")
+        self.assertEqual(purge.deleted_messages, 30)
+        self.assertEqual(purge.progress, 1.0)
+        self.assertIsNone(Dog_Walker.query.get(self.walker_id))
+        self.assertEqual(Appointment.query.count(), 0)
+        self.assertIsNotNone(Dog_Owner.query.get(self.owner_id))
+        self.assertFalse(AccountPurge.in_progress("dog_walker", self.walker_id))
+
+    def test_retry_failed_purge(self):
+        """Will only a purge with no job left be queued again, under a new key?"""
+
+        purge = AccountPurge(kind = "dog_owner", user_id = self.owner_id, total_messages = 30, status = "failed")
+        db.session.add(purge)
+        db.session.flush()
+        db.session.add(Job(name = "purge_account", payload = {"purge_id": purge.id}, idempotency_key = f"purge_account:{purge.id}", status = "failed", max_attempts = 5))
+        db.session.commit()
+
+        with app.test_request_context():
+            first = retry_purges()
+            second = retry_purges()
+
+        self.assertEqual([result for purge, result in first], ["queued again"])
+        self.assertEqual([result for purge, result in second], ["already queued"])
+        self.assertEqual(Job.query.filter_by(idempotency_key = f"purge_account:{purge.id}:1", status = "queued").count(), 1)
+
+    def test_large_account_threshold(self):
+        """Will only the accounts over the threshold be purged in the background?"""
+
+        with app.test_request_context():
+            app.config["ACCOUNT_PURGE_THRESHOLD"] = 10
+            self.assertTrue(has_many_messages("dog_owner", self.owner_id))
+
+            app.config["ACCOUNT_PURGE_THRESHOLD"] = 30
+            self.assertFalse(has_many_messages("dog_owner", self.owner_id))
+
+            del app.config["ACCOUNT_PURGE_THRESHOLD"]
@@ -1,7 +1,10 @@
 import os
 from unittest import TestCase
 
+from decimal import Decimal
+
 from models import db, Dog_Owner, Dog_Walker, Dog, Message, Appointment, Review
+from functions import add_review_to_dog_walker_rate, rebuild_dog_walker_rates
 
 from sqlalchemy.exc import IntegrityError
 
@@ -49,12 +52,12 @@ class ReviewModelTestCase(TestCase):
     def test_review_model(self):
         """Testing review model"""
 
-        appointment = Appointment(dog_owner_id = self.walker1_id, dog_walker_id = self.owner1_id, date = "2021-05-02", time_start = "03:00", day_period = "PM", duration = "15")
+        appointment = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = "2021-05-02", time_start = "03:00", day_period = "PM", duration = "15")
         
         db.session.add(appointment)
         db.session.commit()
 
-        aptment = Appointment.query.filter_by(dog_owner_id = self.walker1_id).first()
+        aptment = Appointment.query.filter_by(dog_owner_id = self.owner1_id).first()
 
         review = Review(appointment_id = aptment.id, rate = 5, comment = "Great")
         
@@ -66,4 +69,42 @@ class ReviewModelTestCase(TestCase):
         self.assertEqual(r.rate, 5)
         self.assertEqual(r.comment, "Great")
         self.assertEqual(r.appointment.dog_walker.name, "Jordana Walker")
-        self.assertEqual(r.appointment.dog_walker.name, "Nathalia Owner")
\ No newline at end of file
+        self.assertEqual(r.appointment.dog_owner.name, "Nathalia Owner")
+
+    def test_review_running_totals(self):
+        """Will each review update the dog_walker totals and keep the fractional rate?"""
+
+        # one day apart: a walker's appointments can't overlap
+        for day, rate in enumerate([5, 4], start = 2):
+            appointment = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = f"2021-05-0{day}", time_start = "03:00", day_period = "PM", duration = "15", status = True)
+            db.session.add(appointment)
+            db.session.flush()
+
+            db.session.add(Review(appointment_id = appointment.id, rate = rate))
+            add_review_to_dog_walker_rate(db, self.walker1_id, rate)
+            db.session.commit()
+
+        dog_walker = Dog_Walker.query.get(self.walker1_id)
+
+        self.assertEqual(dog_walker.review_count, 2)
+        self.assertEqual(dog_walker.rate_sum, 9)
+        self.assertEqual(dog_walker.rate, Decimal("4.50"))
+
+    def test_rebuild_rates(self):
+        """Will the rebuild recalculate the totals from the reviews?"""
+
+        for day, rate in enumerate([5, 2, 2], start = 2):
+            appointment = Appointment(dog_owner_id = self.owner1_id, dog_walker_id = self.walker1_id, date = f"2021-05-0{day}", time_start = "03:00", day_period = "PM", duration = "15", status = True)
+            db.session.add(appointment)
+            db.session.flush()
+            db.session.add(Review(appointment_id = appointment.id, rate = rate))
+
+        db.session.commit()
+
+        rebuild_dog_walker_rates(db)
+
+        dog_walker = Dog_Walker.query.get(self.walker1_id)
+
+        self.assertEqual(dog_walker.review_count, 3)
+        self.assertEqual(dog_walker.rate_sum, 9)
+        self.assertEqual(dog_walker.rate, Decimal("3.00"))
@@ -1,7 +1,7 @@
 import os
 from unittest import TestCase
 
-from models import db, connect_db, Dog_Owner, Dog_Walker, Appointment, Message, Review
+from models import db, User, connect_db, Dog_Owner, Dog_Walker, Appointment, Message, Review
 from functions import is_worker
 
 os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
@@ -19,8 +19,7 @@ class ReviewTestCase(TestCase):
     def setUp(self):
         """Create test client and sample data"""
 
-        Dog_Owner.query.delete()
-        Dog_Walker.query.delete()
+        User.query.delete()
         Message.query.delete()
         Appointment.query.delete()
         Review.query.delete()
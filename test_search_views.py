@@ -0,0 +1,133 @@
+import os
+from unittest import TestCase
+
+from models import db, User, Dog_Walker, Address
+from functions import QueryCounter
+
+os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
+
+from app import app
+from search import search_dog_walkers, MAX_PAGE_SIZE
+
+db.create_all()
+
+# Don't have WTForms use CSRF at all.
+app.config['WTF_CSRF_ENABLED'] = False
+
+class SearchTestCase(TestCase):
+    """Test the dog_walkers search"""
+
+    def setUp(self):
+        """Create test client and sample data"""
+
+        User.query.filter_by(role = "dog_walker").delete()
+        Address.query.delete()
+
+        self.client = app.test_client()
+
+        dilworth = Address(address = "112 Poplar Street", zipcode = 28202, city = "Charlotte", state = "North Carolina", neighbor = "Dilworth")
+        uptown = Address(address = "4337 Kenilworth Avenue", zipcode = 28204, city = "Raleigh", state = "North Carolina", neighbor = "Uptown")
+        db.session.add_all([dilworth, uptown])
+        db.session.commit()
+
+        jordana = Dog_Walker.signup(first_name = "Jordana", last_name = "Walker", email = "jordana@gmail.com",  password = "123456")
+        joane = Dog_Walker.signup(first_name = "Joane", last_name = "Walker", email = "joane@gmail.com",  password = "123456")
+        rebecca = Dog_Walker.signup(first_name = "Rebecca", last_name = "Stone", email = "rebecca@gmail.com",  password = "123456")
+
+        jordana.address_id = dilworth.id
+        jordana.rate = 5
+        joane.address_id = uptown.id
+        joane.rate = 3
+
+        db.session.commit()
+
+    def tearDown(self):
+
+        db.session.rollback()
+
+    def test_search_by_name(self):
+        """Will the search match part of the name, ignoring the case?"""
+
+        with self.client as c:
+
+            res = c.get("/dog_walkers?q=jOrD")
+            html = res.get_data(as_text = True)
+
+            self.assertIn("JORDANA WALKER", html)
+            self.assertNotIn("JOANE WALKER", html)
+            self.assertNotIn("REBECCA STONE", html)
+
+    def test_search_by_address(self):
+        """Will the neighbor, city and zipcode filters be applied together?"""
+
+        dog_walkers, next_cursor = search_dog_walkers(city = "charlotte", neighbor = "Dilworth", zipcode = 28202)
+
+        self.assertEqual([walker.name for walker in dog_walkers], ["Jordana Walker"])
+        self.assertIsNone(next_cursor)
+
+    def test_search_by_min_rate(self):
+        """Will the walkers below the minimum rate be left out?"""
+
+        dog_walkers, next_cursor = search_dog_walkers(min_rate = 4)
+
+        self.assertEqual([walker.name for walker in dog_walkers], ["Jordana Walker"])
+
+    def test_search_ranked_by_rate(self):
+        """Without a name, are the best rated walkers listed first?"""
+
+        dog_walkers, next_cursor = search_dog_walkers()
+
+        self.assertEqual([walker.name for walker in dog_walkers], ["Jordana Walker", "Joane Walker", "Rebecca Stone"])
+
+    def test_search_pagination(self):
+        """Will the keyset cursor walk through every walker exactly once?"""
+
+        first_page, cursor = search_dog_walkers(per_page = 2)
+        second_page, last_cursor = search_dog_walkers(per_page = 2, after = cursor)
+
+        self.assertEqual(len(first_page), 2)
+        self.assertEqual(len(second_page), 1)
+        self.assertIsNone(last_cursor)
+        self.assertEqual({walker.id for walker in first_page + second_page}, {walker.id for walker in Dog_Walker.query.all()})
+
+    def test_search_page_size_cap(self):
+        """Will a huge page size be capped?"""
+
+        for i in range(MAX_PAGE_SIZE + 2):
+            db.session.add(Dog_Walker(first_name = f"Walker{i}", last_name = "Test", email = f"walker{i}@gmail.com", password = "HASHED_PASSWORD"))
+        db.session.commit()
+
+        dog_walkers, next_cursor = search_dog_walkers(per_page = 1000)
+
+        self.assertEqual(len(dog_walkers), MAX_PAGE_SIZE)
+        self.assertIsNotNone(next_cursor)
+
+    def test_search_next_page_link(self):
+        """Will the page link to the next page keeping the filters?"""
+
+        with self.client as c:
+
+            res = c.get("/dog_walkers?q=walker&per_page=1")
+            html = res.get_data(as_text = True)
+
+            self.assertIn("More Dog Walkers", html)
+            self.assertIn("after=", html)
+            self.assertIn("q=walker", html)
+
+    def test_search_page_query_count(self):
+        """Will a page of 100 walkers with addresses be rendered with a single query?"""
+
+        for i in range(100):
+            address = Address(address = f"{i} Park Road", zipcode = 28209, city = "Charlotte", state = "North Carolina", neighbor = "Myers Park")
+            db.session.add(Dog_Walker(first_name = f"Walker{i}", last_name = "Test", email = f"walker{i}@gmail.com", password = "HASHED_PASSWORD", address = address))
+        db.session.commit()
+
+        with self.client as c:
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get("/dog_walkers?neighbor=myers park&per_page=100")
+
+            html = res.get_data(as_text = True)
+
+        self.assertEqual(html.count("Myers Park"), 100)
+        self.assertEqual(counter.count, 1)
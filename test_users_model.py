@@ -1,7 +1,7 @@
 import os
 from unittest import TestCase
 
-from models import db, Dog_Owner, Dog_Walker, Dog, Message, Appointment, Review, Address
+from models import db, User, Dog_Owner, Dog_Walker, Dog, Message, Appointment, Review, Address
 
 from sqlalchemy.exc import IntegrityError
 
@@ -84,6 +84,41 @@ class UserModelTestCase(TestCase):
         self.assertTrue(true_result)
         self.assertFalse(false_result)
     
+    def test_user_authenticate(self):
+        """Testing the authenticate method for both users at once"""
+
+        walker = User.authenticate("jordana@test.com", "HASHED_PASSWORD")
+        owner = User.authenticate("nathalia@test.com", "HASHED_PASSWORD")
+
+        self.assertIsInstance(walker, Dog_Walker)
+        self.assertTrue(walker.is_worker)
+        self.assertIsInstance(owner, Dog_Owner)
+        self.assertFalse(owner.is_worker)
+        self.assertFalse(User.authenticate("jordana@test.com", "HASD_PASSWORD"))
+
+    def test_email_taken_by_other_kind(self):
+        """Testing invalid email: trying to create a dog_owner with the email of a dog_walker"""
+
+        owner2 = Dog_Owner.signup(
+            first_name = "Jordana",
+            last_name = "Owner",
+            email="jordana@test.com",
+            password="HASHED_PASSWORD",
+        )
+
+        with self.assertRaises(IntegrityError) as context:
+            db.session.commit()
+
+    def test_dog_walker_legacy_id(self):
+        """Testing the lookup of the ids a dog_walker had before the users were unified"""
+
+        walker = Dog_Walker.query.get(self.walker1_id)
+        walker.legacy_id = 7
+        db.session.commit()
+
+        self.assertEqual(Dog_Walker.id_for_legacy_id(7), self.walker1_id)
+        self.assertIsNone(Dog_Walker.id_for_legacy_id(8))
+
     def test_dog_walker_invalid_email(self):
         """Testing invalid email: trying to create an user with the same email used for another dog_owner"""
 
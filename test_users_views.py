@@ -2,8 +2,8 @@ import os
 import flask
 from unittest import TestCase
 
-from models import db, connect_db, Dog_Owner, Dog_Walker, Address, Dog, Message, Appointment, Review
-from functions import is_worker
+from models import db, User, connect_db, Dog_Owner, Dog_Walker, Address, Dog, Message, Appointment, Review
+from functions import is_worker, QueryCounter
 
 os.environ['DATABASE_URL'] = "postgresql:///doggy_walkie_test"
 
@@ -20,8 +20,7 @@ class UsersTestCase(TestCase):
     def setUp(self):
         """Create test client and sample data"""
 
-        Dog_Owner.query.delete()
-        Dog_Walker.query.delete()
+        User.query.delete()
         Message.query.delete()
         Address.query.delete()
         Dog.query.delete()
@@ -131,6 +130,34 @@ class UsersTestCase(TestCase):
             self.assertNotIn("Delete", html)
             self.assertIn("Dogs", html)
 
+    def test_show_dog_owner_profile_cost_with_many_messages(self):
+        """Will the access check cost the same however many messages the dog_owner has?"""
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testwalker.id
+                sess["is_worker"] = is_worker(self.testwalker)
+
+            db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker.id, text = "Hi, how are you?"))
+            db.session.commit()
+
+            with QueryCounter(db.engine) as counter:
+                c.get(f"/dog_owners/{self.testowner.id}")
+
+            few_messages = counter.count
+
+            for i in range(40):
+                db.session.add(Message(dog_owner_id = self.testowner.id, dog_walker_id = self.testwalker2.id if i % 2 else self.testwalker.id, text = f"Message {i}"))
+            db.session.commit()
+
+            with QueryCounter(db.engine) as counter:
+                res = c.get(f"/dog_owners/{self.testowner.id}")
+
+            self.assertIn("Nathalia Owner", res.get_data(as_text = True))
+            self.assertEqual(counter.count, few_messages)
+            self.assertFalse([statement for statement in counter.statements if "FROM message" in statement])
+
     def test_show_dog_owner_profile_for_another_dog_owner(self):
         """Will the page render the specific dog_owner details for another dog_owner?"""
         
@@ -194,6 +221,24 @@ class UsersTestCase(TestCase):
             self.assertNotIn("Delete", html)
             self.assertIn("Send a Message", html)
 
+    def test_show_dog_walker_profile_legacy_id(self):
+        """Will the dog_walker id from before the unified users redirect to the current one?"""
+
+        dog_walker = Dog_Walker.query.filter_by(first_name  = "Jordana").first()
+        dog_walker.legacy_id = dog_walker.id + 1000
+        db.session.commit()
+
+        with self.client as c:
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testowner.id
+                sess["is_worker"] = is_worker(self.testowner)
+
+            res = c.get(f"/dog_walkers/{dog_walker.legacy_id}")
+
+            self.assertEqual(res.status_code, 301)
+            self.assertTrue(res.location.endswith(f"/dog_walkers/{dog_walker.id}"))
+
     def test_show_dog_walker_profile_for_another_dog_walker(self):
         """Will the page render the specific user details for another dog_walker?"""
         
@@ -877,7 +922,7 @@ class UsersTestCase(TestCase):
 
         with self.client as c:
 
-            res = c.post("/login", data = {"email":"jordana@gmail.com", "password":"123456", "dog_walker_check": True}, follow_redirects = True)
+            res = c.post("/login", data = {"email":"jordana@gmail.com", "password":"123456"}, follow_redirects = True)
             html = res.get_data(as_text = True)
 
             self.assertIn("Jordana Walker", html)
@@ -0,0 +1,111 @@
+"""Unread messages.
+
+Every new message counts as unread for its recipient twice, in the same
+transaction as the insert (the Message listener in models.py): on the pair's
+conversation (`dog_owner_unread` / `dog_walker_unread`, the inbox badges) and
+on the recipient's app_user row (`unread_messages`, the navbar badge). Reading
+a badge is reading a column, never counting messages.
+
+Opening a thread marks every message the user received in it as read with one
+UPDATE, through the partial unread indexes of the message table, and takes
+the number of rows it changed off both counters. Deleting an account takes
+its unread messages off the counters of the people it wrote to.
+"""
+
+from models import db, User, Message, Conversation
+
+
+def mark_thread_read(user, dog_owner_id, dog_walker_id):
+    """ Mark the messages the user received from the other side of the thread as read (no commit).
+
+    Returns the user's unread messages left in other threads.
+    """
+
+    message = Message.__table__
+
+    marked = db.session.execute(
+        message.update()
+        .where(message.c.dog_owner_id == dog_owner_id)
+        .where(message.c.dog_walker_id == dog_walker_id)
+        .where(message.c.is_sender_worker == (not user.is_worker))
+        .where(message.c.read.isnot(True))
+        .values(read = True)
+    ).rowcount
+
+    if not marked:
+        return user.unread_messages
+
+    conversation = Conversation.__table__
+    side = conversation.c.dog_walker_unread if user.is_worker else conversation.c.dog_owner_unread
+
+    db.session.execute(
+        conversation.update()
+        .where(conversation.c.dog_owner_id == dog_owner_id)
+        .where(conversation.c.dog_walker_id == dog_walker_id)
+        .values({side: db.func.greatest(side - marked, 0)})
+    )
+
+    app_user = User.__table__
+
+    return db.session.execute(
+        app_user.update()
+        .where(app_user.c.id == user.id)
+        .values(unread_messages = db.func.greatest(app_user.c.unread_messages - marked, 0))
+        .returning(app_user.c.unread_messages)
+    ).scalar()
+
+
+def forget_unread_from(kind, user_id):
+    """ Take the unread messages sent by a user being deleted off the counters of the other side (no commit) """
+
+    conversation = Conversation.__table__
+    app_user = User.__table__
+
+    if kind == "dog_owner":
+        own, other, unread = conversation.c.dog_owner_id, conversation.c.dog_walker_id, conversation.c.dog_walker_unread
+    else:
+        own, other, unread = conversation.c.dog_walker_id, conversation.c.dog_owner_id, conversation.c.dog_owner_unread
+
+    db.session.execute(
+        app_user.update()
+        .where(app_user.c.id == other)
+        .where(own == user_id)
+        .where(unread > 0)
+        .values(unread_messages = db.func.greatest(app_user.c.unread_messages - unread, 0))
+    )
+
+
+def rebuild_unread_counters(db):
+    """ Recount the unread messages of every conversation and user from the message table (for backfills) """
+
+    db.session.execute("""
+        UPDATE conversation
+        SET dog_owner_unread = COALESCE(counts.owner_unread, 0),
+            dog_walker_unread = COALESCE(counts.walker_unread, 0)
+        FROM conversation AS pair
+        LEFT JOIN (
+            SELECT dog_owner_id, dog_walker_id,
+                   COUNT(*) FILTER (WHERE is_sender_worker) AS owner_unread,
+                   COUNT(*) FILTER (WHERE NOT is_sender_worker) AS walker_unread
+            FROM message
+            WHERE read IS NOT TRUE
+            GROUP BY dog_owner_id, dog_walker_id
+        ) AS counts ON counts.dog_owner_id = pair.dog_owner_id AND counts.dog_walker_id = pair.dog_walker_id
+        WHERE conversation.id = pair.id
+    """)
+    db.session.execute("""
+        UPDATE app_user
+        SET unread_messages = COALESCE(totals.unread, 0)
+        FROM app_user AS account
+        LEFT JOIN (
+            SELECT user_id, SUM(unread) AS unread
+            FROM (
+                SELECT dog_owner_id AS user_id, dog_owner_unread AS unread FROM conversation
+                UNION ALL
+                SELECT dog_walker_id, dog_walker_unread FROM conversation
+            ) AS pairs
+            GROUP BY user_id
+        ) AS totals ON totals.user_id = account.id
+        WHERE app_user.id = account.id
+    """)
+    db.session.commit()